@@ -0,0 +1,460 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+from pykosimcli.kdbf import kdbf
+from pykosimcli.timing import stage
+
+"""benchmarks for pykosimcli
+
+startup: time of the cli startup (--help, import) in a fresh interpreter and
+check that no heavy dependency is imported on these code paths
+
+    python -m pykosimcli.bench startup --max-overhead 0.2
+
+run: time and memory profile of parse, plaus_excel, the plots, the klzc
+reader and the binary klzb store on synthetic models of several sizes. The
+models are sqlite stand-ins with the tables and columns of the kdbf schema
+used by KDBFselect, so no firebird server is needed.
+
+    python -m pykosimcli.bench run --scales 10 100 1000 --json report.json
+    python -m pykosimcli.bench compare old.json new.json
+"""
+
+# modules which must not be loaded for --help and tab completion
+HEAVY_MODULES = ["matplotlib", "pandas", "numpy", "fdb", "argcomplete",
+                 "xlsxwriter"]
+
+# default allowed startup overhead over a bare interpreter in seconds
+MAX_STARTUP_OVERHEAD = 0.25
+
+
+def time_command(cmd, repeat=5):
+    """best wall time of a command in seconds
+    """
+    env = dict(os.environ)
+    env.pop("_ARGCOMPLETE", None)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, env=env, check=False)
+        wall = time.perf_counter() - start
+        best = wall if best is None else min(best, wall)
+    return best
+
+
+def loaded_modules(code):
+    """heavy modules loaded after running code in a fresh interpreter
+    """
+    probe = ("import sys, json\n{}\n"
+             "print(json.dumps([m for m in {!r} if m in sys.modules]))"
+             ).format(code, HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True,
+                         text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def startup_times(repeat=5):
+    """startup times of the cli compared to a bare interpreter
+
+    Returns
+    -------
+    times (dict): {name: seconds}
+    """
+    py = sys.executable
+    return {"python": time_command([py, "-c", "pass"], repeat),
+            "import_cli": time_command([py, "-c", "import pykosimcli.cli"],
+                                       repeat),
+            "help": time_command([py, "-m", "pykosimcli.cli", "--help"],
+                                 repeat)}
+
+
+def check_startup(maxOverhead=MAX_STARTUP_OVERHEAD, repeat=5):
+    """guard against startup regressions
+
+    Returns
+    -------
+    report (dict): startup times and a list of problems, empty if ok
+    """
+    times = startup_times(repeat)
+    problems = []
+    overhead = times["help"] - times["python"]
+    if overhead > maxOverhead:
+        problems.append("--help takes {:.3f} s longer than a bare "
+                        "interpreter (max {:.3f} s)".format(overhead,
+                                                            maxOverhead))
+
+    code = ("import pykosimcli.cli as c\n"
+            "try:\n    c.parse_cli(['--help'])\nexcept SystemExit:\n    pass")
+    heavy = loaded_modules(code)
+    if heavy:
+        problems.append("--help imports {}".format(", ".join(heavy)))
+
+    return {"times": times, "overhead": overhead, "problems": problems}
+
+
+# --- synthetic stand-in models ---
+# value ranges of the generated columns, columns not listed are drawn from
+# 0-100. The split of the columns over the joined tables is an approximation
+# of the Kosim schema.
+STANDIN_SCHEMA = {
+    "MISCHWASSERBAUWERKBESTAND": [
+        "ID", "BEZEICHNUNG", "TYPMISCHWASSERBAUWERKASSTRING", "VOLUMEN",
+        "AUA128", "QF24", "QR", "VBECKENPROHEKTAR", "X", "LAENGE", "BREITE",
+        "TIEFE", "STAURAUMLAENGE", "QKRIT", "QDRMAX"],
+    "MISCHWASSERBAUWERKPROZESSMJW": [
+        "ID", "BEZEICHNUNG", "NA198", "E0", "NUED", "TUE", "MMIN", "MVORH",
+        "VMIN", "VMINA102", "VVORH", "QA", "TE", "CUE", "CKUE", "CBUE"],
+    "MISCHWASSERBAUWERKPROZESSSGMJW": [
+        "ID", "BEZEICHNUNG", "SFUE", "SFUEIN128"],
+    "REGENWASSERBEHANDLUNGBESTAND": [
+        "ID", "BEZEICHNUNG", "TYPREGENWASSERBEHANDLUNGASSTRING", "VOLUMEN",
+        "AU"],
+    "REGENWASSERBEHANDLUNGPROZESSMJW": [
+        "ID", "BEZEICHNUNG", "E0", "NUED", "TUE"],
+    "REGENWASSERBEHANDLUNGBILANZSG": [
+        "ID", "BEZEICHNUNG", "SFUE"],
+    "SRC_A128": [
+        "ID", "BEZEICHNUNG", "GESAMTVOLUMENERFORDERLICH", "VOLUMENANRECHENBAR",
+        "VOLUMENERFORDERLICH", "ENTLASTUNGSFRACHT"],
+    # Einwohnerdichte in column L of the Gebiete sheet
+    "GEBIETBESTAND": [
+        "ID", "BEZEICHNUNG", "FLAECHE", "AU", "VERSIEGELUNGSGRAD",
+        "EINWOHNER", "WASSERVERBRAUCH", "FREMDWASSERSPENDE",
+        "TROCKENWETTERABFLUSS", "GEFAELLE", "FLIESSZEIT", "EINWOHNERDICHTE"],
+    "TRANSPORTBESTAND": [
+        "ID", "BEZEICHNUNG", "LAENGE", "GEFAELLE", "DURCHMESSER", "RAUHEIT"],
+    "EINZELEINLEITERBESTAND": [
+        "ID", "BEZEICHNUNG", "Q", "CSB"],
+}
+
+STANDIN_RANGES = {"E0": (5, 50), "NUED": (10, 60), "TUE": (10, 600),
+                  "NA198": (2, 10), "MMIN": (5, 10), "MVORH": (3, 20),
+                  "QF24": (0.1, 3), "QR": (0.1, 3), "AUA128": (1, 50),
+                  "VBECKENPROHEKTAR": (5, 40), "TE": (2, 20), "QA": (2, 15),
+                  "EINWOHNERDICHTE": (20, 130), "X": (0, 1)}
+
+BAUWERK_TYPES = ["DBH", "DBN", "FBH", "FBN", "SKUE", "SKUO", "RUE"]
+
+
+class standin(kdbf):
+    """
+    kdbf replacement opening a synthetic sqlite stand-in model, can be
+    passed to parsedb.parse as engine
+    """
+    def __enter__(self):
+        self.tempdir = False
+        with stage("connect"):
+            self.conn = sqlite3.connect(self.filePath,
+                                        check_same_thread=False)
+        return self.conn
+
+
+def make_model(filePath, nBauwerke=100, nGebiete=None, nTransport=None,
+               nRwb=None, extraCols=20, seed=0):
+    """write a synthetic stand-in model
+
+    Params
+    ------
+    filePath (str): path of the sqlite file, overwritten if it exists
+    nBauwerke (int): number of Mischwasserbauwerke
+    nGebiete, nTransport, nRwb (int): number of Gebiete, Transport rows and
+        Regenwasserbauwerke, default 5x, 10x and 0.5x nBauwerke
+    extraCols (int): number of unused columns added to every Bauwerk table
+        to mimic the width of the SELECT * joins
+    seed (int): random seed
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    nGebiete = 5 * nBauwerke if nGebiete is None else nGebiete
+    nTransport = 10 * nBauwerke if nTransport is None else nTransport
+    nRwb = max(1, nBauwerke // 2) if nRwb is None else nRwb
+    rows = {"MISCHWASSERBAUWERK": nBauwerke, "REGENWASSER": nRwb,
+            "SRC_A128": 1, "GEBIET": nGebiete, "TRANSPORT": nTransport,
+            "EINZELEINLEITER": max(1, nBauwerke // 10)}
+
+    if os.path.exists(filePath):
+        os.remove(filePath)
+    conn = sqlite3.connect(filePath)
+    for table, cols in STANDIN_SCHEMA.items():
+        n = [v for k, v in rows.items() if table.startswith(k)][0]
+        if table.startswith(("MISCHWASSER", "REGENWASSER")):
+            cols = cols + ["ZUSATZ{}{}".format(table[-3:], i)
+                           for i in range(extraCols)]
+
+        data = []
+        for col in cols:
+            if col == "ID":
+                data.append(range(n))
+            elif col == "BEZEICHNUNG":
+                if table == "SRC_A128":
+                    data.append(["A128_Fiktives Zentralbecken"])
+                else:
+                    data.append(["{}_{:05d}".format(table[:3], i)
+                                 for i in range(n)])
+            elif col.startswith("TYP"):
+                data.append(rng.choice(BAUWERK_TYPES, n).tolist())
+            else:
+                low, high = STANDIN_RANGES.get(col, (0, 100))
+                data.append(rng.uniform(low, high, n).round(3).tolist())
+
+        conn.execute("CREATE TABLE {} ({})".format(
+            table, ", ".join('"{}"'.format(c) for c in cols)))
+        conn.executemany("INSERT INTO {} VALUES ({})".format(
+            table, ", ".join("?" * len(cols))), zip(*data))
+    conn.commit()
+    conn.close()
+    return filePath
+
+
+def make_klzc(filePath, nBlocks=100, nRows=1000, seed=0):
+    """write a synthetic klzc file with one time series block per Bauwerk:
+    HEADER_<name>,QZU,QUE,CUE followed by time step, inflow, overflow and
+    concentration
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    with open(filePath, "w", encoding="latin1") as f:
+        for b in range(nBlocks):
+            f.write("HEADER_MWB_{:05d},QZU,QUE,CUE\n".format(b))
+            qzu = rng.gamma(0.5, 40, nRows)
+            que = np.where(qzu > 40, qzu - 40, 0.0)
+            cue = rng.uniform(50, 300, nRows) * (que > 0)
+            for i in range(nRows):
+                f.write("{},{:.3f},{:.3f},{:.1f}\n".format(i * 5, qzu[i],
+                                                           que[i], cue[i]))
+    return filePath
+
+
+# memory tracing slows down allocation heavy stages, switch off for pure
+# timing runs
+TRACE_MEMORY = True
+
+
+def measure(func, *args, **kwargs):
+    """run func and measure wall time, cpu time and peak python memory,
+    memory of worker processes is not included
+
+    Returns
+    -------
+    result: return value of func
+    stats (dict): wall [s], cpu [s] and peak_mb (None without tracing)
+    """
+    trace = TRACE_MEMORY
+    if trace:
+        tracemalloc.start()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        peak = None
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+    return result, {"wall": wall, "cpu": cpu, "peak_mb": peak}
+
+
+DEFAULT_SCALES = [10, 100, 1000]
+
+
+def run_scale(nBauwerke, workDir, klzcRows=1000, workers=None):
+    """benchmark all stages on one synthetic model
+
+    Returns
+    -------
+    stages (dict): {stage: stats}
+    """
+    import pykosimcli.parsedb as pk
+    from pykosimcli.klz import klzc
+    from pykosimcli.klzbin import klzbin, convert_klzc
+    from pykosimcli.overflow import overflow_stats
+
+    db = make_model(os.path.join(workDir, "model_{}.sqlite".format(nBauwerke)),
+                    nBauwerke)
+    klz = make_klzc(os.path.join(workDir, "model_{}.klzc".format(nBauwerke)),
+                    nBauwerke, klzcRows)
+    stages = {}
+
+    res, stages["parse"] = measure(pk.parse, db, engine=standin,
+                                   project=True)
+    stages["parse"]["rows"] = sum(len(df) for df in res.values())
+    full, stages["parse_full"] = measure(pk.parse, db, full=True,
+                                         engine=standin)
+    stages["parse_full"]["rows"] = sum(len(df) for df in full.values())
+    _, stages["parse_concurrent"] = measure(pk.parse, db, workers=3,
+                                            engine=standin, project=True)
+    _, stages["plaus_excel"] = measure(pk.plaus_excel, res, os.path.join(
+        workDir, "plaus_{}.xlsx".format(nBauwerke)))
+    _, stages["plots"] = measure(pk.render_plots, res, os.path.join(
+        workDir, "plots_{}".format(nBauwerke)))
+
+    def iter_klzc():
+        with klzc(klz) as f:
+            return sum(len(df) for df in f)
+
+    def parallel_klzc():
+        with klzc(klz) as f:
+            return sum(len(df) for df in f.load_parallel(workers=workers))
+
+    rows, stages["klzc_iter"] = measure(iter_klzc)
+    stages["klzc_iter"]["rows"] = rows
+    rows, stages["klzc_parallel"] = measure(parallel_klzc)
+    stages["klzc_parallel"]["rows"] = rows
+
+    def read_klzb():
+        with klzbin(binPath) as f:
+            return sum(len(next(iter(cols.values()))) for _, cols in f
+                       if cols)
+
+    binPath, stages["klzb_convert"] = measure(convert_klzc, klz, force=True)
+    rows, stages["klzb_read"] = measure(read_klzb)
+    stages["klzb_read"]["rows"] = rows
+    _, stages["overflow_klzb"] = measure(overflow_stats, binPath)
+    return stages
+
+
+def run_suite(scales=DEFAULT_SCALES, workDir=None, klzcRows=1000,
+              workers=None):
+    """run the benchmarks at several scales
+
+    Returns
+    -------
+    report (dict): machine readable report with environment information
+    """
+    import numpy
+    import pandas
+
+    tmp = workDir or tempfile.mkdtemp(prefix="pykosimbench")
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "pandas": pandas.__version__, "numpy": numpy.__version__,
+              "cpus": os.cpu_count(), "scales": {}}
+    try:
+        for n in scales:
+            print("Benchmark mit {} Bauwerken".format(n))
+            report["scales"][str(n)] = run_scale(n, tmp, klzcRows, workers)
+    finally:
+        if workDir is None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return report
+
+
+def print_report(report):
+    for scale, stages in report["scales"].items():
+        print("--- {} Bauwerke ---".format(scale))
+        for stage, st in stages.items():
+            mem = "" if st["peak_mb"] is None else \
+                "{:9.1f} MB".format(st["peak_mb"])
+            print("{:<18} {:9.3f} s {:9.3f} s cpu {}".format(
+                stage, st["wall"], st["cpu"], mem))
+
+
+def compare_reports(old, new):
+    """wall time ratios new / old per scale and stage
+
+    Returns
+    -------
+    ratios (dict): {scale: {stage: ratio}}
+    """
+    ratios = {}
+    for scale, stages in new["scales"].items():
+        for stage, st in stages.items():
+            try:
+                ref = old["scales"][scale][stage]["wall"]
+            except KeyError:
+                continue
+            ratios.setdefault(scale, {})[stage] = st["wall"] / ref if ref \
+                else float("nan")
+    return ratios
+
+
+def main(*args):
+    parser = argparse.ArgumentParser(description="pykosimcli benchmarks")
+    sub = parser.add_subparsers(dest="bench")
+
+    startup = sub.add_parser("startup", help="cli startup time guard")
+    startup.add_argument("--max-overhead", type=float,
+                         default=MAX_STARTUP_OVERHEAD,
+                         help="allowed overhead over bare python in s")
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.add_argument("--json", type=str, default=None,
+                         help="opt:write report to json file")
+
+    run = sub.add_parser("run", help="benchmark suite on synthetic models")
+    run.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                     help="number of Bauwerke of the synthetic models")
+    run.add_argument("--klzc-rows", type=int, default=1000,
+                     help="rows per klzc block")
+    run.add_argument("--workers", type=int, default=None)
+    run.add_argument("--no-memory", action="store_true", default=False,
+                     help="opt:skip memory tracing for pure timings")
+    run.add_argument("--workdir", type=str, default=None,
+                     help="opt:keep generated files in this directory")
+    run.add_argument("--json", type=str, default=None,
+                     help="opt:write report to json file")
+
+    compare = sub.add_parser("compare", help="compare two json reports")
+    compare.add_argument("old", type=str)
+    compare.add_argument("new", type=str)
+
+    args = parser.parse_args(*args)
+
+    if args.bench == "run":
+        global TRACE_MEMORY
+        TRACE_MEMORY = not args.no_memory
+        if args.workdir and not os.path.exists(args.workdir):
+            os.makedirs(args.workdir)
+        report = run_suite(args.scales, args.workdir, args.klzc_rows,
+                           args.workers)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+        return 0
+
+    if args.bench == "compare":
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        for scale, stages in compare_reports(old, new).items():
+            print("--- {} Bauwerke ---".format(scale))
+            for stage, ratio in stages.items():
+                print("{:<18} {:6.2f}x".format(stage, ratio))
+        return 0
+
+    if args.bench == "startup":
+        report = check_startup(args.max_overhead, args.repeat)
+        for name, wall in report["times"].items():
+            print("{:<12} {:8.1f} ms".format(name, wall * 1000))
+        for problem in report["problems"]:
+            print("FAIL: {}".format(problem))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+        return 1 if report["problems"] else 0
+
+    parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,243 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import copy
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import tempfile
+
+"""on-disk cache for parsed kdbf results
+"""
+
+try:
+    import pyarrow  # noqa: F401
+    CACHEFORMAT = "parquet"
+except ImportError:
+    CACHEFORMAT = "pkl"
+
+# default maximum size of the cache directory in bytes
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+
+META = "meta.json"
+
+
+def default_cache_dir():
+    """return the default cache directory, can be set with the environment
+    variable PYKOSIMCLI_CACHE
+    """
+    return os.environ.get("PYKOSIMCLI_CACHE",
+                          os.path.join(os.path.expanduser("~"), ".cache",
+                                       "pykosimcli"))
+
+
+def file_hash(filePath, blockSize=1024 ** 2):
+    """sha1 hash of the file content
+    """
+    sha = hashlib.sha1()
+    with open(filePath, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def dir_size(path):
+    """size of all files in a directory in bytes
+    """
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            size += os.path.getsize(os.path.join(root, f))
+    return size
+
+
+def write_table(df, entryDir, name):
+    """write a table of a cache entry as parquet, tables pyarrow can't
+    convert (e.g. mixed object columns) are pickled
+
+    Returns
+    -------
+    fmt (str): format the table was written in
+    """
+    if CACHEFORMAT == "parquet":
+        tabPath = os.path.join(entryDir, "{}.parquet".format(name))
+        try:
+            df.to_parquet(tabPath)
+            return "parquet"
+        except (ValueError, TypeError, NotImplementedError):
+            # ArrowInvalid and ArrowTypeError derive from these
+            if os.path.exists(tabPath):
+                os.remove(tabPath)
+    df.to_pickle(os.path.join(entryDir, "{}.pkl".format(name)))
+    return "pkl"
+
+
+class kdbfcache(object):
+    """
+    cache of parse() result dicts - every entry is a directory holding one
+    columnar file per table. Entries are keyed by path, size, mtime and
+    optionally the content hash of the kdbf file. Least recently used
+    entries are removed once the cache grows over maxSize bytes.
+
+    The cache directory is scanned for the eviction only once, later stores
+    update the scanned sizes. Worker processes use a copy without eviction
+    (see worker), the parent evicts once after the pool finished.
+    """
+    def __init__(self, cacheDir=None, maxSize=DEFAULT_MAX_SIZE, useHash=False,
+                 autoEvict=True):
+        self.cacheDir = os.path.abspath(cacheDir or default_cache_dir())
+        self.maxSize = maxSize
+        self.useHash = useHash
+        self.autoEvict = autoEvict
+        # {entry: [last access time, size]} after the first scan
+        self.index = None
+
+    def worker(self):
+        """copy of the cache for worker processes, stores don't evict
+        """
+        cache = copy.copy(self)
+        cache.autoEvict = False
+        cache.index = None
+        return cache
+
+    def fingerprint(self, fIn, variant=""):
+        """key of a kdbf file in the cache
+
+        Params
+        ------
+        fIn (str): path to the kdbf file
+        variant (str): opt. additional key part, e.g. for different queries
+
+        Returns
+        -------
+        key (str): hex digest of the file fingerprint
+        """
+        pth = os.path.abspath(fIn)
+        stat = os.stat(pth)
+        parts = [pth, str(stat.st_size), str(stat.st_mtime_ns), variant]
+        if self.useHash:
+            parts.append(file_hash(pth))
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+    def entry_dir(self, key):
+        return os.path.join(self.cacheDir, key)
+
+    def load(self, fIn, variant=""):
+        """load the cached results of a kdbf file
+
+        Returns
+        -------
+        res (dict): dictionary of results or None if there is no valid entry
+        """
+        import pandas as pd
+
+        entry = self.entry_dir(self.fingerprint(fIn, variant))
+        metaPath = os.path.join(entry, META)
+        if not os.path.exists(metaPath):
+            return None
+        try:
+            with open(metaPath, "r") as f:
+                meta = json.load(f)
+            formats = meta.get("formats", {})
+            res = {}
+            for key in meta["tables"]:
+                fmt = formats.get(key, meta["format"])
+                tabPath = os.path.join(entry, "{}.{}".format(key, fmt))
+                if fmt == "parquet":
+                    res[key] = pd.read_parquet(tabPath)
+                else:
+                    res[key] = pd.read_pickle(tabPath)
+        except (OSError, ValueError, KeyError, TypeError, EOFError,
+                pickle.UnpicklingError) as err:
+            # truncated or unreadable entry, parse again and replace it
+            print("Cache entry for {} unreadable, ignored: {}".format(fIn,
+                                                                    err))
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        # mark entry as recently used
+        os.utime(os.path.join(entry, META))
+        if self.index is not None and entry in self.index:
+            self.index[entry][0] = time.time()
+        return res
+
+    def store(self, fIn, res, variant=""):
+        """write the results of a kdbf file to the cache and evict old entries
+        """
+        if not os.path.exists(self.cacheDir):
+            os.makedirs(self.cacheDir)
+
+        key = self.fingerprint(fIn, variant)
+        # write to a temporary directory first so that readers never see
+        # partially written entries
+        tmp = tempfile.mkdtemp(dir=self.cacheDir, prefix=".tmp")
+        try:
+            formats = {}
+            for name, df in res.items():
+                formats[name] = write_table(df, tmp, name)
+            meta = {"path": os.path.abspath(fIn), "format": CACHEFORMAT,
+                    "formats": formats, "tables": list(res),
+                    "created": time.time()}
+            with open(os.path.join(tmp, META), "w") as f:
+                json.dump(meta, f)
+
+            entry = self.entry_dir(key)
+            if os.path.exists(entry):
+                shutil.rmtree(entry)
+            os.rename(tmp, entry)
+        except (OSError, ValueError, TypeError, pickle.PicklingError) as err:
+            # the results are still valid, only the cache entry is missing
+            print("Writing cache entry for {} failed: {}".format(fIn, err))
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+
+        if self.index is not None:
+            self.index[entry] = [time.time(), dir_size(entry)]
+        if self.autoEvict:
+            self.evict()
+
+    def entries(self):
+        """list of (last access time, size, path) of all cache entries
+        """
+        entries = []
+        if not os.path.exists(self.cacheDir):
+            return entries
+        for key in os.listdir(self.cacheDir):
+            metaPath = os.path.join(self.cacheDir, key, META)
+            if key.startswith(".") or not os.path.exists(metaPath):
+                continue
+            entry = self.entry_dir(key)
+            entries.append((os.path.getmtime(metaPath), dir_size(entry),
+                            entry))
+        return entries
+
+    def evict(self, rescan=False):
+        """remove least recently used entries until the cache is smaller
+        than maxSize, the directory is only scanned on the first call
+
+        Params
+        ------
+        rescan (bool): scan the directory again, e.g. after worker
+            processes stored entries
+        """
+        if self.index is None or rescan:
+            self.index = dict((entry, [atime, size]) for atime, size, entry
+                              in self.entries())
+        total = sum(v[1] for v in self.index.values())
+        for entry, (atime, size) in sorted(self.index.items(),
+                                           key=lambda e: e[1][0]):
+            if total <= self.maxSize:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            del self.index[entry]
+            total -= size
+
+    def clear(self):
+        """remove all cache entries
+        """
+        for atime, size, entry in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
+        self.index = None
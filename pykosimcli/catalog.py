@@ -0,0 +1,360 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import sqlite3
+
+from pykosimcli.kdbf import kdbf
+from pykosimcli.projection import INDEX
+from pykosimcli.projection import required_columns
+from pykosimcli.rules import TYPECOL, MWB_RULES
+from pykosimcli.parsedb import create_mw_bw_short_tab
+
+"""model catalog - persistent index of summary statistics per model and key
+indicators per Mischwasserbauwerk, answers threshold and top-N questions
+across many models without opening their databases
+"""
+
+# file ending of catalogs
+CATALOG_SUFFIX = ".kcat"
+
+# key indicators of the Mischwasserbauwerke stored in the catalog
+INDICATORS = ["E0", "NUED", "TUE", "SFUEIN128", "SPEZVOL", "NA198"]
+
+# columns fetched for the catalog: the indicators and the columns of the
+# short table the plausibility rules are checked on, SPEZVOL is computed like
+# in parsedb.create_mw_bw_short_tab
+MWB_COLUMNS = [INDEX, TYPECOL, "E0", "NUED", "TUE", "SFUEIN128", "VOLUMEN",
+               "AUA128", "NA198"]
+MWB_COLUMNS += [c for c in required_columns(["create_mw_bw_short_tab"])
+                ["mischwasserbauwerke"] if c not in MWB_COLUMNS]
+
+CATALOG_COLUMNS = {
+    "mischwasserbauwerke": MWB_COLUMNS,
+    "regenwasserbauwerke": [INDEX],
+    "gebiete": [INDEX],
+    "transport": [INDEX],
+    "grosseinleiter": [INDEX],
+}
+
+# per model summary columns
+MODEL_COLUMNS = ["n_mwb", "n_rwb", "n_gebiete", "n_transport",
+                 "n_grosseinleiter", "e0_max", "e0_mean", "nued_max",
+                 "tue_max", "n_orange", "n_red"]
+
+CONDITION = re.compile(r"^\s*(\w+)\s*(>=|<=|>|<|=|!)\s*([-+0-9.eE]+)"
+                       r"(?:\s*:\s*([-+0-9.eE]+))?\s*$")
+
+
+def default_catalog():
+    """default catalog path in the cache directory
+    """
+    from pykosimcli.cache import default_cache_dir
+    return os.path.join(default_cache_dir(), "catalog" + CATALOG_SUFFIX)
+
+
+def is_catalog(filePath):
+    return str(filePath).lower().endswith(CATALOG_SUFFIX)
+
+
+def known_column(name, columns):
+    """name of a column of the queried table, case insensitive
+
+    sqlite reads unknown double quoted names as strings, so only known
+    columns may get into an sql statement
+
+    Raises
+    ------
+    ValueError: if name is not one of columns
+    """
+    known = dict((c.upper(), c) for c in columns)
+    if name.upper() not in known:
+        raise ValueError("Unknown column {}, choose one of {}".format(
+            name, ", ".join(columns)))
+    return known[name.upper()]
+
+
+def parse_condition(text, columns=None):
+    """parse a filter condition
+
+    COL>V, COL<V, COL>=V, COL<=V, COL=V compare with a value,
+    COL=LOW:HIGH selects values inside and COL!LOW:HIGH values outside of
+    a range, e.g. "E0>40" or "NA198!3:9"
+
+    Params
+    ------
+    text (str): condition
+    columns (list): opt. columns of the queried table, other columns raise
+        a ValueError
+
+    Returns
+    -------
+    sql (str), params (list): sql condition and its parameters
+    """
+    match = CONDITION.match(text)
+    if match is None:
+        raise ValueError("Invalid condition {}".format(text))
+    col, op, value, high = match.groups()
+    col = col.upper() if columns is None else known_column(col, columns)
+    col = '"{}"'.format(col)
+    if high is not None:
+        if op == "=":
+            return "{} BETWEEN ? AND ?".format(col), [float(value), float(high)]
+        if op == "!":
+            return "({0} < ? OR {0} > ?)".format(col), [float(value),
+                                                         float(high)]
+    elif op != "!":
+        return "{} {} ?".format(col, op), [float(value)]
+    raise ValueError("Invalid condition {}".format(text))
+
+
+def summarize(res):
+    """catalog rows of one parsed model
+
+    Params
+    ------
+    res (dict): parse() results with CATALOG_COLUMNS
+
+    Returns
+    -------
+    model (dict): summary statistics of the model
+    bauwerke (list): (BEZEICHNUNG, type, indicators...) tuples
+    """
+    import numpy as np
+    from pykosimcli import rules
+
+    def count(table):
+        return len(res[table]) if table in res else 0
+
+    model = {"n_mwb": count("mischwasserbauwerke"),
+             "n_rwb": count("regenwasserbauwerke"),
+             "n_gebiete": count("gebiete"),
+             "n_transport": count("transport"),
+             "n_grosseinleiter": count("grosseinleiter")}
+
+    bauwerke = []
+    mwb = res.get("mischwasserbauwerke")
+    if mwb is not None and len(mwb):
+        mwb = mwb.copy()
+        if "VOLUMEN" in mwb.columns and "AUA128" in mwb.columns:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mwb["SPEZVOL"] = mwb["VOLUMEN"] / mwb["AUA128"]
+        vals = {}
+        for col in INDICATORS:
+            if col in mwb.columns:
+                v = mwb[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                vals[col] = np.where(np.isfinite(v), v, np.nan)
+            else:
+                vals[col] = np.full(len(mwb), np.nan)
+
+        def stat(func, col):
+            v = vals[col]
+            return None if np.isnan(v).all() else float(func(v))
+
+        model.update({"e0_max": stat(np.nanmax, "E0"),
+                      "e0_mean": stat(np.nanmean, "E0"),
+                      "nued_max": stat(np.nanmax, "NUED"),
+                      "tue_max": stat(np.nanmax, "TUE")})
+
+        # the rules are checked on the short table like in the plausibility
+        # workbook, see parsedb.build_plaus_sheet
+        short = create_mw_bw_short_tab(res)
+        sev = rules.severity(short, MWB_RULES).to_numpy()
+        model["n_orange"] = int((sev.max(axis=1) == 1).sum())
+        model["n_red"] = int((sev.max(axis=1) == 2).sum())
+
+        types = (mwb[TYPECOL].astype(object).to_numpy()
+                 if TYPECOL in mwb.columns else [None] * len(mwb))
+        for i, name in enumerate(mwb.index):
+            bauwerke.append(
+                (str(name), None if types[i] is None else str(types[i])) +
+                tuple(None if np.isnan(vals[col][i]) else float(vals[col][i])
+                      for col in INDICATORS))
+    return model, bauwerke
+
+
+def _catalog_sim(db, engine=kdbf):
+    """worker function for modelcatalog.update, parses the catalog columns
+    of one database and summarizes them in the worker process
+    """
+    from pykosimcli.parsedb import parse, get_filename, fill_missing_columns
+
+    simName = get_filename(db)
+    try:
+        res = fill_missing_columns(parse(db, columns=CATALOG_COLUMNS,
+                                         engine=engine), CATALOG_COLUMNS)
+    except Exception as err:
+        print("Parsing {} failed: {}".format(db, err))
+        return db, simName, None, None
+    model, bauwerke = summarize(res)
+    return db, simName, model, bauwerke
+
+
+class modelcatalog(object):
+    """
+    catalog class - context manager around the sqlite catalog file
+
+    usage::
+
+        with modelcatalog("modelle.kcat") as cat:
+            cat.update(get_filetype_in_dir("modelle"))
+            print(cat.query(["E0>40"]))
+    """
+    def __init__(self, catalogPath=None):
+        self.catalogPath = os.path.abspath(catalogPath or default_catalog())
+        self.conn = None
+
+    def __enter__(self):
+        catDir = os.path.dirname(self.catalogPath)
+        if not os.path.exists(catDir):
+            os.makedirs(catDir)
+        self.conn = sqlite3.connect(self.catalogPath)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS models (path TEXT PRIMARY KEY, "
+            "sim TEXT, size INTEGER, mtime INTEGER, updated REAL, {})".format(
+                ", ".join("{} {}".format(c, "INTEGER" if c.startswith("n_")
+                                          else "REAL")
+                          for c in MODEL_COLUMNS)))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS bauwerke (path TEXT, sim TEXT, "
+            "BEZEICHNUNG TEXT, TYP TEXT, {})".format(
+                ", ".join('"{}" REAL'.format(c) for c in INDICATORS)))
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_bauwerke_path "
+                          "ON bauwerke (path)")
+        for col in INDICATORS:
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS "ix_bauwerke_{0}" '
+                'ON bauwerke ("{0}")'.format(col))
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+
+    def models(self):
+        """{path: (size, mtime)} of the cataloged models
+        """
+        cur = self.conn.execute("SELECT path, size, mtime FROM models")
+        return dict((r[0], (r[1], r[2])) for r in cur.fetchall())
+
+    def write(self, db, simName, model, bauwerke):
+        """replace the catalog entries of one model
+        """
+        db = os.path.abspath(db)
+        stat = os.stat(db)
+        with self.conn:
+            self.remove(db)
+            self.conn.execute(
+                "INSERT INTO models (path, sim, size, mtime, updated, {}) "
+                "VALUES ({})".format(", ".join(MODEL_COLUMNS),
+                                     ", ".join("?" * (len(MODEL_COLUMNS) + 5))),
+                [db, simName, stat.st_size, stat.st_mtime_ns, time.time()] +
+                [model.get(c) for c in MODEL_COLUMNS])
+            self.conn.executemany(
+                "INSERT INTO bauwerke VALUES ({})".format(
+                    ", ".join("?" * (len(INDICATORS) + 4))),
+                ((db, simName) + row for row in bauwerke))
+
+    def remove(self, db):
+        """remove a model from the catalog
+        """
+        self.conn.execute("DELETE FROM bauwerke WHERE path = ?", (db,))
+        self.conn.execute("DELETE FROM models WHERE path = ?", (db,))
+
+    def update(self, dbs, workers=None, prune=True, engine=kdbf):
+        """add new and changed models to the catalog
+
+        Only databases whose size or modification time differ from the
+        cataloged state are parsed, in a process pool.
+
+        Params
+        ------
+        dbs (list): paths of the kdbf files
+        workers (int): number of worker processes, defaults to the cpu count
+        prune (bool): remove cataloged models whose file no longer exists
+        engine (class): database context manager class, defaults to kdbf
+
+        Returns
+        -------
+        updated (list): paths of the parsed databases
+        """
+        from functools import partial
+        from concurrent.futures import ProcessPoolExecutor
+
+        known = self.models()
+        if prune:
+            with self.conn:
+                for db in known:
+                    if not os.path.exists(db):
+                        print("{} entfernt".format(db))
+                        self.remove(db)
+
+        todo = []
+        for db in dbs:
+            db = os.path.abspath(db)
+            stat = os.stat(db)
+            if known.get(db) != (stat.st_size, stat.st_mtime_ns):
+                todo.append(db)
+
+        updated = []
+        if not todo:
+            return updated
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for db, simName, model, bauwerke in pool.map(
+                    partial(_catalog_sim, engine=engine), todo):
+                if model is None:
+                    continue
+                self.write(db, simName, model, bauwerke)
+                updated.append(db)
+        print("{} von {} Modellen aktualisiert".format(len(updated), len(dbs)))
+        return updated
+
+    def query(self, conditions=None, top=None, by=None, ascending=False,
+              models=False, anyCondition=False):
+        """query Bauwerke or models of the catalog
+
+        Params
+        ------
+        conditions (list): filter conditions, see parse_condition
+        top (int): opt. number of rows to return
+        by (str): opt. column to sort by
+        ascending (bool): sort ascending instead of descending
+        models (bool): query the model summaries instead of the Bauwerke
+        anyCondition (bool): rows matching any instead of all conditions
+
+        Returns
+        -------
+        df (pandas.DataFrame): matching rows
+        """
+        import pandas as pd
+
+        if models:
+            cols = ["sim", "path"] + MODEL_COLUMNS
+            table = "models"
+        else:
+            cols = ["sim", "BEZEICHNUNG", "TYP"] + INDICATORS
+            table = "bauwerke"
+
+        where = []
+        params = []
+        for text in conditions or []:
+            sql, values = parse_condition(text, cols)
+            where.append(sql)
+            params += values
+        if by is not None:
+            by = known_column(by, cols)
+        sql = "SELECT {} FROM {}".format(
+            ", ".join('"{}"'.format(c) for c in cols), table)
+        if where:
+            sql += " WHERE " + (" OR " if anyCondition else " AND ").join(where)
+        if by is not None:
+            sql += ' ORDER BY "{0}" IS NULL, "{0}" {1}'.format(
+                by, "ASC" if ascending else "DESC")
+        else:
+            sql += " ORDER BY sim"
+        if top is not None:
+            sql += " LIMIT {:d}".format(top)
+        return pd.read_sql_query(sql, self.conn, params=params)
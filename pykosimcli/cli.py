@@ -3,7 +3,6 @@
 
 import os
 import argparse
-import argcomplete
 
 
 def parse_cli(*args):
@@ -14,13 +13,97 @@ def parse_cli(*args):
 
     # kosim = parser.add_parser(dest="pykosim", help='run plaus tests on Kosim models')
 
-    parser.add_argument('fileIn', type=str, help='kdbf file path')
+    parser.add_argument('fileIn', type=str,
+                        help='kdbf file path, .kstore result store or '
+                             'directory in batch mode')
     parser.add_argument('--plot', action='store_true', default=False)
     parser.add_argument('--xcel', type=str, nargs='?', default=None,
                             help='opt:excel file path for plaus output')
+    parser.add_argument('--check', action='store_true', default=False,
+                        help='opt:print Bauwerke violating plausibility rules')
+    parser.add_argument('--render', type=str, default=None, metavar='DIR',
+                        help='opt:render plots without display to directory')
+    parser.add_argument('--format', type=str, default='png',
+                        help='opt:image format for --render, e.g. png, svg')
+    parser.add_argument('--watch', action='store_true', default=False,
+                        help='opt:keep running and update outputs when the '
+                             'kdbf file is rewritten')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='opt:polling interval of --watch in s')
+    parser.add_argument('--batch', action='store_true', default=False,
+                        help='parse all kdbf files found in directory fileIn')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='opt:number of worker processes in batch mode')
+    parser.add_argument('--query-workers', type=int, default=1,
+                        help='opt:number of concurrent database connections')
+    parser.add_argument('--cache', type=str, nargs='?', default=None,
+                        const='', metavar='DIR',
+                        help='opt:cache parsed results, optional cache dir')
+    parser.add_argument('--cache-size', type=float, default=2048,
+                        help='opt:maximum cache size in MB')
+    parser.add_argument('--cache-hash', action='store_true', default=False,
+                        help='opt:add the file content hash to the cache key')
+    parser.add_argument('--store', type=str, default=None, metavar='PATH',
+                        help='opt:export fileIn (all kdbf files with --batch) '
+                             'to a .kstore result store and exit')
+    parser.add_argument('--sim', type=str, default=None,
+                        help='opt:simulation to read from a .kstore fileIn')
+    parser.add_argument('--catalog', type=str, nargs='?', default=None,
+                        const='', metavar='PATH',
+                        help='opt:add the kdbf files of fileIn to a model '
+                             'catalog (.kcat), optional catalog path')
+    parser.add_argument('--where', type=str, action='append', default=None,
+                        metavar='EXPR',
+                        help='opt:catalog filter, e.g. E0>40 or NA198!3:9 '
+                             '(outside 3-9), can be repeated')
+    parser.add_argument('--any', action='store_true', default=False,
+                        help='opt:match any instead of all --where filters')
+    parser.add_argument('--top', type=int, default=None,
+                        help='opt:number of catalog rows to print')
+    parser.add_argument('--by', type=str, default=None,
+                        help='opt:sort catalog rows by column, descending')
+    parser.add_argument('--asc', action='store_true', default=False,
+                        help='opt:sort catalog rows ascending')
+    parser.add_argument('--models', action='store_true', default=False,
+                        help='opt:query the model summaries of the catalog')
+    parser.add_argument('--diff', type=str, nargs='+', default=None,
+                        metavar='FILE',
+                        help='opt:compare the Bauwerk, Gebiet and Transport '
+                             'tables of the models with fileIn')
+    parser.add_argument('--atol', type=float, default=1e-9,
+                        help='opt:absolute tolerance of --diff')
+    parser.add_argument('--rtol', type=float, default=1e-6,
+                        help='opt:relative tolerance of --diff')
+    parser.add_argument('--diff-out', type=str, default=None, metavar='PATH',
+                        help='opt:write the --diff report to csv or xlsx')
+    parser.add_argument('--sequential', action='store_true', default=False,
+                        help='opt:run parse, plots and excel export one after '
+                             'another instead of overlapping them, always '
+                             'on a single cpu')
+    parser.add_argument('--compact', action='store_true', default=False,
+                        help='opt:reduce the memory of the parsed tables '
+                             '(categoricals, downcast numbers, no duplicated '
+                             'join columns)')
+    parser.add_argument('--compact-tol', type=float, default=0.0,
+                        help='opt:relative tolerance for float32 downcasting '
+                             'with --compact, 0 only lossless')
+    parser.add_argument('--no-daemon', action='store_true', default=False,
+                        help='opt:don\'t use a running analysis daemon')
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help='opt:print wall time, cpu time, rows and peak '
+                             'memory per stage')
+    parser.add_argument('--profile-json', type=str, default=None,
+                        metavar='PATH',
+                        help='opt:write the stage profile as json')
+    parser.add_argument('--profile-dump', type=str, default=None,
+                        metavar='PATH',
+                        help='opt:write a cProfile dump, e.g. for snakeviz')
 
-    # add autocompletion
-    argcomplete.autocomplete(parser)
+    # add autocompletion, argcomplete is only needed when the shell asks
+    # for completions
+    if "_ARGCOMPLETE" in os.environ:
+        import argcomplete
+        argcomplete.autocomplete(parser)
     return parser.parse_args(*args)
 
 
@@ -28,23 +111,195 @@ def main(*args):
     """utility for creating plausibiltty plots of qstrg, pegel, and bauwerk
     datasets from hydro_as-2d output
     """
-    import pykosimcli.parsedb as pk
-
     args = parse_cli(*args)
     print(args)
 
-    res = pk.parse(os.path.abspath(args.fileIn))
+    # a running daemon answers without loading pandas and the database
+    from pykosimcli.daemon import run_remote
+    if run_remote(args):
+        return
+
+    if not (args.profile or args.profile_json or args.profile_dump):
+        return run(args)
+
+    from pykosimcli.timing import profiler
+    prof = profiler()
+    cprof = None
+    if args.profile_dump:
+        import cProfile
+        cprof = cProfile.Profile()
+        cprof.enable()
+    try:
+        with prof:
+            run(args)
+    finally:
+        if cprof is not None:
+            cprof.disable()
+            cprof.dump_stats(args.profile_dump)
+        print(prof.summary())
+        if args.profile_json:
+            prof.save_json(args.profile_json)
+
+
+def run(args):
+    """run the actions selected by the parsed command line arguments
+    """
+    # heavy dependencies (pandas, numpy) are loaded after argument parsing
+    import pykosimcli.parsedb as pk
+    from pykosimcli.store import is_store
+    from pykosimcli.catalog import is_catalog
+    from pykosimcli.timing import stage
+
+    cache = None
+    if args.cache is not None:
+        from pykosimcli.cache import kdbfcache
+        cache = kdbfcache(args.cache or None,
+                          maxSize=int(args.cache_size * 1024 ** 2),
+                          useHash=args.cache_hash)
+
+    if args.catalog is not None or is_catalog(args.fileIn):
+        from pykosimcli.catalog import modelcatalog
+        if is_catalog(args.fileIn):
+            catalog = modelcatalog(args.fileIn)
+        else:
+            catalog = modelcatalog(args.catalog or None)
+        with catalog as cat:
+            if not is_catalog(args.fileIn):
+                if os.path.isdir(args.fileIn):
+                    dbs = pk.get_filetype_in_dir(os.path.abspath(args.fileIn))
+                else:
+                    dbs = [os.path.abspath(args.fileIn)]
+                cat.update(dbs, workers=args.workers)
+            if args.where or args.top or args.by or args.models:
+                try:
+                    df = cat.query(args.where, top=args.top, by=args.by,
+                                   ascending=args.asc, models=args.models,
+                                   anyCondition=args.any)
+                except ValueError as err:
+                    print("Ungueltige Abfrage: {}".format(err))
+                    return
+                print(df.to_string(index=False))
+        return
+
+    if args.diff:
+        from pykosimcli.diff import diff_models, format_report
+        with stage("diff"):
+            report = diff_models([args.fileIn] + args.diff, atol=args.atol,
+                                 rtol=args.rtol)
+        print(format_report(report, args.top))
+        if args.diff_out is not None:
+            if args.diff_out.lower().endswith(".xlsx"):
+                pk.res_dict_to_excel({"diff": report.set_index("sim")},
+                                     os.path.abspath(args.diff_out))
+            else:
+                report.to_csv(args.diff_out, index=False)
+        return
+
+    if args.store is not None:
+        from pykosimcli.store import export_store, STORE_SUFFIX
+        storePath = os.path.abspath(args.store)
+        if not storePath.lower().endswith(STORE_SUFFIX):
+            storePath += STORE_SUFFIX
+        if args.batch:
+            dbs = pk.get_filetype_in_dir(os.path.abspath(args.fileIn))
+        else:
+            dbs = [os.path.abspath(args.fileIn)]
+        export_store(dbs, storePath, workers=args.workers, cache=cache)
+        return
+
+    if args.batch and is_store(args.fileIn):
+        # all simulations of the store with column sim
+        res = pk.parse(os.path.abspath(args.fileIn), full=True)
+        if args.render is not None:
+            from pykosimcli.store import kstore
+            with kstore(args.fileIn) as st:
+                sims = st.sims()
+            for sim in sims:
+                pk.render_plots(pk.parse(os.path.abspath(args.fileIn),
+                                         sim=sim, project=True),
+                                os.path.abspath(args.render), args.format, sim)
+        if args.xcel is not None:
+            pk.res_dict_to_excel(res, os.path.abspath(args.xcel))
+        return
+
+    if args.batch:
+        if args.plot:
+            print('Grafiken im Batch-Modus nicht verfuegbar, --render nutzen')
+        render = os.path.abspath(args.render) if args.render else None
+        if args.xcel is None and render is not None:
+            # the merged tables are not needed, only the plots per model
+            pk.render_kdbf_dir(os.path.abspath(args.fileIn), render,
+                               args.format, workers=args.workers, cache=cache)
+            return
+        # the plots are rendered by the workers from the parsed results
+        res = pk.parse_kdbf_dir(os.path.abspath(args.fileIn),
+                                workers=args.workers, cache=cache,
+                                full=True, compact=args.compact,
+                                floatTol=args.compact_tol, renderDir=render,
+                                fmt=args.format)
+        if args.xcel is not None:
+            pk.res_dict_to_excel(res, os.path.abspath(args.xcel))
+        return
+
+    if args.watch:
+        from pykosimcli.watch import kdbfwatcher
+        render = os.path.abspath(args.render) if args.render else None
+        xcel = os.path.abspath(args.xcel) if args.xcel else None
+        kdbfwatcher(args.fileIn, xcel=xcel, render=render, fmt=args.format,
+                    check=args.check).run(args.interval)
+        return
+
+    if is_store(args.fileIn) and args.sim is None:
+        from pykosimcli.store import kstore
+        with kstore(args.fileIn) as st:
+            sims = st.sims()
+        if len(sims) > 1:
+            print('Store enthaelt mehrere Simulationen, --sim angeben: '
+                  '{}'.format(', '.join(sims)))
+            return
+
+    # interactive plots need the main thread, they run after the pipeline.
+    # On a single cpu the overlapping outputs only add process overhead.
+    if not args.sequential and not args.plot and \
+            (args.render is not None or args.xcel is not None) and \
+            (os.cpu_count() or 1) > 1:
+        from pykosimcli.pipeline import pipeline
+        render = os.path.abspath(args.render) if args.render else None
+        xcel = os.path.abspath(args.xcel) if args.xcel else None
+        pipeline(args.fileIn, xcel=xcel, render=render, fmt=args.format,
+                 check=args.check, cache=cache,
+                 queryWorkers=args.query_workers, sim=args.sim,
+                 compact=args.compact, floatTol=args.compact_tol).run()
+        return
+
+    with stage("parse"):
+        res = pk.parse(os.path.abspath(args.fileIn), cache=cache,
+                       workers=args.query_workers, sim=args.sim,
+                       project=True)
+
+    if args.compact:
+        from pykosimcli.compact import compact
+        with stage("compact"):
+            res = compact(res, args.compact_tol)
+
+    if args.check:
+        with stage("plaus_report"):
+            print(pk.plaus_report(res))
 
     # generate graphs
     if args.plot:
         try:
             pk.plot_zb(res)
-        except ValueError:
+        except (ValueError, KeyError):
             print('Daten zum Zentralbecken fehlen, ZB Grafik nicht darstellbar')
         pk.plot_mbw_fracht(res)
         pk.plot_mbw_spez_fracht_and_vol(res)
         pk.plot_entlastungswerte(res)
 
+    if args.render is not None:
+        pk.render_plots(res, os.path.abspath(args.render), args.format,
+                        args.sim or pk.get_filename(args.fileIn))
+
     if args.xcel is not None:
         pk.plaus_excel(res, os.path.abspath(args.xcel))
 
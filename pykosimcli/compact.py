@@ -0,0 +1,168 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import numpy as np
+import pandas as pd
+
+from pykosimcli.projection import required_columns
+
+"""memory compaction of parse() results - categorical strings, downcast
+numbers and no duplicated join columns
+"""
+
+# string columns with at most this share of distinct values become categorical
+CATEGORY_RATIO = 0.5
+
+# unique column names of duplicated join columns, e.g. BEZEICHNUNG_1
+DUPLICATE = re.compile(r"^(.+)_(\d+)$")
+
+
+def frame_memory(df):
+    """memory of a dataframe including its index and python objects in bytes
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def res_memory(res):
+    """{table: bytes} of a parse() result dict
+    """
+    return dict((key, frame_memory(df)) for key, df in res.items())
+
+
+def same_values(a, b):
+    """True if two columns hold the same values, NaN equals NaN
+    """
+    a = np.asarray(a, dtype=object)
+    b = np.asarray(b, dtype=object)
+    return bool(((a == b) | (pd.isna(a) & pd.isna(b))).all())
+
+
+def duplicate_columns(df, keep=()):
+    """columns repeating another column of the join, e.g. ID_1 or
+    BEZEICHNUNG_2 holding the same values as ID or the BEZEICHNUNG index
+
+    Params
+    ------
+    df (pandas.DataFrame): parsed table
+    keep (list): columns which are never reported
+
+    Returns
+    -------
+    cols (list): names of the duplicated columns
+    """
+    cols = []
+    for col in df.columns:
+        match = DUPLICATE.match(str(col))
+        if match is None or col in keep:
+            continue
+        base = match.group(1)
+        if base in df.columns:
+            ref = df[base]
+        elif base == df.index.name:
+            ref = df.index
+        else:
+            continue
+        if same_values(df[col], ref):
+            cols.append(col)
+    return cols
+
+
+def downcast_float(values, floatTol=0.0):
+    """float32 copy of a float64 array if all values stay within the relative
+    tolerance, None otherwise
+
+    With the default tolerance 0 only exactly representable values are
+    downcast, so that the plausibility limits are compared against the
+    original values.
+    """
+    with np.errstate(over="ignore", invalid="ignore"):
+        small = values.astype(np.float32)
+        back = small.astype(np.float64)
+    if floatTol:
+        ok = np.allclose(back, values, rtol=floatTol, atol=0, equal_nan=True)
+    else:
+        ok = np.array_equal(back, values, equal_nan=True)
+    return small if ok else None
+
+
+def compact_frame(df, floatTol=0.0, categoryRatio=CATEGORY_RATIO, drop=()):
+    """compact copy of a parsed table
+
+    Params
+    ------
+    df (pandas.DataFrame): parsed table
+    floatTol (float): relative tolerance for float32 downcasting, None keeps
+        float64
+    categoryRatio (float): maximum share of distinct values of string
+        columns converted to categoricals
+    drop (list): columns to drop
+
+    Returns
+    -------
+    df (pandas.DataFrame): compacted table
+    """
+    cols = {}
+    for col in df.columns:
+        if col in drop:
+            continue
+        values = df[col]
+        # object columns and the string dtype of newer pandas
+        if pd.api.types.is_object_dtype(values.dtype) or \
+                pd.api.types.is_string_dtype(values.dtype):
+            n = values.nunique(dropna=True)
+            if len(values) and n <= categoryRatio * len(values):
+                values = values.astype("category")
+        elif values.dtype.kind in "iu":
+            values = pd.to_numeric(values, downcast="integer")
+        elif values.dtype == np.float64 and floatTol is not None:
+            small = downcast_float(values.to_numpy(), floatTol)
+            if small is not None:
+                values = pd.Series(small, index=df.index, name=col)
+        cols[col] = values
+    return pd.DataFrame(cols, index=df.index, columns=list(cols))
+
+
+def compact(res, floatTol=0.0, categoryRatio=CATEGORY_RATIO,
+            dropDuplicates=True, keep=None, report=True):
+    """compact the tables of a parse() result dict
+
+    Duplicated join columns are dropped unless a consumer declared them (see
+    projection.requires) or the table is declared with all columns, e.g.
+    because of positional formats in the plausibility workbook.
+
+    Params
+    ------
+    res (dict): parse() results
+    floatTol (float): relative tolerance for float32 downcasting, None keeps
+        float64, 0 only downcasts exactly representable values
+    categoryRatio (float): maximum share of distinct values of string
+        columns converted to categoricals
+    dropDuplicates (bool): drop duplicated join columns
+    keep (dict): opt. {table: [columns]} never dropped
+    report (bool): print the memory before and after compaction
+
+    Returns
+    -------
+    res (dict): dictionary of the compacted tables
+    """
+    declared = required_columns()
+    before = res_memory(res) if report else None
+    out = {}
+    for key, df in res.items():
+        drop = []
+        if dropDuplicates and not (key in declared and declared[key] is None):
+            protect = set(declared.get(key) or []) | \
+                set((keep or {}).get(key, []))
+            drop = duplicate_columns(df, protect)
+        out[key] = compact_frame(df, floatTol, categoryRatio, drop)
+
+    if report:
+        after = res_memory(out)
+        for key in out:
+            print("{:<22} {:>9.2f} MB -> {:>9.2f} MB".format(
+                key, before[key] / 1024 ** 2, after[key] / 1024 ** 2))
+        print("{:<22} {:>9.2f} MB -> {:>9.2f} MB".format(
+            "Gesamt", sum(before.values()) / 1024 ** 2,
+            sum(after.values()) / 1024 ** 2))
+    return out
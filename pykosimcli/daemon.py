@@ -0,0 +1,381 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import io
+import sys
+import time
+import pickle
+import socket
+import struct
+import argparse
+from collections import OrderedDict
+
+"""analysis daemon - keeps parsed results and open database connections of
+recently used models in memory and serves parse, plausibility and export
+requests over a local unix socket
+
+The cli sends its requests to a running daemon instead of parsing the model
+itself. The client part of this module only uses the standard library, so a
+request does not pay for importing pandas, matplotlib or fdb.
+
+usage::
+
+    $ python -m pykosimcli.daemon start &
+    $ pykosimcli model.kdbf --check --xcel plaus.xlsx
+    $ python -m pykosimcli.daemon stop
+"""
+
+# default number of models kept in memory
+MAX_MODELS = 8
+
+# timeout of the client when connecting to the daemon in s
+CONNECT_TIMEOUT = 0.2
+
+HEADER = struct.Struct("!Q")
+
+
+def default_socket():
+    """default socket path, can be set with the environment variable
+    PYKOSIMCLI_SOCKET
+    """
+    if "PYKOSIMCLI_SOCKET" in os.environ:
+        return os.environ["PYKOSIMCLI_SOCKET"]
+    base = os.environ.get("PYKOSIMCLI_CACHE",
+                          os.path.join(os.path.expanduser("~"), ".cache",
+                                       "pykosimcli"))
+    return os.path.join(base, "daemon.sock")
+
+
+def send_msg(sock, obj):
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Verbindung zum Daemon unterbrochen")
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_msg(sock):
+    n = HEADER.unpack(_recv_exact(sock, HEADER.size))[0]
+    return pickle.loads(_recv_exact(sock, n))
+
+
+# --- client ---
+def request(cmd, socketPath=None, timeout=None, **kwargs):
+    """send a request to the daemon
+
+    Params
+    ------
+    cmd (str): command, see kdbfdaemon.handle
+    socketPath (str): opt. socket path, default see default_socket
+    timeout (float): opt. timeout of the request in s
+    kwargs: arguments of the command
+
+    Returns
+    -------
+    result: result of the command, the output printed by the daemon while
+        handling the request is printed
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(socketPath or default_socket())
+        sock.settimeout(timeout)
+        kwargs["cmd"] = cmd
+        send_msg(sock, kwargs)
+        reply = recv_msg(sock)
+    finally:
+        sock.close()
+    if reply.get("output"):
+        print(reply["output"], end="")
+    if not reply["ok"]:
+        raise RuntimeError(reply["error"])
+    return reply.get("result")
+
+
+def is_running(socketPath=None):
+    """True if a daemon answers on the socket
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    socketPath = socketPath or default_socket()
+    if not os.path.exists(socketPath):
+        return False
+    try:
+        return request("ping", socketPath, timeout=CONNECT_TIMEOUT) == "pong"
+    except (OSError, RuntimeError, ValueError, EOFError):
+        return False
+
+
+def run_remote(args, socketPath=None):
+    """run a single model cli call on the daemon
+
+    Params
+    ------
+    args (argparse.Namespace): parsed cli arguments
+
+    Returns
+    -------
+    done (bool): False if the call can't be served by the daemon, e.g. for
+        interactive plots, batch or watch mode, options the daemon doesn't
+        support or if no daemon is running
+    """
+    local = (args.plot or args.batch or args.watch or args.store is not None
+             or args.catalog is not None or args.profile or args.profile_json
+             or args.profile_dump or args.no_daemon or args.diff)
+    # the daemon parses with its own connection and keeps the results in
+    # memory, options changing how the model is parsed run locally
+    local = local or (args.compact or args.cache is not None or
+                      args.query_workers != 1 or args.sequential)
+    if local or not (args.check or args.xcel is not None or
+                     args.render is not None):
+        return False
+    if not is_running(socketPath):
+        return False
+
+    fIn = os.path.abspath(args.fileIn)
+    start = time.time()
+    try:
+        if args.check:
+            print(request("report", socketPath, fIn=fIn, sim=args.sim))
+        if args.render is not None:
+            request("render", socketPath, fIn=fIn, sim=args.sim,
+                    outDir=os.path.abspath(args.render), fmt=args.format)
+        if args.xcel is not None:
+            request("excel", socketPath, fIn=fIn, sim=args.sim,
+                    excelPath=os.path.abspath(args.xcel))
+    except RuntimeError as err:
+        print("Daemon Fehler: {}".format(err))
+    print("Daemon Antwort nach {:.3f} s".format(time.time() - start))
+    return True
+
+
+# --- server ---
+def file_state(filePath):
+    stat = os.stat(filePath)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def copy_results(res):
+    """copy of a result dict for a single request, outputs may add columns
+    to the tables and must not change the results kept in memory
+    """
+    return dict((key, df.copy()) for key, df in res.items())
+
+
+class kdbfdaemon(object):
+    """
+    daemon class - serves requests sequentially, parsed results and open
+    connections of the last maxModels models are kept, a model is parsed
+    again when its file changed
+
+    Params
+    ------
+    socketPath (str): opt. socket path, default see default_socket
+    maxModels (int): number of models kept in memory
+    engine (class): database context manager class, defaults to kdbf
+    """
+    def __init__(self, socketPath=None, maxModels=MAX_MODELS, engine=None):
+        from pykosimcli.kdbf import kdbf
+
+        self.socketPath = os.path.abspath(socketPath or default_socket())
+        self.maxModels = maxModels
+        self.engine = engine or kdbf
+        # {(path, sim): (file state, res)}, least recently used first
+        self.models = OrderedDict()
+        # {path: (file state, engine object, connection)}
+        self.conns = OrderedDict()
+        self.running = False
+
+    def connection(self, fIn, state):
+        """open connection to a model, reopened if the file changed
+        """
+        entry = self.conns.get(fIn)
+        if entry is not None and entry[0] == state:
+            self.conns.move_to_end(fIn)
+            return entry[2]
+        self.close(fIn)
+        db = self.engine(fIn)
+        conn = db.__enter__()
+        self.conns[fIn] = (state, db, conn)
+        while len(self.conns) > self.maxModels:
+            self.close(next(iter(self.conns)))
+        return conn
+
+    def close(self, fIn):
+        entry = self.conns.pop(fIn, None)
+        if entry is not None:
+            try:
+                entry[1].__exit__(None, None, None)
+            except Exception as err:
+                print("Schliessen von {} fehlgeschlagen: {}".format(fIn, err))
+
+    def results(self, fIn, sim=None):
+        """parsed results of a model from memory or parsed on the warm
+        connection
+        """
+        import pykosimcli.parsedb as pk
+        from pykosimcli.kdbf import KDBFselect
+        from pykosimcli.store import is_store
+        from pykosimcli.projection import required_columns
+
+        state = file_state(fIn)
+        key = (fIn, sim)
+        entry = self.models.get(key)
+        if entry is not None and entry[0] == state:
+            self.models.move_to_end(key)
+            return entry[1]
+
+        if is_store(fIn) and sim is None:
+            # same guard as the local cli call
+            from pykosimcli.store import kstore
+            with kstore(fIn) as st:
+                sims = st.sims()
+            if len(sims) > 1:
+                raise ValueError("Store enthaelt mehrere Simulationen, --sim "
+                                 "angeben: {}".format(", ".join(sims)))
+
+        if is_store(fIn):
+            res = pk.parse(fIn, sim=sim, project=True)
+        else:
+            columns = required_columns()
+            conn = self.connection(fIn, state)
+            res = {}
+            for query in KDBFselect:
+                if query in columns:
+                    res[query] = pk.query_table(conn, query, columns[query],
+                                                required=columns[query])
+        self.models[key] = (state, res)
+        while len(self.models) > self.maxModels:
+            self.models.popitem(last=False)
+        return res
+
+    def handle(self, req):
+        """run a request
+
+        commands: ping, stop, stats, parse (returns the result dict),
+        report (plausibility report), excel (writes the plausibility
+        workbook), render (renders the plots)
+        """
+        import pykosimcli.parsedb as pk
+
+        cmd = req.get("cmd")
+        if cmd == "ping":
+            return "pong"
+        if cmd == "stop":
+            self.running = False
+            return "stopped"
+        if cmd == "stats":
+            return {"models": [k[0] for k in self.models],
+                    "connections": list(self.conns)}
+
+        fIn = os.path.abspath(req["fIn"])
+        res = self.results(fIn, req.get("sim"))
+        if cmd == "parse":
+            return res
+        if cmd == "report":
+            return pk.plaus_report(res)
+        if cmd == "excel":
+            pk.plaus_excel(copy_results(res), req["excelPath"])
+            return req["excelPath"]
+        if cmd == "render":
+            prefix = req.get("sim") or pk.get_filename(fIn)
+            return pk.render_plots(copy_results(res), req["outDir"],
+                                   req.get("fmt", "png"), prefix)
+        raise ValueError("Unknown command {}".format(cmd))
+
+    def serve_client(self, client):
+        from contextlib import redirect_stdout
+
+        try:
+            req = recv_msg(client)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return
+        out = io.StringIO()
+        try:
+            with redirect_stdout(out):
+                result = self.handle(req)
+            reply = {"ok": True, "result": result}
+        except Exception as err:
+            reply = {"ok": False, "error": "{}: {}".format(
+                type(err).__name__, err)}
+        reply["output"] = out.getvalue()
+        try:
+            send_msg(client, reply)
+        except OSError:
+            pass
+
+    def serve(self):
+        """serve requests until a stop request arrives
+        """
+        import matplotlib
+        matplotlib.use("Agg", force=True)
+
+        if is_running(self.socketPath):
+            print("Daemon laeuft bereits auf {}".format(self.socketPath))
+            return
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+        sockDir = os.path.dirname(self.socketPath)
+        if not os.path.exists(sockDir):
+            os.makedirs(sockDir)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only the user may send requests, they are unpickled
+        oldMask = os.umask(0o177)
+        try:
+            server.bind(self.socketPath)
+        finally:
+            os.umask(oldMask)
+        server.listen(8)
+        self.running = True
+        print("Daemon bereit auf {}".format(self.socketPath))
+        try:
+            while self.running:
+                client, addr = server.accept()
+                with client:
+                    self.serve_client(client)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            os.remove(self.socketPath)
+            for fIn in list(self.conns):
+                self.close(fIn)
+
+
+def main(*args):
+    parser = argparse.ArgumentParser(
+        description="pykosimcli analysis daemon")
+    parser.add_argument("command", choices=["start", "stop", "status"])
+    parser.add_argument("--socket", type=str, default=None,
+                        help="opt:socket path")
+    parser.add_argument("--max-models", type=int, default=MAX_MODELS,
+                        help="opt:number of models kept in memory")
+    args = parser.parse_args(*args)
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("Unix Sockets werden auf diesem System nicht unterstuetzt")
+        return 1
+
+    if args.command == "start":
+        kdbfdaemon(args.socket, args.max_models).serve()
+    elif not is_running(args.socket):
+        print("Kein Daemon aktiv")
+        return 1
+    elif args.command == "stop":
+        request("stop", args.socket)
+    else:
+        print(request("stats", args.socket))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,214 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+from pykosimcli.kdbf import kdbf
+from pykosimcli.compact import duplicate_columns
+
+"""model version diff - aligns the Bauwerk, Gebiet and Transport tables of two
+or more models on BEZEICHNUNG and reports the rows and values that changed
+"""
+
+# tables compared by default
+DIFF_TABLES = ["mischwasserbauwerke", "regenwasserbauwerke", "gebiete",
+               "transport"]
+
+# columns never compared, database ids change between model versions
+IGNORE = re.compile(r"^ID(_\d+)?$")
+
+# default tolerances, values count as equal if |new - old| <= atol + rtol*|old|
+ATOL = 1e-9
+RTOL = 1e-6
+
+REPORT_COLUMNS = ["table", "BEZEICHNUNG", "column", "change", "old", "new",
+                  "abs", "rel"]
+
+
+def _unique_index(df, name):
+    """drop rows with duplicate BEZEICHNUNG, they can't be aligned
+    """
+    dup = df.index.duplicated()
+    if dup.any():
+        print("{}: {} doppelte Bezeichnungen ignoriert".format(name,
+                                                                dup.sum()))
+        df = df[~dup]
+    return df
+
+
+def diff_table(old, new, table="", atol=ATOL, rtol=RTOL):
+    """changes between two versions of a parsed table
+
+    Params
+    ------
+    old, new (pandas.DataFrame): tables indexed by BEZEICHNUNG
+    table (str): name of the table in the report
+    atol, rtol (float): absolute and relative tolerance of numeric values
+
+    Returns
+    -------
+    report (pandas.DataFrame): one row per added or removed Bauwerk, added
+        or removed column and changed value, see REPORT_COLUMNS
+    """
+    old = _unique_index(old, table)
+    new = _unique_index(new, table)
+    # join columns repeating another column in both versions, e.g.
+    # BEZEICHNUNG_1, would only report every change twice
+    dups = set(duplicate_columns(old)).intersection(duplicate_columns(new))
+    old = old.drop(columns=list(dups))
+    new = new.drop(columns=list(dups))
+    parts = []
+
+    added = new.index.difference(old.index, sort=False)
+    removed = old.index.difference(new.index, sort=False)
+    for names, change in ((added, "neu"), (removed, "entfernt")):
+        if len(names):
+            parts.append(pd.DataFrame({"BEZEICHNUNG": np.asarray(names,
+                                                                 dtype=object),
+                                       "column": "", "change": change}))
+
+    oldCols = [c for c in old.columns if c != "sim" and not IGNORE.match(c)]
+    newCols = [c for c in new.columns if c != "sim" and not IGNORE.match(c)]
+    for cols, change in (([c for c in newCols if c not in set(oldCols)],
+                          "Spalte neu"),
+                         ([c for c in oldCols if c not in set(newCols)],
+                          "Spalte entfernt")):
+        if cols:
+            parts.append(pd.DataFrame({"BEZEICHNUNG": "", "column": cols,
+                                       "change": change}))
+
+    common = old.index.intersection(new.index, sort=False)
+    cols = [c for c in oldCols if c in set(newCols)]
+    a = old.loc[common, cols]
+    b = new.loc[common, cols]
+    numeric = [c for c in cols if a[c].dtype.kind in "iufb" and
+               b[c].dtype.kind in "iufb"]
+    others = [c for c in cols if c not in set(numeric)]
+
+    if numeric and len(common):
+        va = a[numeric].to_numpy(dtype=np.float64, na_value=np.nan)
+        vb = b[numeric].to_numpy(dtype=np.float64, na_value=np.nan)
+        changed = ~np.isclose(vb, va, rtol=rtol, atol=atol, equal_nan=True)
+        rows, colIdx = np.nonzero(changed)
+        if len(rows):
+            old_ = va[rows, colIdx]
+            new_ = vb[rows, colIdx]
+            absDiff = new_ - old_
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rel = np.where(old_ != 0, absDiff / np.abs(old_), np.inf)
+            parts.append(pd.DataFrame({
+                "BEZEICHNUNG": np.asarray(common, dtype=object)[rows],
+                "column": np.asarray(numeric, dtype=object)[colIdx],
+                "change": "geaendert", "old": old_, "new": new_,
+                "abs": absDiff, "rel": rel}))
+
+    if others and len(common):
+        oa = a[others].astype(object).to_numpy()
+        ob = b[others].astype(object).to_numpy()
+        changed = (oa != ob) & ~(pd.isna(oa) & pd.isna(ob))
+        rows, colIdx = np.nonzero(changed)
+        if len(rows):
+            parts.append(pd.DataFrame({
+                "BEZEICHNUNG": np.asarray(common, dtype=object)[rows],
+                "column": np.asarray(others, dtype=object)[colIdx],
+                "change": "geaendert", "old": oa[rows, colIdx],
+                "new": ob[rows, colIdx]}))
+
+    if not parts:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    report = pd.concat(parts, ignore_index=True)
+    report["table"] = table
+    return report.reindex(columns=REPORT_COLUMNS)
+
+
+def sort_report(report):
+    """sort a diff report: per table added and removed rows and columns
+    first, then the changed values by decreasing relative change, changes
+    without a numeric relative change (e.g. text) last
+    """
+    order = {"neu": 0, "entfernt": 1, "Spalte neu": 2, "Spalte entfernt": 3,
+             "geaendert": 4}
+    tables = dict((t, i) for i, t in enumerate(DIFF_TABLES))
+    rel = pd.to_numeric(report["rel"], errors="coerce").abs()
+    keys = pd.DataFrame({
+        "t": report["table"].map(lambda t: tables.get(t, len(tables))),
+        "c": report["change"].map(order),
+        "r": np.where(rel.isna(), np.inf, -rel),
+        "b": report["BEZEICHNUNG"].astype(str)})
+    idx = np.lexsort((keys["b"].to_numpy(), keys["r"].to_numpy(),
+                      keys["c"].to_numpy(), keys["t"].to_numpy()))
+    return report.iloc[idx].reset_index(drop=True)
+
+
+def diff_res(old, new, tables=None, atol=ATOL, rtol=RTOL):
+    """diff of two parse() result dicts
+
+    Returns
+    -------
+    report (pandas.DataFrame): sorted changes of all tables
+    """
+    parts = []
+    for table in tables or DIFF_TABLES:
+        if table in old and table in new:
+            parts.append(diff_table(old[table], new[table], table, atol,
+                                    rtol))
+        elif table in old or table in new:
+            print("Tabelle {} fehlt in einem der Modelle".format(table))
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return sort_report(pd.concat(parts, ignore_index=True))
+
+
+def diff_models(fIns, tables=None, atol=ATOL, rtol=RTOL, engine=kdbf):
+    """diff of two or more models, every model is compared to the first one
+
+    Params
+    ------
+    fIns (list): paths of the kdbf files or result stores, the first one is
+        the reference
+    tables (list): opt. tables to compare, default DIFF_TABLES
+    atol, rtol (float): absolute and relative tolerance of numeric values
+    engine (class): database context manager class, defaults to kdbf
+
+    Returns
+    -------
+    report (pandas.DataFrame): sorted changes with a column "sim" naming the
+        compared model, see parsedb.sim_names
+    """
+    from pykosimcli.parsedb import parse, sim_names
+
+    if len(fIns) < 2:
+        raise ValueError("Mindestens zwei Modelle fuer den Vergleich noetig")
+    columns = dict((t, None) for t in tables or DIFF_TABLES)
+    ref = parse(fIns[0], columns=columns, engine=engine)
+    # the same file may be compared twice, e.g. as a sanity check
+    paths = list(OrderedDict((os.path.abspath(f), None) for f in fIns))
+    names = dict(zip(paths, sim_names(paths)))
+    reports = []
+    for fIn in fIns[1:]:
+        simName = names[os.path.abspath(fIn)]
+        report = diff_res(ref, parse(fIn, columns=columns, engine=engine),
+                          tables, atol, rtol)
+        report.insert(0, "sim", simName)
+        reports.append(report)
+    return pd.concat(reports, ignore_index=True)
+
+
+def format_report(report, maxRows=None):
+    """compact text of a diff report
+    """
+    if not len(report):
+        return "Keine Aenderungen"
+    counts = report.groupby(["table", "change"], sort=False).size()
+    lines = ["{} {}: {}".format(t, c, n) for (t, c), n in counts.items()]
+    shown = report if maxRows is None else report.head(maxRows)
+    lines.append(shown.to_string(index=False, na_rep=""))
+    if maxRows is not None and len(report) > maxRows:
+        lines.append("... {} weitere Aenderungen".format(len(report) -
+                                                          maxRows))
+    return "\n".join(lines)
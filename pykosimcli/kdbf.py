@@ -4,8 +4,12 @@
 import os
 import shutil
 import tempfile
+import decimal
 import platform
-import fdb
+import numpy as np
+import pandas as pd
+from pykosimcli.timing import stage
+from pykosimcli.schema import unique_names
 
 """Kosim 7 Database class: firebird / Interbase
 """
@@ -35,10 +39,14 @@ class kdbf(object):
         # to add the client to the path:
         # export PATH=<path to firebird dir in pykosim>:$PATH
 
-        if platform.system() == "Windows":
-            fdb.load_api("fbembed.dll")
-        else:
-            pass
+        # the firebird client is only loaded when a database is opened
+        with stage("client load"):
+            import fdb
+
+            if platform.system() == "Windows":
+                fdb.load_api("fbembed.dll")
+            else:
+                pass
 
         # path to kdbf
         pth = os.path.abspath(self.filePath)
@@ -47,16 +55,19 @@ class kdbf(object):
             if platform.system() == "Windows":
                 self.tempdir = tempfile.mkdtemp()
                 print("creating tempdir at {}".format(self.tempdir))
-                shutil.copy(pth, self.tempdir)
+                with stage("temp copy"):
+                    shutil.copy(pth, self.tempdir)
                 tempPth = os.path.join(self.tempdir, os.path.basename(pth))
-                self.conn = fdb.connect(tempPth, user='sysdba',
-                                        password='masterkey')
+                with stage("connect"):
+                    self.conn = fdb.connect(tempPth, user='sysdba',
+                                            password='masterkey')
             else:
                 self.tempdir = False
                 tempPth = pth
-                self.conn = fdb.connect(tempPth, user='sysdba',
-                                        password='masterkey',
-                                        charset="latin1")
+                with stage("connect"):
+                    self.conn = fdb.connect(tempPth, user='sysdba',
+                                            password='masterkey',
+                                            charset="latin1")
         else:
             print('Unknown file type')
             raise AttributeError
@@ -93,30 +104,35 @@ def check_and_create_dir(root, dirName):
 
 
 # --- sql queries to databases ---
-MWB = """SELECT *
-FROM MISCHWASSERBAUWERKBESTAND AS bes
+MWB_FROM = """FROM MISCHWASSERBAUWERKBESTAND AS bes
 INNER JOIN MISCHWASSERBAUWERKPROZESSMJW AS MJW
 ON bes.ID = MJW.ID
 INNER JOIN MISCHWASSERBAUWERKPROZESSSGMJW AS gmjw
 ON bes.ID = gmjw.ID"""
 
 
-RWB = """SELECT *
-FROM REGENWASSERBEHANDLUNGBESTAND AS bes
+RWB_FROM = """FROM REGENWASSERBEHANDLUNGBESTAND AS bes
 JOIN REGENWASSERBEHANDLUNGPROZESSMJW AS MJW
 ON bes.ID = MJW.ID
 FULL OUTER JOIN REGENWASSERBEHANDLUNGBILANZSG AS zsg
 ON BES.ID = zsg.ID"""
 
 
-ZB = """SELECT *
-FROM SRC_A128
+ZB_FROM = """FROM SRC_A128
 WHERE SRC_A128.BEZEICHNUNG = 'A128_Fiktives Zentralbecken'"""
 
 
-GEB = """SELECT * FROM GEBIETBESTAND"""
-TRANS = """SELECT * FROM TRANSPORTBESTAND"""
-GROSSEL = """SELECT * FROM EINZELEINLEITERBESTAND"""
+GEB_FROM = """FROM GEBIETBESTAND"""
+TRANS_FROM = """FROM TRANSPORTBESTAND"""
+GROSSEL_FROM = """FROM EINZELEINLEITERBESTAND"""
+
+
+MWB = "SELECT *\n" + MWB_FROM
+RWB = "SELECT *\n" + RWB_FROM
+ZB = "SELECT *\n" + ZB_FROM
+GEB = "SELECT * " + GEB_FROM
+TRANS = "SELECT * " + TRANS_FROM
+GROSSEL = "SELECT * " + GROSSEL_FROM
 
 
 KDBFselect = {"mischwasserbauwerke": MWB,
@@ -128,6 +144,320 @@ KDBFselect = {"mischwasserbauwerke": MWB,
              }
 
 
+KDBFfrom = {"mischwasserbauwerke": MWB_FROM,
+            "regenwasserbauwerke": RWB_FROM,
+            "zentralbecken": ZB_FROM,
+            "gebiete": GEB_FROM,
+            "transport": TRANS_FROM,
+            "grosseinleiter": GROSSEL_FROM
+           }
+
+
+# tables and aliases of the queries in join order, the order determines the
+# column order and the _1/_2 suffixes of duplicate column names
+KDBFtables = {"mischwasserbauwerke": [("MISCHWASSERBAUWERKBESTAND", "bes"),
+                                      ("MISCHWASSERBAUWERKPROZESSMJW", "MJW"),
+                                      ("MISCHWASSERBAUWERKPROZESSSGMJW",
+                                       "gmjw")],
+              "regenwasserbauwerke": [("REGENWASSERBEHANDLUNGBESTAND", "bes"),
+                                      ("REGENWASSERBEHANDLUNGPROZESSMJW",
+                                       "MJW"),
+                                      ("REGENWASSERBEHANDLUNGBILANZSG",
+                                       "zsg")],
+              "zentralbecken": [("SRC_A128", "SRC_A128")],
+              "gebiete": [("GEBIETBESTAND", "GEBIETBESTAND")],
+              "transport": [("TRANSPORTBESTAND", "TRANSPORTBESTAND")],
+              "grosseinleiter": [("EINZELEINLEITERBESTAND",
+                                  "EINZELEINLEITERBESTAND")]
+             }
+
+
+def table_description(conn, table):
+    """get (name, type code) of the columns of a database table without
+    fetching any rows
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM {} WHERE 1=0".format(table))
+    desc = [(d[0], d[1]) for d in cur.description]
+    cur.close()
+    return desc
+
+
+def table_columns(conn, table):
+    """get the column names of a database table without fetching any rows
+    """
+    return [d[0] for d in table_description(conn, table)]
+
+
+def query_columns(conn, query, rename=unique_names):
+    """get the columns of a query in the order of SELECT *
+
+    Duplicate column names are numbered, i.e. BEZEICHNUNG, BEZEICHNUNG_1,
+    BEZEICHNUNG_2, see schema.unique_names
+
+    Args:
+        conn: open database connection
+        query (str): key of the query in KDBFselect
+        rename (function): maps the raw column names to the unique names,
+            e.g. the cached names of the schema registry
+
+    Returns:
+        cols (list): list of (alias, column name, unique column name,
+            type code) tuples
+    """
+    desc = []
+    for table, alias in KDBFtables[query]:
+        desc += [(alias, col, typeCode)
+                 for col, typeCode in table_description(conn, table)]
+    names = rename([d[1] for d in desc])
+    return [(alias, col, name, typeCode)
+            for (alias, col, typeCode), name in zip(desc, names)]
+
+
+def projected_query(conn, query, columns=None, available=None, report=True):
+    """build a query that only selects the given columns
+
+    Args:
+        conn: open database connection
+        query (str): key of the query in KDBFselect
+        columns (list): unique column names as returned by query_columns,
+            None selects all columns
+        available (list): opt. result of query_columns, queried if None
+        report (bool): print the columns not found, e.g. unless the caller
+            checked them against the schema registry
+
+    Returns:
+        sql (str): sql query string
+    """
+    if columns is None:
+        return KDBFselect[query]
+
+    if available is None:
+        available = query_columns(conn, query)
+    known = set(c[2] for c in available)
+    missing = [c for c in columns if c not in known]
+    if missing and report:
+        print("Columns {} not found in query {}".format(", ".join(missing),
+                                                        query))
+
+    wanted = set(columns)
+    select = ['{}."{}" AS "{}"'.format(alias, col, name)
+              for alias, col, name, typeCode in available if name in wanted]
+    return "SELECT {}\n{}".format(",\n".join(select), KDBFfrom[query])
+
+
+# python types of numeric columns in the cursor description
+NUMERIC_TYPES = (int, float, decimal.Decimal)
+
+
+def length_function(conn):
+    """sql function returning the length of a string, sqlite (e.g. the
+    stand-in models of the benchmark) has no CHAR_LENGTH
+    """
+    if type(conn).__module__.startswith("sqlite3"):
+        return "LENGTH"
+    return "CHAR_LENGTH"
+
+
+def signature_query(conn, query, columns=None):
+    """build a query returning the row count, the sums of the numeric
+    columns and the summed lengths of the text columns, the aggregation runs
+    in the database without fetching rows
+
+    Columns without type information (e.g. sqlite) get both aggregates.
+    """
+    wanted = None if columns is None else set(columns)
+    length = length_function(conn)
+    aggs = ["COUNT(*)"]
+    for alias, col, name, typeCode in query_columns(conn, query):
+        if wanted is not None and name not in wanted:
+            continue
+        ref = '{}."{}"'.format(alias, col)
+        if typeCode is None or typeCode in NUMERIC_TYPES:
+            aggs.append("SUM({})".format(ref))
+        if typeCode is None or typeCode is str:
+            aggs.append("SUM({}({}))".format(length, ref))
+    return "SELECT {}\n{}".format(", ".join(aggs), KDBFfrom[query])
+
+
+def table_signature(conn, query, columns=None):
+    """cheap change signature of a query result: row count, column sums and
+    text lengths. Changes cancelling out in the sums are not detected, see
+    watch.kdbfwatcher for the fallback.
+
+    Returns:
+        sig (tuple): tuple of strings, changes if the queried data changes
+    """
+    cur = conn.cursor()
+    cur.execute(signature_query(conn, query, columns))
+    row = cur.fetchone()
+    cur.close()
+    return tuple(str(v) for v in row)
+
+
+# --- typed fetch engine ---
+# number of rows pulled per fetchmany call
+FETCH_BATCH = 10000
+
+FETCH_KINDS = {int: "int", float: "float", decimal.Decimal: "float",
+               str: "str"}
+
+
+def _infer_kind(values):
+    """get the column kind from the first non null value, used for drivers
+    without type information in the cursor description
+    """
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            return "object"
+        for typ, kind in FETCH_KINDS.items():
+            if isinstance(v, typ):
+                return kind
+        return "object"
+    return None
+
+
+class fetchcolumn(object):
+    """
+    column buffer of the fetch engine - numeric values are written into a
+    preallocated float64/int64 array, strings are stored as categorical codes
+    """
+    def __init__(self, name, kind, capacity):
+        self.name = name
+        self.kind = kind
+        self.size = 0
+        self.values = None
+        self.lookup = {}
+        if kind is not None:
+            self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        if self.kind == "float":
+            self.values = np.empty(capacity, dtype=np.float64)
+        elif self.kind == "int":
+            self.values = np.empty(capacity, dtype=np.int64)
+        elif self.kind == "str":
+            self.values = np.empty(capacity, dtype=np.int32)
+        else:
+            self.values = np.empty(capacity, dtype=object)
+
+    def _reserve(self, n):
+        """grow the buffer geometrically to hold n more values
+        """
+        needed = self.size + n
+        if needed <= len(self.values):
+            return
+        buf = np.empty(max(needed, 2 * len(self.values)),
+                       dtype=self.values.dtype)
+        buf[:self.size] = self.values[:self.size]
+        self.values = buf
+
+    def _to_float(self):
+        """switch an int column to float, e.g. if it contains NULL values
+        """
+        self.kind = "float"
+        self.values = self.values.astype(np.float64)
+
+    def append(self, values):
+        """append the values of one batch
+        """
+        if self.kind is None:
+            self.kind = _infer_kind(values)
+            if self.kind is None:
+                # only NULL values so far
+                self.kind = "float"
+            self._allocate(len(values))
+
+        self._reserve(len(values))
+        chunk = slice(self.size, self.size + len(values))
+        if self.kind == "int":
+            # numpy truncates floats silently when casting to int
+            ints = np.array(values)
+            if ints.dtype.kind in "iu":
+                try:
+                    self.values[chunk] = ints
+                except OverflowError:
+                    self._to_float()
+            else:
+                self._to_float()
+        if self.kind == "float":
+            try:
+                self.values[chunk] = np.array(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                # mixed column, e.g. strings in an untyped sqlite column
+                self.kind = "object"
+                self.values = self.values.astype(object)
+        if self.kind == "str":
+            lookup = self.lookup
+            self.values[chunk] = [-1 if v is None else
+                                  lookup.setdefault(v, len(lookup))
+                                  for v in values]
+        elif self.kind == "object":
+            self.values[chunk] = values
+        self.size += len(values)
+
+    def result(self):
+        """column values as numpy array or pandas.Categorical
+        """
+        values = self.values[:self.size] if self.values is not None else []
+        if self.kind == "str":
+            return pd.Categorical.from_codes(values, categories=list(self.lookup))
+        return values
+
+
+def fetch_frame(conn, sql, batchSize=FETCH_BATCH, params=None, rename=None):
+    """execute a query and fetch the rows in batches into typed columns
+
+    Numeric columns are returned as float64/int64 (NUMERIC columns as float
+    instead of Decimal objects), string columns as categoricals.
+
+    Args:
+        conn: open database connection
+        sql (str): sql query string
+        batchSize (int): number of rows fetched per fetchmany call
+        params (tuple): opt. parameters of the sql query
+        rename (function): opt. called with the column names of the cursor
+            description before any row is fetched, returns the column names
+            of the dataframe and may raise to abort the query
+
+    Returns:
+        df (pandas.DataFrame): query result, duplicate column names are kept
+    """
+    cur = conn.cursor()
+    with stage("query"):
+        if params:
+            cur.execute(sql, params)
+        else:
+            cur.execute(sql)
+    names = [d[0] for d in cur.description]
+    if rename is not None:
+        try:
+            names = rename(names)
+        except Exception:
+            cur.close()
+            raise
+    cols = [fetchcolumn(name, FETCH_KINDS.get(d[1]), batchSize)
+            for name, d in zip(names, cur.description)]
+
+    with stage("fetch") as st:
+        while True:
+            rows = cur.fetchmany(batchSize)
+            if not rows:
+                break
+            st.add_rows(len(rows))
+            for col, values in zip(cols, zip(*rows)):
+                col.append(values)
+    cur.close()
+
+    with stage("convert"):
+        df = pd.DataFrame(dict((i, col.result())
+                               for i, col in enumerate(cols)))
+        df.columns = [col.name for col in cols]
+    return df
+
+
 if __name__ == '__main__':
     # TODO reduced testing set, still need to write unit tests. 
     # This is only for fast prototyping !!!!!!!
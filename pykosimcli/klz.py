@@ -3,36 +3,352 @@
 
 import os
 import io
-import shutil
-import tempfile
+import json
+import mmap
 import pandas as pd
+from collections import OrderedDict
 
 """context wrapper class for Kosim .klzc files
 """
 
+# buffer size for reading block ranges
+READ_BUFFER = 256 * 1024
+
+# file ending of the block index sidecar file
+INDEX_SUFFIX = ".idx"
+
+
+def header_name(line, encoding="latin1"):
+    """get the block name from a HEADER line: the first field of the line or
+    the second field if the first one is only the HEADER keyword
+    """
+    fields = [f.strip().strip('"') for f in
+              line.decode(encoding).strip().split(",")]
+    if fields[0] == "HEADER" and len(fields) > 1:
+        return fields[1]
+    return fields[0]
+
+
+class rangeio(io.RawIOBase):
+    """
+    read only file object for a byte range of a file or mmap, lets pandas
+    parse a block without copying it into a string first
+    """
+    def __init__(self, source, offset, length):
+        self.source = source
+        self.pos = offset
+        self.end = offset + length
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), self.end - self.pos)
+        if n <= 0:
+            return 0
+        if isinstance(self.source, mmap.mmap):
+            b[:n] = self.source[self.pos:self.pos + n]
+        else:
+            self.source.seek(self.pos)
+            n = self.source.readinto(memoryview(b)[:n])
+        self.pos += n
+        return n
+
+
+def _read_block_range(filePath, offset, length, encoding="latin1",
+                      kwargs=None):
+    """worker function for klzc.load_parallel, opens the file on its own and
+    parses one block range, returns None for empty blocks
+    """
+    with klzc(filePath, encoding=encoding) as f:
+        try:
+            return f.read_range(offset, length, **(kwargs or {}))
+        except pd.errors.EmptyDataError:
+            return None
+
+
+def first_blocks(blocks, filePath=""):
+    """lookup dict of (name, value) pairs keeping the first block of every
+    name, duplicate names are reported
+
+    Returns
+    -------
+    lookup (OrderedDict): {name: value}
+    """
+    lookup = OrderedDict()
+    dups = []
+    for name, value in blocks:
+        if name in lookup:
+            dups.append(name)
+            continue
+        lookup[name] = value
+    if dups:
+        print("Bloecke {} mehrfach in {}, der erste wird verwendet".format(
+            ", ".join(sorted(set(dups))), filePath))
+    return lookup
+
+
 class klzc(object):
     """
-    klzc file class
+    klzc file class - streaming reader for the HEADER blocks of a klzc file
+
+    usage::
+
+        with klzc(path) as f:
+            for df in f:
+                ...
     """
-    def __init__(self, filePath):
+    def __init__(self, filePath, useMmap=True, encoding="latin1"):
         self.filePath = os.path.abspath(filePath)
+        self.useMmap = useMmap
+        self.encoding = encoding
+        self.conn = None
+        self.buf = None
+        self.blockIndex = None
+        # {name: (offset, length)} of the first block of every name
+        self.blockRanges = None
 
     def __enter__(self):
-        """context manager method for returning parsed file
+        """context manager method, opens the file and returns the reader
         """
-        self.conn = open(self.filePath, "r")
-
-        # parse file
-        with self.conn as f:
-            for group in self.get_blocks(f):
-                yield pd.read_csv(io.StringIO("".join(group)), sep=",")
+        self.conn = open(self.filePath, "rb")
+        if self.useMmap and os.path.getsize(self.filePath) > 0:
+            self.buf = mmap.mmap(self.conn.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         """context manager teardown
         """
-        # close connection
+        if self.buf is not None:
+            self.buf.close()
+            self.buf = None
         self.conn.close()
 
+    def __iter__(self):
+        return self.iter_blocks()
+
+    def block_ranges(self):
+        """scan the file once for HEADER lines
+
+        Yields
+        ------
+        (name, offset, length) of every block, lines in front of the first
+        HEADER line are yielded as a block with an empty name
+        """
+        if self.buf is not None:
+            scan = self._scan_mmap()
+        else:
+            scan = self._scan_lines()
+
+        start = 0
+        name = ""
+        for lineStart, line in scan:
+            if lineStart > start:
+                yield name, start, lineStart - start
+            name = header_name(line, self.encoding)
+            start = lineStart
+
+        size = os.path.getsize(self.filePath)
+        if size > start:
+            yield name, start, size - start
+
+    def _scan_mmap(self):
+        """find HEADER lines in the memory mapped file
+        """
+        mm = self.buf
+        pos = mm.find(b"HEADER")
+        while pos != -1:
+            lineStart = mm.rfind(b"\n", 0, pos) + 1
+            lineEnd = mm.find(b"\n", pos)
+            if lineEnd == -1:
+                lineEnd = len(mm)
+            yield lineStart, mm[lineStart:lineEnd]
+            pos = mm.find(b"HEADER", lineEnd)
+
+    def _scan_lines(self):
+        """find HEADER lines reading the file line by line
+        """
+        offset = 0
+        with open(self.filePath, "rb") as f:
+            for line in f:
+                if b"HEADER" in line:
+                    yield offset, line
+                offset += len(line)
+
+    def read_range(self, offset, length, **kwargs):
+        """parse a block from its byte range
+
+        Params
+        ------
+        offset (int): byte offset of the HEADER line
+        length (int): length of the block in bytes
+        kwargs: additional arguments for pandas.read_csv
+
+        Returns
+        -------
+        df (pandas.DataFrame): block data
+        """
+        source = self.buf if self.buf is not None else self.conn
+        reader = io.BufferedReader(rangeio(source, offset, length),
+                                   buffer_size=READ_BUFFER)
+        kwargs.setdefault("sep", ",")
+        kwargs.setdefault("encoding", self.encoding)
+        return pd.read_csv(reader, **kwargs)
+
+    def iter_blocks(self):
+        """parse the blocks lazily one after another
+        """
+        for name, offset, length in self.block_ranges():
+            try:
+                yield self.read_range(offset, length)
+            except pd.errors.EmptyDataError:
+                continue
+
+    def index_path(self):
+        return self.filePath + INDEX_SUFFIX
+
+    def _source_stat(self):
+        stat = os.stat(self.filePath)
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def build_index(self, save=True):
+        """scan the file and record name, byte offset and length of every
+        block, the index is saved as sidecar file next to the klzc file
+
+        Returns
+        -------
+        blocks (list): list of (name, offset, length) tuples
+        """
+        blocks = list(self.block_ranges())
+        if save:
+            idx = self._source_stat()
+            idx["blocks"] = blocks
+            try:
+                with open(self.index_path(), "w") as f:
+                    json.dump(idx, f)
+            except OSError as err:
+                print("Writing block index {} failed: {}".format(
+                    self.index_path(), err))
+        self.blockIndex = blocks
+        self.blockRanges = None
+        return blocks
+
+    def load_index(self):
+        """load the sidecar index if it matches size and mtime of the file
+
+        Returns
+        -------
+        blocks (list): list of (name, offset, length) tuples or None
+        """
+        try:
+            with open(self.index_path(), "r") as f:
+                idx = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stat = self._source_stat()
+        if idx.get("size") != stat["size"] or idx.get("mtime") != stat["mtime"]:
+            return None
+        return [tuple(b) for b in idx["blocks"]]
+
+    def index(self):
+        """block index of the file, loaded from the sidecar file if it is
+        up to date and rebuilt otherwise
+        """
+        if self.blockIndex is None:
+            self.blockIndex = self.load_index()
+        if self.blockIndex is None:
+            self.build_index()
+        return self.blockIndex
+
+    def block_names(self):
+        return [b[0] for b in self.index()]
+
+    def block_range(self, name):
+        """byte offset and length of a block by its header name, the lookup
+        dict is built once from the block index. Of blocks with the same name
+        the first one is used.
+        """
+        if self.blockRanges is None:
+            self.blockRanges = first_blocks(
+                ((b[0], b[1:]) for b in self.index()), self.filePath)
+        try:
+            return self.blockRanges[name]
+        except KeyError:
+            raise KeyError("Block {} not found in {}".format(name,
+                                                              self.filePath))
+
+    def load_block(self, name, **kwargs):
+        """parse a single block by its header name using the block index
+
+        Params
+        ------
+        name (str): header name of the block
+        kwargs: additional arguments for pandas.read_csv
+
+        Returns
+        -------
+        df (pandas.DataFrame): block data
+        """
+        offset, length = self.block_range(name)
+        return self.read_range(offset, length, **kwargs)
+
+    def load_blocks(self, names, **kwargs):
+        """parse a list of blocks by their header names
+
+        Returns
+        -------
+        blocks (OrderedDict): {name: pandas.DataFrame} in the order of names
+        """
+        return OrderedDict((name, self.load_block(name, **kwargs))
+                           for name in names)
+
+    def load_parallel(self, names=None, workers=None, asDict=False, **kwargs):
+        """parse the blocks in a process pool, every worker parses its byte
+        range of the file on its own
+
+        Params
+        ------
+        names (list): opt. header names of the blocks to parse, default all
+        workers (int): number of worker processes, defaults to the cpu count,
+            with a single worker or cpu the blocks are parsed in this process
+        asDict (bool): return a {name: pandas.DataFrame} dict
+        kwargs: additional arguments for pandas.read_csv
+
+        Returns
+        -------
+        blocks (list): list of pandas.DataFrame in file order or an
+            OrderedDict if asDict is set, empty blocks are left out
+        """
+        from functools import partial
+        from concurrent.futures import ProcessPoolExecutor
+
+        ranges = self.index()
+        if names is not None:
+            wanted = set(names)
+            ranges = [r for r in ranges if r[0] in wanted]
+
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(ranges) > 1:
+            read = partial(_read_block_range, self.filePath,
+                           encoding=self.encoding, kwargs=kwargs)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                frames = list(pool.map(read, [r[1] for r in ranges],
+                                       [r[2] for r in ranges]))
+        else:
+            # a process pool only adds pickling overhead on a single cpu
+            frames = []
+            for name, offset, length in ranges:
+                try:
+                    frames.append(self.read_range(offset, length,
+                                                  **dict(kwargs)))
+                except pd.errors.EmptyDataError:
+                    frames.append(None)
+
+        if asDict:
+            return OrderedDict((r[0], df) for r, df in zip(ranges, frames)
+                               if df is not None)
+        return [df for df in frames if df is not None]
+
     def get_blocks(self, seq):
         """get blocks of data that start with HEADER*
         """
@@ -52,7 +368,6 @@ class klzc(object):
 
 if __name__ == '__main__':
     import sys
-    import pandas as pd
 
     fIn = klzc(sys.argv[1])
 
@@ -60,4 +375,3 @@ if __name__ == '__main__':
         for i, group in enumerate(f, start=1):
             print ("Group #{}".format(i))
             print(group)
-
@@ -0,0 +1,410 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import struct
+import argparse
+from collections import OrderedDict
+
+"""binary time series store for klzc files - the blocks of a klzc file are
+converted once into typed, column contiguous arrays, the reader maps them
+into memory without parsing or copying
+
+file layout::
+
+    header      magic b"KLZB", version, offset and length of the directory
+    data        one array per block and column, aligned to ALIGN bytes, text
+                columns as utf-8 data, end offsets and missing mask
+    directory   json: source file state, float type and per block the name,
+                number of rows and dtype and offsets of every column
+
+usage::
+
+    convert_klzc("sim.klzc")
+    with klzbin("sim.klzb") as f:
+        for name, cols in f:
+            ...
+"""
+
+BIN_SUFFIX = ".klzb"
+
+MAGIC = b"KLZB"
+VERSION = 2
+
+# magic, version, directory offset, directory length
+HEADER = struct.Struct("<4sIQQ")
+
+# alignment of the column arrays in bytes
+ALIGN = 64
+
+# dtype of text columns in the directory
+TEXT = "text"
+
+
+def is_klzbin(filePath):
+    return str(filePath).lower().endswith(BIN_SUFFIX)
+
+
+def bin_path(klzcPath):
+    """default path of the binary store of a klzc file
+    """
+    return os.path.splitext(os.path.abspath(klzcPath))[0] + BIN_SUFFIX
+
+
+def source_state(filePath):
+    stat = os.stat(filePath)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def date_array(series):
+    """datetime64 array of a text column holding dates like 01.01.2000 00:05
+    (day first, as written by KOSIM)
+
+    Returns
+    -------
+    values (numpy.ndarray): datetime64 array, None if the column holds other
+        text
+    """
+    import warnings
+    import pandas as pd
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return pd.to_datetime(series, dayfirst=True).to_numpy()
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def column_array(series, floatType="float64", parseDates=False):
+    """typed contiguous array of a block column, floats are stored as
+    floatType, with parseDates text columns holding only dates as
+    datetime64
+
+    Returns
+    -------
+    values (numpy.ndarray): array of the column, None for text columns
+    """
+    import numpy as np
+
+    values = series.to_numpy()
+    kind = values.dtype.kind
+    if kind == "f":
+        values = values.astype(floatType, copy=False)
+    elif kind == "O" and parseDates and series.notna().any():
+        values = date_array(series)
+        if values is None:
+            return None
+    elif kind not in "iubM":
+        return None
+    return np.ascontiguousarray(values)
+
+
+def text_buffers(series):
+    """utf-8 encoded values of a text column
+
+    Returns
+    -------
+    data (bytes), ends (numpy.ndarray), missing (numpy.ndarray): values one
+        after another, end offset of every value in data and missing values
+    """
+    import numpy as np
+
+    missing = series.isna().to_numpy()
+    encoded = [b"" if m else str(v).encode("utf-8")
+               for v, m in zip(series.to_numpy(), missing)]
+    ends = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return b"".join(encoded), ends, missing
+
+
+def write_aligned(out, data):
+    """write data aligned to ALIGN bytes
+
+    Returns
+    -------
+    offset (int): offset of data in the file
+    """
+    pos = out.tell()
+    pad = -pos % ALIGN
+    out.write(b"\0" * pad)
+    out.write(data)
+    return pos + pad
+
+
+def write_column(out, name, series, floatType="float64", parseDates=False):
+    """write a block column, text columns are stored as utf-8 data with the
+    end offsets of the values and a mask of the missing values
+
+    Returns
+    -------
+    column (dict): directory entry of the column
+    """
+    values = column_array(series, floatType, parseDates)
+    if values is not None:
+        return {"name": name, "dtype": values.dtype.str,
+                "offset": write_aligned(out, values.tobytes())}
+    data, ends, missing = text_buffers(series)
+    return {"name": name, "dtype": TEXT,
+            "offset": write_aligned(out, data), "size": len(data),
+            "ends": write_aligned(out, ends.tobytes()),
+            "missing": write_aligned(out, missing.tobytes())}
+
+
+def read_directory(filePath):
+    """header and block directory of a binary store
+
+    Returns
+    -------
+    directory (dict): source state and list of blocks
+    """
+    with open(filePath, "rb") as f:
+        head = f.read(HEADER.size)
+        if len(head) < HEADER.size:
+            raise IOError("{} is not a klzb file".format(filePath))
+        magic, version, offset, length = HEADER.unpack(head)
+        if magic != MAGIC:
+            raise IOError("{} is not a klzb file".format(filePath))
+        if version != VERSION:
+            raise IOError("klzb version {} of {} not supported".format(
+                version, filePath))
+        f.seek(offset)
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+def is_current(klzcPath, binPath, floatType="float64"):
+    """True if the binary store was converted from the current klzc file
+    with floatType
+    """
+    if not os.path.exists(binPath):
+        return False
+    try:
+        directory = read_directory(binPath)
+    except (IOError, ValueError):
+        return False
+    return (directory.get("source") == source_state(klzcPath) and
+            directory.get("floatType") == floatType)
+
+
+def convert_klzc(klzcPath, binPath=None, floatType="float64", force=False):
+    """convert the blocks of a klzc file into a binary store, the blocks are
+    parsed one after another, only one block is held in memory
+
+    Params
+    ------
+    klzcPath (str): path of the klzc file
+    binPath (str): opt. path of the store, default klzc path with BIN_SUFFIX
+    floatType (str): dtype of float columns, float32 halves the file size
+    force (bool): convert even if the store is up to date
+
+    Returns
+    -------
+    binPath (str): path of the store
+    """
+    import pandas as pd
+    from pykosimcli.klz import klzc
+    from pykosimcli.timing import stage
+
+    binPath = os.path.abspath(binPath or bin_path(klzcPath))
+    if not force and is_current(klzcPath, binPath, floatType):
+        print("{} ist aktuell".format(binPath))
+        return binPath
+
+    blocks = []
+    tmp = "{}.{}.tmp".format(binPath, os.getpid())
+    try:
+        with klzc(klzcPath) as src, open(tmp, "wb") as out:
+            out.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+            for name, offset, length in src.block_ranges():
+                with stage("klzb read block"):
+                    try:
+                        df = src.read_range(offset, length)
+                    except pd.errors.EmptyDataError:
+                        continue
+                with stage("klzb write block"):
+                    # the first column is the time
+                    columns = [write_column(out, str(col), df[col], floatType,
+                                            parseDates=i == 0)
+                               for i, col in enumerate(df.columns)]
+                blocks.append({"name": name, "rows": len(df),
+                               "columns": columns})
+
+            directory = json.dumps({"source": source_state(klzcPath),
+                                    "floatType": floatType,
+                                    "blocks": blocks}).encode("utf-8")
+            dirOffset = out.tell()
+            out.write(directory)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, VERSION, dirOffset, len(directory)))
+        os.replace(tmp, binPath)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    print("{} Bloecke nach {} konvertiert".format(len(blocks), binPath))
+    return binPath
+
+
+class klzbin(object):
+    """
+    reader of a binary klzc store, the numeric and date columns of a block
+    are read only numpy views of the memory mapped file, text columns are
+    decoded into object arrays
+
+    usage::
+
+        with klzbin(path) as f:
+            qzu = f.block("HEADER_MWB_00001")["QZU"]
+    """
+    def __init__(self, filePath):
+        self.filePath = os.path.abspath(filePath)
+        self.data = None
+        self.directory = None
+        self.blocks = None
+
+    def __enter__(self):
+        """context manager method, reads the directory and maps the file
+        """
+        import numpy as np
+
+        from pykosimcli.klz import first_blocks
+
+        self.directory = read_directory(self.filePath)
+        # of blocks with the same name the first one is used like in
+        # klz.klzc.block_range, iterating yields all blocks
+        self.blocks = first_blocks(((b["name"], b)
+                                    for b in self.directory["blocks"]),
+                                   self.filePath)
+        self.data = np.memmap(self.filePath, dtype=np.uint8, mode="r")
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """context manager teardown, the mapping is closed when the last
+        view of it is released
+        """
+        self.data = None
+
+    def __iter__(self):
+        return self.iter_blocks()
+
+    def __len__(self):
+        return len(self.directory["blocks"])
+
+    def block_names(self):
+        """names of all blocks in file order, like klz.klzc.block_names
+        """
+        return [b["name"] for b in self.directory["blocks"]]
+
+    def iter_blocks(self, columns=None):
+        """all blocks in file order, blocks with the same name included
+
+        Yields
+        ------
+        (name, cols): header name and {column: numpy array} of a block
+        """
+        for entry in self.directory["blocks"]:
+            yield entry["name"], self._columns(entry, columns)
+
+    def rows(self, name):
+        return self._entry(name)["rows"]
+
+    def columns(self, name):
+        return [c["name"] for c in self._entry(name)["columns"]]
+
+    def _entry(self, name):
+        try:
+            return self.blocks[name]
+        except KeyError:
+            raise KeyError("Block {} not found in {}".format(name,
+                                                              self.filePath))
+
+    def _array(self, col, rows):
+        import numpy as np
+
+        if col["dtype"] == TEXT:
+            return self._text(col, rows)
+        dtype = np.dtype(col["dtype"])
+        start = col["offset"]
+        return self.data[start:start + rows * dtype.itemsize].view(dtype)
+
+    def _text(self, col, rows):
+        """decoded values of a text column, None for missing values
+        """
+        import numpy as np
+
+        start = col["offset"]
+        data = self.data[start:start + col["size"]].tobytes()
+        ends = self.data[col["ends"]:col["ends"] + rows * 8].view(np.int64)
+        missing = self.data[col["missing"]:col["missing"] + rows].view(
+            np.bool_)
+        values = np.empty(rows, dtype=object)
+        begin = 0
+        for i in range(rows):
+            end = int(ends[i])
+            values[i] = None if missing[i] else data[begin:end].decode(
+                "utf-8")
+            begin = end
+        return values
+
+    def block(self, name, columns=None):
+        """columns of a block without copying
+
+        Params
+        ------
+        name (str): header name of the block
+        columns (list): opt. columns to map, default all
+
+        Returns
+        -------
+        cols (OrderedDict): {column: numpy array}
+        """
+        return self._columns(self._entry(name), columns)
+
+    def _columns(self, entry, columns=None):
+        cols = OrderedDict()
+        for col in entry["columns"]:
+            if columns is None or col["name"] in columns:
+                cols[col["name"]] = self._array(col, entry["rows"])
+        return cols
+
+    def column(self, name, column):
+        for col in self._entry(name)["columns"]:
+            if col["name"] == column:
+                return self._array(col, self.rows(name))
+        raise KeyError("Column {} not found in block {}".format(column, name))
+
+    def frame(self, name, columns=None):
+        """block as pandas.DataFrame like klzc.load_block, the data is copied
+        """
+        import pandas as pd
+        return pd.DataFrame(self.block(name, columns))
+
+    def iter_frames(self):
+        import pandas as pd
+        for name, cols in self.iter_blocks():
+            yield pd.DataFrame(cols)
+
+
+def main(*args):
+    parser = argparse.ArgumentParser(
+        description="convert klzc files into binary klzb stores")
+    parser.add_argument("files", type=str, nargs="+", help="klzc file paths")
+    parser.add_argument("--out", type=str, default=None,
+                        help="opt:store path, only for a single file")
+    parser.add_argument("--float32", action="store_true", default=False,
+                        help="opt:store floats as float32")
+    parser.add_argument("--force", action="store_true", default=False,
+                        help="opt:convert up to date stores again")
+    args = parser.parse_args(*args)
+
+    if args.out and len(args.files) > 1:
+        print("--out nur fuer eine einzelne Datei moeglich")
+        return 1
+    floatType = "float32" if args.float32 else "float64"
+    for filePath in args.files:
+        convert_klzc(filePath, args.out, floatType, args.force)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
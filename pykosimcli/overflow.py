@@ -0,0 +1,377 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+import numpy as np
+from collections import OrderedDict
+
+from pykosimcli.klz import klzc
+from pykosimcli.klzbin import klzbin, is_klzbin, date_array
+from pykosimcli.timing import stage
+
+"""overflow statistics - one pass over the time series of a klzc file or a
+binary klzb store, per Bauwerk the overflow events, days, duration, volumes,
+peaks and loads are accumulated chunk by chunk with constant memory
+
+The annual values line up with the columns E0 [%], NUED [d/a] and TUE [h/a]
+of the mischwasserbauwerke table, see compare_mwb.
+"""
+
+# rows per chunk read from a block
+CHUNK_ROWS = 100000
+
+# default column names of the klzc blocks, the time is the first column
+INFLOW = "QZU"
+OVERFLOW = "QUE"
+CONCENTRATION = "CUE"
+
+# time unit of the time column in s, flow unit in m3/s
+TIME_UNIT = 60.0
+FLOW_UNIT = 0.001
+
+YEAR = 365 * 86400.0
+
+# result columns, volumes in m3, loads in kg, durations in h
+STAT_COLUMNS = ["E0", "NUED", "TUE", "n_events", "VQZU", "VQUE", "FRACHT",
+                "CUE_mean", "QZU_max", "QUE_max", "event_vol_max",
+                "event_dur_max", "jahre"]
+
+# columns of the mischwasserbauwerke table checked by compare_mwb
+COMPARE_COLUMNS = ["E0", "NUED", "TUE"]
+
+
+def bauwerk_name(header):
+    """Bauwerk name of a block header, e.g. HEADER_MWB_00001 -> MWB_00001
+    """
+    if header.startswith("HEADER_"):
+        return header[len("HEADER_"):]
+    return header
+
+
+class overflowstats(object):
+    """
+    online overflow statistics of one Bauwerk, the chunks of a series are
+    passed to update in time order
+
+    An event starts with the first time step with an overflow above the
+    threshold and ends with the first step without. Every time step counts
+    from the previous time to its own time, the first one with the length of
+    the following step.
+
+    Params
+    ------
+    threshold (float): overflow flow counted as overflow, in flow units
+    timeUnit (float): unit of the time column in s
+    flowUnit (float): unit of the flows in m3/s, e.g. 0.001 for l/s
+    """
+    def __init__(self, threshold=0.0, timeUnit=TIME_UNIT, flowUnit=FLOW_UNIT):
+        self.threshold = threshold
+        self.timeUnit = timeUnit
+        self.flowUnit = flowUnit
+        self.last = None
+        # first row of a series started by a single row chunk, its step
+        # length is known with the next chunk
+        self.pending = None
+        self.seconds = 0.0
+        self.vzu = 0.0
+        self.vue = 0.0
+        self.load = 0.0
+        self.wetSeconds = 0.0
+        self.qzuMax = np.nan
+        self.queMax = np.nan
+        self.nEvents = 0
+        self.nDays = 0
+        self.lastDay = np.nan
+        self.inEvent = False
+        self.eventVol = 0.0
+        self.eventDur = 0.0
+        self.eventVolMax = 0.0
+        self.eventDurMax = 0.0
+
+    def _steps(self, t):
+        """length of the time steps of a chunk in s
+        """
+        if self.last is None:
+            dt = np.diff(t, prepend=t[0])
+            dt[0] = dt[1] if len(t) > 1 else 0.0
+        else:
+            dt = np.diff(t, prepend=self.last)
+        return dt * self.timeUnit
+
+    def update(self, t, qzu, que, cue=None):
+        """add a chunk of a series
+
+        Params
+        ------
+        t (numpy.ndarray): time in time units or datetime64, increasing
+        qzu, que (numpy.ndarray): inflow and overflow, qzu may be None
+        cue (numpy.ndarray): opt. overflow concentration in mg/l
+        """
+        t = np.asarray(t)
+        if t.dtype.kind == "M":
+            # dates of klzb stores
+            t = t.astype("datetime64[ns]").astype(np.int64) / (
+                1e9 * self.timeUnit)
+        t = np.asarray(t, dtype=np.float64)
+        if not len(t):
+            return
+        if self.pending is not None:
+            first, self.pending = self.pending, None
+            t = np.concatenate((first[0], t))
+            qzu = None if qzu is None else np.concatenate((first[1], qzu))
+            que = np.concatenate((first[2], que))
+            cue = None if cue is None else np.concatenate((first[3], cue))
+        elif self.last is None and len(t) == 1:
+            self.pending = (t, qzu, que, cue)
+            return
+        que = np.nan_to_num(np.asarray(que, dtype=np.float64))
+        dt = self._steps(t)
+        self.last = t[-1]
+        self.seconds += dt.sum()
+
+        vol = que * dt * self.flowUnit
+        self.vue += vol.sum()
+        self.queMax = np.nanmax([self.queMax, que.max()])
+        if qzu is not None:
+            qzu = np.nan_to_num(np.asarray(qzu, dtype=np.float64))
+            self.vzu += (qzu * dt).sum() * self.flowUnit
+            self.qzuMax = np.nanmax([self.qzuMax, qzu.max()])
+        if cue is not None:
+            # m3 * mg/l = g
+            cue = np.nan_to_num(np.asarray(cue, dtype=np.float64))
+            self.load += (vol * cue).sum() / 1000.0
+
+        wet = que > self.threshold
+        if not wet.any():
+            self._close_event()
+            return
+        self.wetSeconds += dt[wet].sum()
+
+        # overflow days, the series is sorted so every change of the day
+        # of the wet steps is a new day
+        days = np.floor(t[wet] * self.timeUnit / 86400.0)
+        self.nDays += int((np.diff(days, prepend=self.lastDay) != 0).sum())
+        self.lastDay = days[-1]
+
+        # event ids of the wet steps, id 0 continues the open event of the
+        # previous chunk
+        starts = wet & ~np.concatenate(([self.inEvent], wet[:-1]))
+        nStarts = int(starts.sum())
+        self.nEvents += nStarts
+        ids = np.cumsum(starts)[wet]
+        eventVol = np.bincount(ids, weights=vol[wet], minlength=nStarts + 1)
+        eventDur = np.bincount(ids, weights=dt[wet], minlength=nStarts + 1)
+        eventVol[0] += self.eventVol
+        eventDur[0] += self.eventDur
+
+        closed = slice(None, -1) if wet[-1] else slice(None)
+        if len(eventVol[closed]):
+            self.eventVolMax = max(self.eventVolMax, eventVol[closed].max())
+            self.eventDurMax = max(self.eventDurMax, eventDur[closed].max())
+        self.inEvent = bool(wet[-1])
+        self.eventVol = eventVol[-1] if self.inEvent else 0.0
+        self.eventDur = eventDur[-1] if self.inEvent else 0.0
+
+    def _close_event(self):
+        if self.inEvent:
+            self.eventVolMax = max(self.eventVolMax, self.eventVol)
+            self.eventDurMax = max(self.eventDurMax, self.eventDur)
+        self.inEvent = False
+        self.eventVol = 0.0
+        self.eventDur = 0.0
+
+    def result(self):
+        """statistics of the series added so far, see STAT_COLUMNS
+
+        Returns
+        -------
+        stats (OrderedDict): annual values E0 [%], NUED [d/a], TUE [h/a],
+            totals of the whole series and maxima
+        """
+        if self.pending is not None:
+            # series of a single row, its step length is 0
+            first, self.pending = self.pending, None
+            self.last = first[0][0]
+            self.update(*first)
+        eventVolMax = max(self.eventVolMax, self.eventVol)
+        eventDurMax = max(self.eventDurMax, self.eventDur)
+        years = self.seconds / YEAR
+        with np.errstate(divide="ignore", invalid="ignore"):
+            perYear = np.float64(1.0) / years if years else np.nan
+            e0 = 100.0 * np.float64(self.vue) / self.vzu if self.vzu else \
+                np.nan
+            cueMean = 1000.0 * np.float64(self.load) / self.vue if self.vue \
+                else np.nan
+        return OrderedDict([
+            ("E0", e0), ("NUED", self.nDays * perYear),
+            ("TUE", self.wetSeconds / 3600.0 * perYear),
+            ("n_events", self.nEvents), ("VQZU", self.vzu),
+            ("VQUE", self.vue), ("FRACHT", self.load), ("CUE_mean", cueMean),
+            ("QZU_max", self.qzuMax), ("QUE_max", self.queMax),
+            ("event_vol_max", eventVolMax),
+            ("event_dur_max", eventDurMax / 3600.0), ("jahre", years)])
+
+
+def iter_chunks(filePath, chunkSize=CHUNK_ROWS, columns=None):
+    """chunks of the blocks of a klzc file or klzb store
+
+    Yields
+    ------
+    (name, chunk): header name of the block and {column: numpy.ndarray} of
+        at most chunkSize rows, the first column is the time
+    """
+    import pandas as pd
+
+    if is_klzbin(filePath):
+        with klzbin(filePath) as f:
+            # all blocks like the klzc path, not only the first of a name
+            for name, block in f.iter_blocks():
+                cols = list(block)
+                wanted = cols[:1] + [c for c in cols[1:]
+                                     if columns is None or c in columns]
+                rows = len(block[cols[0]]) if cols else 0
+                for start in range(0, rows, chunkSize):
+                    yield name, OrderedDict(
+                        (c, block[c][start:start + chunkSize]) for c in wanted)
+        return
+
+    with klzc(filePath) as f:
+        for name, offset, length in f.block_ranges():
+            try:
+                reader = f.read_range(offset, length, chunksize=chunkSize)
+                for df in reader:
+                    wanted = [df.columns[0]] + [
+                        c for c in df.columns[1:]
+                        if columns is None or c in columns]
+                    chunk = OrderedDict((c, df[c].to_numpy())
+                                        for c in wanted)
+                    t = chunk[wanted[0]]
+                    if t.dtype.kind == "O":
+                        # date strings, parsed like convert_klzc does
+                        dates = date_array(df[wanted[0]])
+                        if dates is not None:
+                            chunk[wanted[0]] = dates
+                    yield name, chunk
+            except pd.errors.EmptyDataError:
+                continue
+
+
+def overflow_stats(filePath, chunkSize=CHUNK_ROWS, threshold=0.0,
+                   inflow=INFLOW, overflow=OVERFLOW,
+                   concentration=CONCENTRATION, timeUnit=TIME_UNIT,
+                   flowUnit=FLOW_UNIT):
+    """overflow statistics of all Bauwerke of a klzc file or klzb store in a
+    single pass
+
+    Params
+    ------
+    filePath (str): path of the klzc file or klzb store
+    chunkSize (int): rows per chunk
+    threshold (float): overflow flow counted as overflow
+    inflow, overflow, concentration (str): column names of the series
+    timeUnit (float): unit of the time column in s
+    flowUnit (float): unit of the flows in m3/s
+
+    Returns
+    -------
+    stats (pandas.DataFrame): STAT_COLUMNS indexed by BEZEICHNUNG
+    """
+    import pandas as pd
+
+    stats = OrderedDict()
+    skipped = set()
+    with stage("overflow stats"):
+        for name, chunk in iter_chunks(filePath, chunkSize,
+                                       (inflow, overflow, concentration)):
+            if overflow not in chunk:
+                skipped.add(name)
+                continue
+            acc = stats.get(name)
+            if acc is None:
+                acc = stats[name] = overflowstats(threshold, timeUnit,
+                                                  flowUnit)
+            acc.update(next(iter(chunk.values())), chunk.get(inflow),
+                       chunk[overflow], chunk.get(concentration))
+    if skipped:
+        print("{} Bloecke ohne Spalte {} uebersprungen".format(len(skipped),
+                                                             overflow))
+
+    df = pd.DataFrame([acc.result() for acc in stats.values()],
+                      index=pd.Index([bauwerk_name(n) for n in stats],
+                                     name="BEZEICHNUNG"),
+                      columns=STAT_COLUMNS)
+    return df
+
+
+def compare_mwb(stats, mwb, columns=COMPARE_COLUMNS):
+    """line up the overflow statistics with the mischwasserbauwerke table
+
+    Params
+    ------
+    stats (pandas.DataFrame): result of overflow_stats
+    mwb (pandas.DataFrame): parsed mischwasserbauwerke indexed by
+        BEZEICHNUNG
+
+    Returns
+    -------
+    df (pandas.DataFrame): per column the database value, the value of the
+        series (suffix _klzc) and the difference (suffix _diff) for the
+        Bauwerke found in both
+    """
+    import pandas as pd
+
+    common = mwb.index.intersection(stats.index, sort=False)
+    missing = len(stats) - len(common)
+    if missing:
+        print("{} Bauwerke der Zeitreihen nicht im Modell".format(missing))
+    parts = OrderedDict()
+    for col in columns:
+        if col not in mwb.columns:
+            continue
+        db = pd.to_numeric(mwb.loc[common, col], errors="coerce")
+        ts = stats.loc[common, col]
+        parts[col] = db
+        parts[col + "_klzc"] = ts
+        parts[col + "_diff"] = ts - db
+    return pd.DataFrame(parts, index=common)
+
+
+def main(*args):
+    parser = argparse.ArgumentParser(
+        description="overflow statistics of klzc time series")
+    parser.add_argument("fileIn", type=str, help="klzc file or klzb store")
+    parser.add_argument("--model", type=str, default=None,
+                        help="opt:kdbf file or .kstore to compare E0, NUED "
+                             "and TUE with")
+    parser.add_argument("--sim", type=str, default=None,
+                        help="opt:simulation of a .kstore model")
+    parser.add_argument("--threshold", type=float, default=0.0,
+                        help="opt:overflow flow counted as overflow")
+    parser.add_argument("--time-unit", type=float, default=TIME_UNIT,
+                        help="opt:unit of the time column in s")
+    parser.add_argument("--flow-unit", type=float, default=FLOW_UNIT,
+                        help="opt:unit of the flows in m3/s")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS,
+                        help="opt:rows per chunk")
+    parser.add_argument("--out", type=str, default=None,
+                        help="opt:write the statistics to csv")
+    args = parser.parse_args(*args)
+
+    stats = overflow_stats(args.fileIn, args.chunk_size, args.threshold,
+                           timeUnit=args.time_unit, flowUnit=args.flow_unit)
+    if args.model is not None:
+        from pykosimcli.parsedb import parse
+        from pykosimcli.projection import INDEX
+        res = parse(os.path.abspath(args.model), sim=args.sim, columns={
+            "mischwasserbauwerke": [INDEX] + COMPARE_COLUMNS})
+        stats = compare_mwb(stats, res["mischwasserbauwerke"])
+    print(stats.to_string())
+    if args.out is not None:
+        stats.to_csv(args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -10,11 +10,20 @@ import os
 import io
 import pandas as pd
 import numpy as np
-import matplotlib as mpl
-import matplotlib.pyplot as plt
 from collections import OrderedDict
 from pykosimcli.kdbf import kdbf
 from pykosimcli.kdbf import KDBFselect
+from pykosimcli.kdbf import projected_query
+from pykosimcli.kdbf import query_columns
+from pykosimcli.kdbf import fetch_frame
+from pykosimcli.kdbf import FETCH_BATCH
+from pykosimcli.projection import requires
+from pykosimcli.projection import required_columns
+from pykosimcli.store import is_store, read_store
+from pykosimcli.timing import stage
+from pykosimcli.schema import SCHEMAS, SCHEMAFILE
+from pykosimcli import rules
+from pykosimcli.rules import MWB_RULES, EINZEL_RULES
 
 
 def get_filetype_in_dir(dirIn, fileEnd=".kdbf"):
@@ -37,54 +46,300 @@ def get_filename(filePath):
     return os.path.basename(os.path.splitext(absFilePath)[0])
 
 
+def sim_names(dbs):
+    """unique simulation names of kdbf files: the file name without
+    extension, files with the same name in different folders are named by
+    their path relative to the common folder of all files, e.g. "v1/netz"
+
+    Returns
+    -------
+    names (list): simulation names in the order of dbs
+    """
+    names = [get_filename(db) for db in dbs]
+    dups = set(n for n in names if names.count(n) > 1)
+    if dups:
+        paths = [os.path.splitext(os.path.abspath(db))[0] for db in dbs]
+        root = os.path.commonpath([os.path.dirname(p) for p in paths])
+        names = [os.path.relpath(p, root).replace(os.sep, "/")
+                 if n in dups else n for n, p in zip(names, paths)]
+    seen = set()
+    for name in names:
+        if name in seen:
+            raise ValueError("Simulationsname {} nicht eindeutig".format(name))
+        seen.add(name)
+    return names
+
+
+def fill_missing_columns(res, columns=None):
+    """add the columns declared by the consumers that are missing in the
+    results as NaN, e.g. for models of older Kosim versions
+
+    Params
+    ------
+    res (dict): results dictionary from parsing function, changed in place
+    columns (dict): opt. {table: [columns]}, default see
+        projection.required_columns
+
+    Returns
+    -------
+    res (dict): the results dictionary
+    """
+    for query, cols in (columns or required_columns()).items():
+        if query not in res or not cols:
+            continue
+        df = res[query]
+        missing = [c for c in cols
+                   if c not in df.columns and c != df.index.name]
+        if missing:
+            print("Spalten {} fehlen in {}, mit NaN ergaenzt".format(
+                ", ".join(missing), query))
+            res[query] = df.assign(**dict((c, np.nan) for c in missing))
+    return res
+
+
 def add_sim_col_to_query(query, conn, simName):
     df = pd.read_sql_query(query, conn)
     df["sim"] = simName
     return df
 
 
-def concat_dfs_by_index(dictIn, idxVal, dfAdd):
-    try:
-        dictIn[idxVal] = dictIn[idxVal].append(dfAdd)
-    except KeyError:
-        dictIn[idxVal] = dfAdd
+class resaccumulator(object):
+    """
+    collects the result tables of many simulations and concatenates them
+    once per table, the simulation name is stored as categorical column "sim"
+
+    usage::
+
+        acc = resaccumulator()
+        for simName, res in results:
+            acc.add(simName, res)
+        res = acc.result()
+    """
+    def __init__(self):
+        self.chunks = OrderedDict()
+        # {simName: category code}
+        self.sims = OrderedDict()
+
+    def add_table(self, simName, key, df):
+        """add the table key of one simulation
+        """
+        self.sims.setdefault(simName, len(self.sims))
+        self.chunks.setdefault(key, []).append((simName, df))
+
+    def add(self, simName, res):
+        """add all tables of a parse() result dict
+        """
+        for key, df in res.items():
+            self.add_table(simName, key, df)
+
+    def result(self):
+        """concatenate the collected chunks
+
+        Returns
+        -------
+        res (dict): {table: pandas.DataFrame} with categorical column "sim"
+        """
+        res = {}
+        for key, chunks in self.chunks.items():
+            df = pd.concat([c[1] for c in chunks])
+            codes = np.repeat([self.sims[c[0]] for c in chunks],
+                              [len(c[1]) for c in chunks])
+            df["sim"] = pd.Categorical.from_codes(codes,
+                                                  categories=list(self.sims))
+            res[key] = df
+        return res
+
+
+def query_table(conn, query, columns=None, batchSize=FETCH_BATCH,
+                required=None, strict=False):
+    """run one of the KDBFselect queries and return it as dataframe
+
+    The unique column names are taken from the schema registry, they are
+    computed once per schema (see schema.py).
 
+    Params
+    ------
+    conn: open database connection
+    query (str): key of the query in KDBFselect
+    columns (list): columns to fetch, None for all columns
+    batchSize (int): number of rows fetched per batch
+    required (list): opt. columns the consumers need, with columns the
+        fetched columns are required as well
+    strict (bool): raise a KeyError before fetching any row if a required
+        column is missing, otherwise missing columns are printed once per
+        schema
 
-def clean_col_names(df):
-    """ clean up duplicate names in columns
+    Returns
+    -------
+    df (pandas.DataFrame): query results indexed by BEZEICHNUNG
     """
-    cols = pd.Series(df.columns)
+    if columns is not None:
+        required = list(required or [])
+        required += [c for c in columns if c not in required]
 
-    for dup in cols[cols.duplicated()].unique():
-        cols[cols[cols == dup].index.values.tolist()] = [dup + '_' + str(i) if i != 0 else dup for i in range(sum(cols == dup))]
+    def rename(raw):
+        with stage("schema"):
+            return SCHEMAS.names(query, raw, required, strict)
 
-    df.columns = cols
-    return df
+    if columns is None:
+        sql = KDBFselect[query]
+        df = fetch_frame(conn, sql, batchSize, rename=rename)
+    else:
+        # the projection selects the cached unique names, the schema of the
+        # full query is still checked for drift and missing columns
+        available = query_columns(conn, query, rename)
+        sql = projected_query(conn, query, columns, available, report=False)
+        df = fetch_frame(conn, sql, batchSize)
+    # keep a plain index, the names are unique per table
+    df['BEZEICHNUNG'] = df['BEZEICHNUNG'].astype(object)
+    return df.set_index('BEZEICHNUNG')
 
 
-def parse(fIn):
-    """open connection to db and parse information
+def parse_concurrent(fIn, columns, batchSize=FETCH_BATCH, workers=3,
+                     engine=kdbf, onTable=None, required=None, strict=False):
+    """run the queries concurrently on a pool of connections to one database
+
+    Every worker thread opens its own connection. A failing query is
+    reported and left out of the results, the other queries are not affected.
 
     Params
     ------
-    fIn (str): input directory path as string
+    fIn (str): path to the kdbf file
+    columns (dict): {table: [columns] or None} of the tables to query
+    batchSize (int): number of rows fetched per batch
+    workers (int): number of worker threads / connections
+    engine (class): database context manager class, see kdbf
+    onTable (function): opt. called with (query, df) in the calling thread
+        as soon as a query is done, e.g. to start dependent work early
+    required (dict): opt. {table: [columns]} the consumers need
+    strict (bool): fail queries with missing required columns
 
     Returns
     -------
     res (dict): dictionary of results in pandas.dataframes format
+    errors (dict): {table: exception} of the failed queries
     """
-    res = {}
+    import threading
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    local = threading.local()
+    lock = threading.Lock()
+    opened = []
+
+    def run(query):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            db = engine(fIn)
+            conn = local.conn = db.__enter__()
+            with lock:
+                opened.append(db)
+        return query_table(conn, query, columns[query], batchSize,
+                           (required or {}).get(query), strict)
+
+    done = {}
+    errors = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # the large Bauwerk joins come first in KDBFselect
+            futures = dict((pool.submit(run, query), query)
+                           for query in KDBFselect if query in columns)
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    done[query] = future.result()
+                except Exception as err:
+                    print("Query {} failed: {}".format(query, err))
+                    errors[query] = err
+                    continue
+                if onTable is not None:
+                    onTable(query, done[query])
+    finally:
+        for db in opened:
+            db.__exit__(None, None, None)
+
+    # assemble in query order independent of the completion order
+    res = dict((query, done[query]) for query in KDBFselect if query in done)
+    return res, errors
+
+
+def parse(fIn, cache=None, full=False, columns=None, batchSize=FETCH_BATCH,
+          workers=1, engine=kdbf, sim=None, strict=False, project=False):
+    """open connection to db and parse information
+
+    By default all tables are fetched with all columns. With project only the
+    columns declared by the consumers of the results (see
+    projection.requires) are fetched, e.g. for the plots and the
+    plausibility checks. Result stores (see store.py) are read directly
+    without firebird.
 
-    with kdbf(fIn) as conn:
-        # queries to database
-        for query in KDBFselect:
-            #TODO add step to clean up column names?
-            df = pd.read_sql_query(KDBFselect[query], conn)
-            df = clean_col_names(df)
-            res[query] = df.set_index('BEZEICHNUNG')
+    Params
+    ------
+    fIn (str): path to the kdbf file or a .kstore result store
+    cache (kdbfcache): opt. result cache, unchanged databases are loaded from
+        the cache instead of querying the database
+    full (bool): fetch all columns of all tables, the default unless
+        columns or project are given
+    columns (dict): opt. {table: [columns]} to fetch, None as column list
+        fetches all columns of a table
+    batchSize (int): number of rows fetched per batch
+    workers (int): number of concurrent connections, with more than one
+        worker failing queries are left out of the results
+    engine (class): database context manager class, defaults to kdbf
+    sim (str): simulation to read from a result store, None reads all
+        simulations with a column "sim" unless the store holds only one
+    strict (bool): raise a KeyError if a column declared by the consumers
+        is missing, before its query fetches any row
+    project (bool): only fetch the tables and columns declared by the
+        consumers, see projection.required_columns
+
+    Returns
+    -------
+    res (dict): dictionary of results in pandas.dataframes format
+    """
+    if full or (columns is None and not project):
+        columns = dict((query, None) for query in KDBFselect)
+    elif columns is None:
+        columns = required_columns()
+
+    if is_store(fIn):
+        with stage("read_store"):
+            return read_store(fIn, sim, columns, batchSize)
+
+    variant = repr(sorted((k, v) for k, v in columns.items()))
+    if cache is not None:
+        SCHEMAS.persist(os.path.join(cache.cacheDir, SCHEMAFILE))
+        with stage("cache load"):
+            res = cache.load(fIn, variant)
+        if res is not None:
+            return res
+
+    errors = {}
+    if workers > 1:
+        res, errors = parse_concurrent(fIn, columns, batchSize, workers,
+                                       engine, required=required_columns(),
+                                       strict=strict)
+    else:
+        res = {}
+        required = required_columns()
+        with engine(fIn) as conn:
+            # queries to database
+            for query in KDBFselect:
+                if query not in columns:
+                    continue
+                res[query] = query_table(conn, query, columns[query],
+                                         batchSize, required.get(query),
+                                         strict)
+
+    # don't cache incomplete results
+    if cache is not None and not errors:
+        with stage("cache store"):
+            cache.store(fIn, res, variant)
     return res
 
 
+@requires("zentralbecken", ["GESAMTVOLUMENERFORDERLICH", "VOLUMENANRECHENBAR",
+                           "VOLUMENERFORDERLICH", "ENTLASTUNGSFRACHT"])
+@requires("mischwasserbauwerke", ["VVORH", "SFUE", "SFUEIN128"])
 def create_zb_df(res):
     """create zentral becken dataframe
 
@@ -113,17 +368,40 @@ def get_fracht_color(entFr, entFr85, compVal):
         return "tab:green"
 
 
-def get_color_by_thresholds(valSeries, minVal, maxVal):
-    colors = []
-    for i in list(valSeries):
-        if i < minVal or i > maxVal:
-            colors.append('tab:red')
-        else:
-            colors.append('tab:blue')
-    return colors
+def draw_limits(ax, column, ruleList=MWB_RULES):
+    """draw the rule limits of a column as vertical lines
+    """
+    for lim in rules.limits(column, ruleList):
+        if lim is not None:
+            ax.axvline(x=lim, linestyle='--', linewidth=0.5)
+
+
+def get_figure(fig=None, nrows=1, ncols=1, **kwargs):
+    """create a figure with subplots or clear and reuse an existing figure
+
+    Returns
+    -------
+    fig, axes: matplotlib figure and axes like pyplot.subplots
+    """
+    # matplotlib is only imported on the plotting code path
+    import matplotlib.pyplot as plt
+
+    if fig is None:
+        return plt.subplots(nrows=nrows, ncols=ncols, **kwargs)
+    fig.clf()
+    return fig, fig.subplots(nrows=nrows, ncols=ncols, **kwargs)
+
 
+def show_figure(fig, show):
+    """show the figure in interactive mode and return it
+    """
+    if show:
+        import matplotlib.pyplot as plt
+        plt.show()
+    return fig
 
-def plot_zb(res):
+
+def plot_zb(res, fig=None, show=True):
     """plot information about fiktiv zentral becken and Entlastungsfracht
     """
     df = create_zb_df(res)
@@ -138,33 +416,39 @@ def plot_zb(res):
               get_fracht_color(vals[0], vals[1], vals[2]),
               get_fracht_color(vals[0], vals[1], vals[3])]
 
-    p1 = plt.bar(ind, vals, width, color=colors)
+    fig, ax = get_figure(fig)
+    ax.bar(ind, vals, width, color=colors)
 
-    plt.ylabel('Fracht [kg/a]')
-    plt.title('Fiktiv Zentralbecken Fracht / Modellfracht')
-    plt.xticks(ind, ('FZB', 'FZB 85%', 'Fracht', 'Fracht DWA-A 128'))
+    ax.set_ylabel('Fracht [kg/a]')
+    ax.set_title('Fiktiv Zentralbecken Fracht / Modellfracht')
+    ax.set_xticks(ind)
+    ax.set_xticklabels(('FZB', 'FZB 85%', 'Fracht', 'Fracht DWA-A 128'))
 
-    plt.show()
+    return show_figure(fig, show)
 
 
-def plot_mbw_fracht(res):
+@requires("mischwasserbauwerke", ["SFUEIN128"])
+def plot_mbw_fracht(res, fig=None, show=True):
     """plot mischwasserbauwerke, total loads
     """
     mwb = res['mischwasserbauwerke']
     # mwb = mwb.set_index('BEZEICHNUNG')
 
     mwb = mwb.sort_values(by='SFUEIN128', ascending=True)
-    ax = mwb.plot.barh(y='SFUEIN128', legend=None)
+    fig, ax = get_figure(fig)
+    mwb.plot.barh(ax=ax, y='SFUEIN128', legend=None)
     ax.set(xlabel='Fracht [kg/a]', ylabel='Bauwerk')
 
     # move legende to bottom righthand corner
-    plt.show()
+    return show_figure(fig, show)
 
 
-def plot_mbw_spez_fracht_and_vol(res):
+@requires("mischwasserbauwerke", ["SFUEIN128", "AUA128", "VOLUMEN"])
+def plot_mbw_spez_fracht_and_vol(res, fig=None, show=True):
     """plot mischwasserbauwerke, total and specific loads
     """
-    mwb = res['mischwasserbauwerke']
+    # shallow copy, the derived columns are not added to the shared table
+    mwb = res['mischwasserbauwerke'].copy(deep=False)
     # mwb = mwb.set_index('BEZEICHNUNG')
 
     # generate specific fracht and volumen columns
@@ -174,7 +458,7 @@ def plot_mbw_spez_fracht_and_vol(res):
     mwb = mwb.sort_values(by='SPEZFRACHT', ascending=True)
 
     # make 2 subplots with horizontal alignment
-    fig, axes = plt.subplots(nrows=1, ncols=2, sharey="all")
+    fig, axes = get_figure(fig, nrows=1, ncols=2, sharey="all")
     fig.suptitle('Spezifische Fracht und Volumen')
 
     # plot specific loads
@@ -184,34 +468,35 @@ def plot_mbw_spez_fracht_and_vol(res):
 
     # plot specific volumes
     # get colors for bw out of the range
-    colors = get_color_by_thresholds(mwb["SPEZVOL"], 10, 30)
+    colors = rules.colors(mwb, "SPEZVOL", MWB_RULES)
     mwb.plot.barh(ax=axes[1], y='SPEZVOL', color=colors, legend=None)
     axes[1].set(xlabel='Spezifisches Volumen [m^3/ha]')
-    axes[1].axvline(x=10, linestyle='--', linewidth=0.5)
-    axes[1].axvline(x=30, linestyle='--', linewidth=0.5)
+    draw_limits(axes[1], "SPEZVOL")
 
     # move legende to bottom righthand corner
-    plt.show()
+    return show_figure(fig, show)
 
 
-def plot_ka_last(res):
+@requires("mischwasserbauwerke", ["NA198"])
+def plot_ka_last(res, fig=None, show=True):
     """plot of the austlastung an der Kläranlage according to a198
     """
     mwb = res['mischwasserbauwerke']
     # mwb = mwb.set_index('BEZEICHNUNG')
 
     #
-    colors = get_color_by_thresholds(mwb["NA198"], 3, 9)
-    ax = mwb.plot.barh(y='NA198', legend=None, color=colors)
-    ax.axvline(x=3, linestyle='--', linewidth=0.5)
-    ax.axvline(x=9, linestyle='--', linewidth=0.5)
+    colors = rules.colors(mwb, "NA198", MWB_RULES)
+    fig, ax = get_figure(fig)
+    mwb.plot.barh(ax=ax, y='NA198', legend=None, color=colors)
+    draw_limits(ax, "NA198")
     ax.set(xlabel='Auslastungswert Kläranlage (A198)', ylabel='Bauwerk')
 
     # move legende to bottom righthand corner
-    plt.show()
+    return show_figure(fig, show)
 
 
-def plot_entlastungswerte(res):
+@requires("mischwasserbauwerke", ["E0", "NUED"])
+def plot_entlastungswerte(res, fig=None, show=True):
     """plot entlastunggsrate und -häufigkeit
     entlastungsrate between 10-40
     entlastungshäufigkeit between 20-50
@@ -220,35 +505,92 @@ def plot_entlastungswerte(res):
     # mwb = mwb.set_index('BEZEICHNUNG')
 
     # make 2 subplots with horizontal alignment
-    fig, axes = plt.subplots(nrows=1, ncols=2, sharey="all")
+    fig, axes = get_figure(fig, nrows=1, ncols=2, sharey="all")
     fig.suptitle('Entlastungsrate und -häufigkeit')
 
     # plot entlastungsrate
-    colors1 = get_color_by_thresholds(mwb["E0"], 10, 40)
+    flags = rules.check(mwb, MWB_RULES)
+    colors1 = rules.colors(mwb, "E0", MWB_RULES, flags)
     mwb.plot.barh(ax=axes[0], y='E0', color=colors1, legend=None)
     axes[0].set(ylabel="Bauwerk",
                 xlabel='Entlastungsrate [%]')
-    axes[0].axvline(x=10, linestyle='--', linewidth=0.5)
-    axes[0].axvline(x=40, linestyle='--', linewidth=0.5)
+    draw_limits(axes[0], "E0")
 
     # plot enlastunghäufigkeit
-    colors2 = get_color_by_thresholds(mwb["NUED"], 20, 50)
+    colors2 = rules.colors(mwb, "NUED", MWB_RULES, flags)
     mwb.plot.barh(ax=axes[1], y='NUED', color=colors2, legend=None)
     axes[1].set(xlabel='Entlastungshäufigkeit [d/a]')
-    axes[1].axvline(x=20, linestyle='--', linewidth=0.5)
-    axes[1].axvline(x=50, linestyle='--', linewidth=0.5)
+    draw_limits(axes[1], "NUED")
 
     # move legende to bottom righthand corner
-    plt.show()
+    return show_figure(fig, show)
 
 
-def export_all_to_excel(res, excel="kosim_tabellen.xlsx"):
-    with pd.ExcelWriter(xcelPath, engine="xlsxwriter") as writer:
-        for key in res:
+# plots of the plausibility check, used for rendering to files
+PLOTS = OrderedDict([("zentralbecken", plot_zb),
+                     ("mbw_fracht", plot_mbw_fracht),
+                     ("mbw_spez_fracht_vol", plot_mbw_spez_fracht_and_vol),
+                     ("ka_last", plot_ka_last),
+                     ("entlastungswerte", plot_entlastungswerte)])
+
+# tables the plots depend on
+PLOT_TABLES = {"zentralbecken": ("zentralbecken", "mischwasserbauwerke"),
+               "mbw_fracht": ("mischwasserbauwerke",),
+               "mbw_spez_fracht_vol": ("mischwasserbauwerke",),
+               "ka_last": ("mischwasserbauwerke",),
+               "entlastungswerte": ("mischwasserbauwerke",)}
+
+
+def render_plots(res, outDir, fmt="png", prefix="", plots=None, dpi=100):
+    """render the plausibility plots to image files without a display
+
+    A single figure is reused for all plots and closed afterwards.
+
+    Params
+    ------
+    res (dict): results dictionary from parsing function
+    outDir (str): output directory, created if missing
+    fmt (str): image format, e.g. png, svg, pdf
+    prefix (str): opt. file name prefix, e.g. the simulation name, folders
+        of simulation names (see sim_names) are joined with "_"
+    plots (list): opt. keys of PLOTS to render, defaults to all
+    dpi (int): resolution of raster images
+
+    Returns
+    -------
+    files (list): paths of the written images
+    """
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+    import matplotlib.pyplot as plt
+
+    if not os.path.exists(outDir):
+        os.makedirs(outDir)
+
+    prefix = prefix.replace("/", "_")
+    files = []
+    fig = plt.figure()
+    try:
+        for name in plots or PLOTS:
             try:
-                res[key].to_excel(writer, key)
-            except ValueError:
-                pass
+                with stage("plot " + name):
+                    PLOTS[name](res, fig=fig, show=False)
+            except (ValueError, KeyError) as err:
+                print("Grafik {} nicht darstellbar: {}".format(name, err))
+                continue
+            fName = "{}_{}.{}".format(prefix, name, fmt) if prefix else \
+                "{}.{}".format(name, fmt)
+            path = os.path.join(outDir, fName)
+            with stage("savefig"):
+                fig.savefig(path, format=fmt, dpi=dpi)
+            files.append(path)
+    finally:
+        plt.close(fig)
+    return files
+
+
+def export_all_to_excel(res, excel="kosim_tabellen.xlsx"):
+    res_dict_to_excel(res, excel)
 
 
 def cond_between(minVal, maxVal, colorformat):
@@ -305,13 +647,136 @@ def cond_formula(criteria, colorformat):
     return formDict
 
 
+def float_str_len(vals):
+    """length of str() of finite floats without formatting every value:
+    sign, integer digits, point and the fewest decimals that round trip.
+    Values printed in exponent notation or with more than 15 significant
+    digits are formatted one by one.
+    """
+    lens = np.zeros(len(vals), dtype=np.int64)
+    absVals = np.abs(vals)
+    sci = (absVals >= 1e16) | ((vals != 0) & (absVals < 1e-4))
+    if sci.any():
+        lens[sci] = [len(str(v)) for v in vals[sci].tolist()]
+    fixed = ~sci
+    vals = vals[fixed]
+    absVals = absVals[fixed]
+    with np.errstate(divide="ignore"):
+        intDigits = np.where(absVals < 1, 1,
+                             np.floor(np.log10(absVals)) + 1).astype(np.int64)
+    # log10 rounds up just below powers of ten, e.g. 9999999999999998.0
+    intDigits -= (intDigits > 1) & (10.0 ** (intDigits - 1) > absVals)
+    # str() shows at least one decimal, e.g. 3.0
+    decimals = np.zeros(len(vals), dtype=np.int64)
+    open_ = np.ones(len(vals), dtype=bool)
+    for d in range(1, 16):
+        # np.round is only exact up to 15 significant digits
+        done = open_ & (intDigits + d <= 15) & (np.round(vals, d) == vals)
+        decimals[done] = d
+        open_ &= ~done
+        if not open_.any():
+            break
+    fixedLens = np.signbit(vals) + intDigits + 1 + decimals
+    if open_.any():
+        fixedLens[open_] = [len(str(v)) for v in vals[open_].tolist()]
+    lens[fixed] = fixedLens
+    return lens
+
+
 def get_col_widths(dataframe):
     """ helper function to auto set col widths
     """
-    # First we find the maximum length of the index column   
-    idx_max = max([len(str(s)) for s in dataframe.index.values] + [len(str(dataframe.index.name))])
-    # Then, we concatenate this to the max of the lengths of column name and its values for each column, left to right
-    return [idx_max] + [max([len(str(s)) for s in dataframe[col].values] + [len(col)]) for col in dataframe.columns]
+    def max_len(vals, name):
+        arr = np.asarray(vals)
+        nameLen = len(str(name))
+        if not len(arr):
+            return nameLen
+        if arr.dtype.kind in "iub":
+            # the longest integer is the largest or the most negative one
+            return max(len(str(arr.max())), len(str(arr.min())), nameLen)
+        if arr.dtype.kind == "f":
+            # NaN is written as blank cell
+            arr = arr[np.isfinite(arr)]
+            if not len(arr):
+                return nameLen
+            return max(int(float_str_len(arr).max()), nameLen)
+        return max(int(np.char.str_len(arr.astype("U")).max()), nameLen)
+
+    # First we find the maximum length of the index column
+    idx_max = max_len(dataframe.index, dataframe.index.name)
+    # Then the max of the lengths of column name and its values for each
+    # column, left to right
+    return [idx_max] + [max_len(dataframe.iloc[:, i], col)
+                        for i, col in enumerate(dataframe.columns)]
+
+
+# excel sheet limits
+XLSX_MAX_ROWS = 1048576
+XLSX_MAX_COLS = 16384
+
+
+def open_workbook(excelPath):
+    """open a xlsxwriter workbook in constant memory mode, rows are flushed
+    to disk as soon as the next row is written
+    """
+    import xlsxwriter
+
+    return xlsxwriter.Workbook(excelPath, {"constant_memory": True,
+                                           "nan_inf_to_errors": True})
+
+
+def write_frame(workbook, sheetName, df, sev=None, formats=None,
+                headerFormat=None):
+    """write a dataframe with its index to a new worksheet row by row
+
+    Params
+    ------
+    workbook: xlsxwriter workbook, see open_workbook
+    sheetName (str): name of the worksheet
+    df (pandas.DataFrame): dataframe to write
+    sev (pandas.DataFrame): opt. severity matrix of df, see rules.severity
+    formats (dict): {severity level: xlsxwriter format} for flagged cells
+    headerFormat: opt. xlsxwriter format of the header and index
+
+    Returns
+    -------
+    worksheet: the written worksheet, further rows have to be written below
+        the table because of the constant memory mode
+    """
+    worksheet = workbook.add_worksheet(sheetName[:31])
+    if headerFormat is None:
+        headerFormat = workbook.add_format({'bold': True, 'border': 1})
+
+    # set col widths
+    for i, width in enumerate(get_col_widths(df)):
+        worksheet.set_column(i, i, width)
+
+    worksheet.write_row(0, 0, [df.index.name or ""] +
+                        [str(c) for c in df.columns], headerFormat)
+
+    # convert the columns once to lists of python values, NaN to blanks
+    idx = df.index.tolist()
+    cols = []
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if col.hasnans:
+            col = col.astype(object).where(col.notna(), None)
+        cols.append(col.tolist())
+
+    # flagged cells grouped by row
+    flagged = {}
+    if sev is not None:
+        sevVals = sev.to_numpy()
+        for row, col in zip(*np.nonzero(sevVals)):
+            flagged.setdefault(row, []).append((col, sevVals[row, col]))
+
+    for row, vals in enumerate(zip(*cols)):
+        worksheet.write(row + 1, 0, idx[row], headerFormat)
+        worksheet.write_row(row + 1, 1, vals)
+        for col, level in flagged.get(row, []):
+            worksheet.write(row + 1, col + 1, vals[col], formats[level])
+
+    return worksheet
 
 
 # TODO move this to the top of the file ?
@@ -326,19 +791,15 @@ mwbwShort = OrderedDict(
 )
 
 
-thresholds = {"QF": [0.03, 0.3], "QR": [0.2, 2.0], "NA198": [3.0, 9.0],
-              "SPEZVOL": [10, 30], "E0": [10, 40], "NUED": [20, 50],
-              "TUE": [20, 500]
-             }
-
-thresholds_rue = { "E0": [10, 40], "NUED": [20, 50], "TUE": [20, 500]
-                 }
-
-
+@requires("mischwasserbauwerke",
+          ["BEZEICHNUNG_1", "AUA128", "QF24", "QR", "NA198", "VOLUMEN",
+           "VBECKENPROHEKTAR", "E0", "NUED", "TUE", "MMIN", "MVORH", "X",
+           "TYPMISCHWASSERBAUWERKASSTRING", "SFUEIN128"])
 def create_mw_bw_short_tab(res):
     """create the short table for mw-bauwerk data
     """
-    df = res["mischwasserbauwerke"]
+    # shallow copy, the derived columns are not added to the shared table
+    df = res["mischwasserbauwerke"].copy(deep=False)
     # print(list(df.columns))
     df["QF"] = df["QF24"] / df["AUA128"]
     # calculate spezific volume
@@ -354,10 +815,16 @@ def create_mw_bw_short_tab(res):
     return df
 
 
+@requires("mischwasserbauwerke",
+          ["TYPMISCHWASSERBAUWERKASSTRING", "VMIN", "VMINA102", "VVORH",
+           "MMIN", "MVORH", "QA", "QKRIT", "QDRMAX", "TE", "E0", "NUED",
+           "CUE", "CKUE", "CBUE", "SFUE", "SFUEIN128", "LAENGE", "BREITE",
+           "TIEFE", "STAURAUMLAENGE"])
 def create_mw_einzelpruef_tab(res):
     """create short table for a Einzelnachweis of different MW-Bauwerke
     """
-    df = res["mischwasserbauwerke"]
+    # shallow copy, the derived columns are not added to the shared table
+    df = res["mischwasserbauwerke"].copy(deep=False)
 
     # geschwindigkeit für Stauraumkanal
     df["GESCHW"] = df["QKRIT"] / (df["VVORH"] / df["STAURAUMLAENGE"])
@@ -378,25 +845,70 @@ def create_mw_einzelpruef_tab(res):
     return df
 
 
-def plaus_excel(res, excelPath="kosim_plaus.xlsx"):
-    """create excel table of einzelnachweise and plausibility
+LIMIT_LABELS = ('Untergrenze', 'Obergrenze', 'Parameter Beschreibung')
+
+
+def write_rule_limits(worksheet, df, ruleList, row, startCol=1):
+    """write lower limit, upper limit and description of the rules below
+    the table
+    """
+    cols = list(df.columns)
+    limits = {}
+    for r in ruleList:
+        if r.column in cols:
+            low, high = rules.limits(r.column, ruleList)
+            limits[cols.index(r.column)] = (low, high, r.description)
+
+    # constant memory mode: write row by row
+    for i in range(3):
+        worksheet.write_string(row + i, 0, LIMIT_LABELS[i])
+        for pos in sorted(limits):
+            val = limits[pos][i]
+            if val is not None:
+                worksheet.write(row + i, startCol + pos, val)
+
+
+# sheets of the plausibility workbook and the tables they depend on
+PLAUS_SHEETS = OrderedDict([("Gebiete", ("gebiete",)),
+                            ("MW-Bauwerke", ("mischwasserbauwerke",)),
+                            ("Einzelnachweis", ("mischwasserbauwerke",))])
+
+
+@requires("gebiete")
+def build_plaus_sheet(res, name):
+    """compute the table of a sheet of the plausibility workbook
+
+    Params
+    ------
+    res (dict): results dictionary from parsing function
+    name (str): key of PLAUS_SHEETS
 
-    Values taken from RP Merkblatt:
-
-    Versieglungsgrad [-]                   0,28-0,5
-    Einwohnerdichte [E/ha]                 35-110
-    Wasserverbrauch [l/E*d]                85-150
-    Fremdwasserspende [l/s*ha]             0,03-0,3
-    Regenwasser an RÜB-Drosseln [l/s*ha]   0,2-2,0
-    Auslastungswert Kläranlage [-]         3,0-9,0
-    Spezifisiches Speichervolumen [l/s*ha] 10-30
-    Entlastungsrate [%]                    10-40
-    Entlastungshäufigkeit [d/a]            20-50
-    Entlastungsdauer [h/a]                 20-500
-    Mischverhältnis [-]                    > m min
-    """
-    with pd.ExcelWriter(excelPath, engine="xlsxwriter") as writer:
-        workbook = writer.book
+    Returns
+    -------
+    df (pandas.DataFrame), sev (pandas.DataFrame): table and its severity
+        matrix (None for sheets without rules)
+    """
+    if name == "Gebiete":
+        return res["gebiete"], None
+    elif name == "MW-Bauwerke":
+        short = create_mw_bw_short_tab(res)
+        return short, rules.severity(short, MWB_RULES)
+    elif name == "Einzelnachweis":
+        einzel = create_mw_einzelpruef_tab(res)
+        return einzel, rules.severity(einzel, EINZEL_RULES)
+    raise KeyError("Unknown sheet {}".format(name))
+
+
+def write_plaus_workbook(sheets, excelPath="kosim_plaus.xlsx"):
+    """write the sheets computed by build_plaus_sheet to the plausibility
+    workbook, the workbook is written row by row in constant memory mode
+
+    Params
+    ------
+    sheets (dict): {sheet name: (df, sev)} in PLAUS_SHEETS order
+    excelPath (str): path of the excel file
+    """
+    with open_workbook(excelPath) as workbook:
         # Add a format. Light red fill with dark red text.
         red = workbook.add_format({'bg_color': '#FFC7CE',
                                    'font_color': '#9C0006'})
@@ -408,164 +920,197 @@ def plaus_excel(res, excelPath="kosim_plaus.xlsx"):
         # Add bold underline format
         bold = workbook.add_format({'bold': True, 'underline': True})
 
-        # slice gebiets data
-        geb = res["gebiete"]
-        numVals = len(geb) + 1  # add 1 to account for header
-        geb.to_excel(writer, sheet_name="Gebiete")
-        worksheet = writer.sheets["Gebiete"]
-        worksheet.conditional_format("L2:L{}".format(numVals),
-                                     cond_not_between(35, 110, red))
-
-        # slice mw-Bauwerk data
-        df = create_mw_bw_short_tab(res)
-        df = df.rename(columns=mwbwShort)
-
-        # calculate number of rows
-        numVals = len(df) + 1  # add 1 to account for header
-
-        # write to excel
-        df.to_excel(writer, sheet_name="MW-Bauwerke")
-        worksheet = writer.sheets["MW-Bauwerke"]
-        # set col widths
-        # TODO run through values in dictionary
-        # TODO create dictionary of parameters, thresholds, etc.
-        # TODO use bawerktype to determine if conditional formatting should be
-        # applied 
-        for i, width in enumerate(get_col_widths(df)):
-            worksheet.set_column(i, i, width)
-
-        worksheet.conditional_format("O2:O{}".format(numVals),
-                                     cond_lt(0.03, orange))
-        worksheet.conditional_format("O2:O{}".format(numVals),
-                                     cond_mt(0.30, red))
-        worksheet.conditional_format("E2:E{}".format(numVals),
-                                     cond_lt(0.2, orange))
-        worksheet.conditional_format("E2:E{}".format(numVals),
-                                     cond_mt(2.0, red))
-        worksheet.conditional_format("F2:F{}".format(numVals),
-                                     cond_lt(3.0, orange))
-        worksheet.conditional_format("F2:F{}".format(numVals),
-                                     cond_mt(9.0, red))
-        worksheet.conditional_format("H2:H{}".format(numVals),
-                                     cond_lt(10.0, orange))
-        worksheet.conditional_format("H2:H{}".format(numVals),
-                                     cond_mt(30.0, red))
-        worksheet.conditional_format("I2:I{}".format(numVals),
-                                     cond_lt(10.0, orange))
-        worksheet.conditional_format("I2:I{}".format(numVals),
-                                     cond_mt(40.0, red))
-        worksheet.conditional_format("J2:J{}".format(numVals),
-                                     cond_lt(20.0, orange))
-        worksheet.conditional_format("J2:J{}".format(numVals),
-                                     cond_mt(50.0, red))
-        worksheet.conditional_format("K2:K{}".format(numVals),
-                                     cond_lt(20.0, orange))
-        worksheet.conditional_format("K2:K{}".format(numVals),
-                                     cond_mt(500.0, red))
-        worksheet.conditional_format("M2:M{}".format(numVals),
-                                     {'type':'formula',
-                                      'criteria': '=$M2<$L2',
-                                      'format': red})
-        # write threshold values
-        worksheet.write_string(numVals + 1, 0, 'Untergrenze')
-        worksheet.write_string(numVals + 2, 0, 'Obergrenze')
-        worksheet.write_string(numVals + 3, 0, 'Parameter Beschreibung')
-
-        worksheet.write("O{}".format(numVals + 2), 0.03)
-        worksheet.write("O{}".format(numVals + 3), 0.30)
-        worksheet.write("O{}".format(numVals + 4), 'Fremdwasserspende [l/s*ha]')
-
-        worksheet.write("E{}".format(numVals + 2), 0.2)
-        worksheet.write("E{}".format(numVals + 3), 2.0)
-        worksheet.write("E{}".format(numVals + 4), 'Regenwasserspende an RUEB-Drosseln [l/s*ha]')
-
-        worksheet.write("F{}".format(numVals + 2), 3.0)
-        worksheet.write("F{}".format(numVals + 3), 9.0)
-        worksheet.write("F{}".format(numVals + 4), 'Auslastungswert KA [-]')
-
-        worksheet.write("H{}".format(numVals + 2), 10.0)
-        worksheet.write("H{}".format(numVals + 3), 30.0)
-        worksheet.write("H{}".format(numVals + 4), 'Spezifisches Speichervolumen [m^3/ha]')
-
-        worksheet.write("I{}".format(numVals + 2), 10.0)
-        worksheet.write("I{}".format(numVals + 3), 40.0)
-        worksheet.write("I{}".format(numVals + 4), 'Entlastungsrate [%]')
-
-        worksheet.write("J{}".format(numVals + 2), 20.0)
-        worksheet.write("J{}".format(numVals + 3), 50.0)
-        worksheet.write("J{}".format(numVals + 4), 'Entlastungshaeufigkeit [d/a]')
-
-        worksheet.write("K{}".format(numVals + 2), 20.0)
-        worksheet.write("K{}".format(numVals + 3), 500.0)
-        worksheet.write("K{}".format(numVals + 4), 'Entlastungsdauer [h/a]')
-
-        worksheet.write("M{}".format(numVals + 4), 'Mischverhaeltnis [-]')
-
-        # insert legend
-        worksheet.write_string((numVals + 4), 0, 'Legende', bold)
-        worksheet.write_string((numVals + 5), 0, 'Größer als Grenzwert', red)
-        worksheet.write_string((numVals + 6), 0, 'Niedriger als Grenzwert',
-                               orange)
-
-        # slice mw-Bauwerk data
-        einzel = create_mw_einzelpruef_tab(res)
+        header = workbook.add_format({'bold': True, 'border': 1})
+
+        formats = {rules.SEVERITY["orange"]: orange,
+                   rules.SEVERITY["red"]: red}
+
+        for name, (df, sev) in sheets.items():
+            numVals = len(df) + 1  # add 1 to account for header
+            if name == "Gebiete":
+                worksheet = write_frame(workbook, name, df,
+                                        headerFormat=header)
+                # Einwohnerdichte, the column is only known by its position
+                worksheet.conditional_format("L2:L{}".format(numVals),
+                                             cond_not_between(35, 110, red))
+            elif name == "MW-Bauwerke":
+                worksheet = write_frame(workbook, name,
+                                        df.rename(columns=mwbwShort), sev,
+                                        formats, header)
+
+                # write threshold values
+                write_rule_limits(worksheet, df, MWB_RULES, numVals + 1)
+
+                # insert legend
+                worksheet.write_string((numVals + 4), 0, 'Legende', bold)
+                worksheet.write_string((numVals + 5), 0,
+                                       'Größer als Grenzwert', red)
+                worksheet.write_string((numVals + 6), 0,
+                                       'Niedriger als Grenzwert', orange)
+            else:
+                write_frame(workbook, name, df, sev, formats, header)
+
+
+def plaus_excel(res, excelPath="kosim_plaus.xlsx"):
+    """create excel table of einzelnachweise and plausibility
+
+    The cells are formatted with the flags of the plausibility rules in
+    rules.MWB_RULES and rules.EINZEL_RULES (limits from the RP Merkblatt).
+    """
+    with stage("plaus_excel build"):
+        sheets = OrderedDict((name, build_plaus_sheet(res, name))
+                             for name in PLAUS_SHEETS)
+    with stage("plaus_excel write"):
+        write_plaus_workbook(sheets, excelPath)
 
-        # calculate number of rows
-        numVals = len(einzel) + 1  # add 1 to account for header
-
-        # write to excel
-        einzel.to_excel(writer, sheet_name="Einzelnachweis")
-        worksheet = writer.sheets["Einzelnachweis"]
-
-        # set column widths automagically
-        for i, width in enumerate(get_col_widths(df)):
-            worksheet.set_column(i, i, width)
-
-        # mischverhältnis cond
-        worksheet.conditional_format("G2:G{}".format(numVals),
-                                     cond_formula('=$G2<$F2', red))
-        # min volume cond
-        worksheet.conditional_format("E2:E{}".format(numVals),
-                                     cond_formula('=$E2<$C2', red))
-        # entleerungszeit Te condition
-        frml = 'AND($K2>10, $K2<=15)'
-        worksheet.conditional_format("K2:K{}".format(numVals),
-                                     cond_formula(frml, orange))
-        worksheet.conditional_format("K2:K{}".format(numVals),
-                                     cond_formula('=$K2>15', red))
-        # Klärbedingung cond. Duchlaufbecken qa < 10 m/h
-        frml = 'AND(OR($B2="DBN", $B2="DBH"), $H2>10)'
-        worksheet.conditional_format("H2:H{}".format(numVals),
-                                     cond_formula(frml, red))
-        # Geschwindigkeit im Durchlaufbecken
-        frml = 'AND(OR($B2="DBN", $B2="DBH"), $S2>0.05)'
-        worksheet.conditional_format("S2:S{}".format(numVals),
-                                     cond_formula(frml, red))
-        # Klärbedingung cond. SKUE
-        frml = 'AND($B2="SKUE", $S2>0.3)'
-        worksheet.conditional_format("S2:S{}".format(numVals),
-                                     cond_formula(frml, red))
-
-
-        # writer.save()
-
-
-def parse_kdbf_dir(dirIn):
+
+def plaus_report(res):
+    """console report of the Bauwerke violating the plausibility rules
+    """
+    lines = []
+    mwb = rules.report(create_mw_bw_short_tab(res), MWB_RULES)
+    if mwb:
+        lines += ["MW-Bauwerke", mwb]
+    einzel = rules.report(create_mw_einzelpruef_tab(res), EINZEL_RULES)
+    if einzel:
+        lines += ["Einzelnachweis", einzel]
+    return "\n".join(lines)
+
+
+def _parse_sim(db, simName=None, cache=None, full=False, engine=kdbf,
+               compact=False, floatTol=0.0, renderDir=None, fmt="png"):
+    """worker function for parse_kdbf_dir, every call opens its own kdbf
+    connection so that it can run in a separate process. Columns declared by
+    the consumers but missing in the database are added as NaN.
+
+    Params
+    ------
+    db (str): path to the kdbf file
+    simName (str): opt. name of the simulation, default the file name
+    cache (kdbfcache): opt. result cache
+    full (bool): fetch all columns of all tables
+    engine (class): database context manager class, defaults to kdbf
+    compact (bool): compact the results before returning them
+    floatTol (float): relative tolerance of float downcasting, see
+        compact.compact
+    renderDir (str): opt. render the plots of the parsed results to this
+        directory, the database is only parsed once
+    fmt (str): image format of the rendered plots
+
+    Returns
+    -------
+    simName (str), res (dict): name of the simulation and the parsed results,
+    res is None if the database could not be parsed
+    """
+    simName = simName or get_filename(db)
+    try:
+        res = fill_missing_columns(parse(db, cache=cache, full=full,
+                                         engine=engine))
+        if renderDir is not None:
+            render_plots(res, renderDir, fmt, simName)
+        if compact:
+            from pykosimcli.compact import compact as compact_res
+            res = compact_res(res, floatTol, report=False)
+        return simName, res
+    except Exception as err:
+        print("Parsing {} failed: {}".format(db, err))
+        return simName, None
+
+
+def parse_kdbf_dir(dirIn, workers=None, cache=None, full=False, compact=False,
+                   floatTol=0.0, renderDir=None, fmt="png"):
     """parse all kdbfs in a directory and aggregate the results
 
+    Every database is parsed in a worker process of a process pool. The
+    results are merged into one dataframe per table, the simulation name
+    (see sim_names) is added as column "sim".
+
     Params
     ------
     dirIn (str): input directory path as string
+    workers (int): number of worker processes, defaults to the cpu count
+    cache (kdbfcache): opt. result cache
+    full (bool): fetch all columns of all tables
+    compact (bool): compact the results in the workers and after merging,
+        see compact.compact
+    floatTol (float): relative tolerance of float downcasting
+    renderDir (str): opt. render the plots of every simulation to this
+        directory in the worker that parsed it, see render_kdbf_dir
+    fmt (str): image format of the rendered plots
 
     Returns
     -------
     res (dict): dictionary of results in pandas.dataframes format
     """
-    res = {}
-    for db in get_filetype_in_dir(dirIn):
-        simName = get_filename(db)
-        # TODO: aggregate vals
-        concat_dfs_by_index(res, "schacht", scht)
+    from functools import partial
+    from concurrent.futures import ProcessPoolExecutor
+
+    dbs = get_filetype_in_dir(dirIn)
+    acc = resaccumulator()
+    if not dbs:
+        return {}
+
+    workerCache = cache.worker() if cache is not None else None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for simName, simRes in pool.map(partial(_parse_sim, cache=workerCache,
+                                                full=full, compact=compact,
+                                                floatTol=floatTol,
+                                                renderDir=renderDir,
+                                                fmt=fmt), dbs, sim_names(dbs)):
+            if simRes is not None:
+                acc.add(simName, simRes)
+    if cache is not None:
+        cache.evict(rescan=True)
+
+    if compact:
+        # categories and dtypes of the simulations may differ after merging
+        from pykosimcli.compact import compact as compact_res
+        return compact_res(acc.result(), floatTol)
+    return acc.result()
+
+
+def _render_sim(db, simName, outDir, fmt="png", cache=None):
+    """worker function for render_kdbf_dir: parse one database and render
+    its plots with the simulation name as file prefix
+    """
+    try:
+        return render_plots(parse(db, cache=cache, project=True), outDir,
+                            fmt, simName)
+    except Exception as err:
+        print("Rendering {} failed: {}".format(db, err))
+        return []
+
+
+def render_kdbf_dir(dirIn, outDir, fmt="png", workers=None, cache=None):
+    """render the plausibility plots of all kdbfs in a directory in a
+    process pool
+
+    Params
+    ------
+    dirIn (str): input directory path as string
+    outDir (str): output directory of the images
+    fmt (str): image format
+    workers (int): number of worker processes, defaults to the cpu count
+    cache (kdbfcache): opt. result cache
+
+    Returns
+    -------
+    files (list): paths of the written images
+    """
+    from functools import partial
+    from concurrent.futures import ProcessPoolExecutor
+
+    dbs = get_filetype_in_dir(dirIn)
+    files = []
+    workerCache = cache.worker() if cache is not None else None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for simFiles in pool.map(partial(_render_sim, outDir=outDir, fmt=fmt,
+                                         cache=workerCache),
+                                 dbs, sim_names(dbs)):
+            files += simFiles
+    if cache is not None:
+        cache.evict(rescan=True)
+    return files
 
 
 def read_im_input_file(fIn):
@@ -618,16 +1163,28 @@ def aggregate_results(resDF):
 def res_dict_to_excel(resDict, xcelPath):
     """export result dictionary of panda dfs to excel
     """
-    with pd.ExcelWriter(xcelPath, engine="xlsxwriter") as writer:
+    with open_workbook(xcelPath) as workbook:
         for key in resDict:
-            try:
-                resDict[key].to_excel(writer, key)
-            except ValueError:
-                pass
+            df = resDict[key]
+            if len(df) + 1 > XLSX_MAX_ROWS or df.shape[1] + 1 > XLSX_MAX_COLS:
+                print("Tabelle {} zu gross fuer Excel, nicht exportiert".format(
+                    key))
+                continue
+            write_frame(workbook, key, df)
 
 
 if __name__ == "__main__":
-    res = parse("../test/data/muster-mw.kdbf")
+    import sys
+
+    if len(sys.argv) > 1:
+        res = parse(sys.argv[1])
+    else:
+        # synthetic stand-in model, no firebird needed
+        import tempfile
+        from pykosimcli.bench import make_model, standin
+
+        model = make_model(os.path.join(tempfile.mkdtemp(), "muster.sqlite"))
+        res = parse(model, engine=standin)
     # plot_zb(res)
     # plot_mbw_fracht(res)
     # plot_mbw_spez_fracht_and_vol(res)
@@ -0,0 +1,247 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from collections import OrderedDict
+
+import pykosimcli.parsedb as pk
+from pykosimcli.kdbf import kdbf
+from pykosimcli.kdbf import KDBFselect
+from pykosimcli.kdbf import FETCH_BATCH
+from pykosimcli.projection import required_columns
+from pykosimcli.store import is_store
+from pykosimcli.timing import stage
+
+"""pipelined execution of a single model run - the outputs are started as
+soon as the tables they depend on are parsed and run concurrently to each
+other and to the remaining queries
+"""
+
+
+def _warmup(plots=True, excel=True):
+    """worker function: import the plotting and excel modules the run needs
+    while the queries are running
+    """
+    if plots:
+        import matplotlib
+        matplotlib.use("Agg", force=True)
+        import matplotlib.pyplot  # noqa: F401
+    if excel:
+        import xlsxwriter  # noqa: F401
+
+
+def _render_task(res, outDir, fmt, prefix, name):
+    """worker function: render one plot in a separate process
+    """
+    return pk.render_plots(res, outDir, fmt, prefix, [name])
+
+
+def _excel_task(sheets, excelPath):
+    """worker function: write the plausibility workbook in a separate process
+    """
+    pk.write_plaus_workbook(sheets, excelPath)
+    return [excelPath]
+
+
+class outputtask(object):
+    """
+    output of a run and the tables it needs
+
+    Params
+    ------
+    name (str): name used in messages
+    tables (tuple): keys of the tables the output depends on
+    start (function): called with the result dict once all tables are
+        available, returns a future or None
+    process (bool): the output runs in the process pool
+    """
+    def __init__(self, name, tables, start, process=False):
+        self.name = name
+        self.tables = set(tables)
+        self.start = start
+        self.process = process
+        self.future = None
+        self.started = False
+
+
+class pipeline(object):
+    """
+    pipelined executor of parse, plausibility report, rendered plots and the
+    plausibility workbook of a model
+
+    The queries run on a pool of database connections. Every finished table
+    starts the outputs depending on it: the plots are rendered and the
+    workbook is written in a process pool, so they overlap each other and
+    the remaining queries. The sheets of the workbook are built as soon as
+    their tables arrive.
+
+    Params
+    ------
+    fIn (str): path to the kdbf file or a result store
+    xcel (str): opt. path of the plausibility workbook
+    render (str): opt. output directory of the rendered plots
+    fmt (str): image format of the rendered plots
+    check (bool): print the plausibility report
+    cache (kdbfcache): opt. result cache
+    queryWorkers (int): number of concurrent database connections
+    outputWorkers (int): number of output processes, defaults to the number
+        of outputs
+    sim (str): simulation of a result store
+    compact (bool): compact every table as it arrives, see compact.compact
+    floatTol (float): relative tolerance of float downcasting
+    engine (class): database context manager class, defaults to kdbf
+    """
+    def __init__(self, fIn, xcel=None, render=None, fmt="png", check=False,
+                 cache=None, queryWorkers=2, outputWorkers=None, sim=None,
+                 compact=False, floatTol=0.0, engine=kdbf):
+        self.fIn = os.path.abspath(fIn)
+        self.xcel = xcel
+        self.render = render
+        self.fmt = fmt
+        self.check = check
+        self.cache = cache
+        self.queryWorkers = queryWorkers
+        self.outputWorkers = outputWorkers
+        self.sim = sim
+        self.compact = compact
+        self.floatTol = floatTol
+        self.engine = engine
+        self.res = {}
+        self.sheets = OrderedDict()
+        self.pool = None
+        self.tasks = []
+
+    def _build_tasks(self):
+        """output tasks of the run in the order they should start
+        """
+        tasks = []
+        if self.render is not None:
+            prefix = self.sim or pk.get_filename(self.fIn)
+            for name, tables in pk.PLOT_TABLES.items():
+                tasks.append(outputtask(
+                    "Grafik " + name, tables,
+                    lambda res, name=name, tables=tables: self.pool.submit(
+                        _render_task, self._subset(tables), self.render,
+                        self.fmt, prefix, name), process=True))
+        if self.xcel is not None:
+            for name, tables in pk.PLAUS_SHEETS.items():
+                tasks.append(outputtask(
+                    "Blatt " + name, tables,
+                    lambda res, name=name: self._build_sheet(name)))
+            sheetTables = set()
+            for tables in pk.PLAUS_SHEETS.values():
+                sheetTables.update(tables)
+            tasks.append(outputtask(
+                "Excel", sheetTables,
+                lambda res: self.pool.submit(
+                    _excel_task, self._ordered_sheets(), self.xcel),
+                process=True))
+        if self.check:
+            tasks.append(outputtask(
+                "Plausibilitaet", ("mischwasserbauwerke",),
+                lambda res: print(pk.plaus_report(res))))
+        return tasks
+
+    def _subset(self, tables):
+        return dict((t, self.res[t]) for t in tables if t in self.res)
+
+    def _ordered_sheets(self):
+        """built sheets in workbook order, independent of the table order
+        """
+        return OrderedDict((name, self.sheets[name]) for name in pk.PLAUS_SHEETS
+                           if name in self.sheets)
+
+    def _build_sheet(self, name):
+        with stage("plaus_excel build"):
+            self.sheets[name] = pk.build_plaus_sheet(self.res, name)
+
+    def add_table(self, query, df):
+        """store a parsed table and start the outputs which became ready
+        """
+        if self.compact:
+            from pykosimcli.compact import compact
+            df = compact({query: df}, self.floatTol, report=False)[query]
+        self.res[query] = df
+        available = set(self.res)
+        for task in self.tasks:
+            if task.started or not task.tables <= available:
+                continue
+            task.started = True
+            try:
+                task.future = task.start(self.res)
+            except Exception as err:
+                print("{} fehlgeschlagen: {}".format(task.name, err))
+
+    def _load(self, columns):
+        """load all tables at once from a result store or the cache
+
+        Returns
+        -------
+        res (dict): results or None if they have to be queried
+        """
+        if is_store(self.fIn):
+            return pk.parse(self.fIn, columns=columns, sim=self.sim)
+        if self.cache is not None:
+            variant = repr(sorted((k, v) for k, v in columns.items()))
+            return self.cache.load(self.fIn, variant)
+        return None
+
+    def run(self, columns=None, batchSize=FETCH_BATCH):
+        """parse the model and produce all outputs
+
+        Returns
+        -------
+        res (dict): dictionary of results in pandas.dataframes format
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        if columns is None:
+            columns = required_columns()
+        self.tasks = self._build_tasks()
+        # the sheets and the report are built in this process
+        processTasks = sum(1 for task in self.tasks if task.process)
+        workers = self.outputWorkers or max(
+            1, min(processTasks, os.cpu_count() or 1))
+
+        start = time.time()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            self.pool = pool
+            # start the workers before the query threads, forking a process
+            # with running threads is unsafe
+            for i in range(workers):
+                pool.submit(_warmup, self.render is not None,
+                            self.xcel is not None)
+            res = self._load(columns)
+            if res is not None:
+                for query in KDBFselect:
+                    if query in res:
+                        self.add_table(query, res[query])
+            else:
+                with stage("parse"):
+                    res, errors = pk.parse_concurrent(
+                        self.fIn, columns, batchSize, self.queryWorkers,
+                        self.engine, self.add_table)
+                if self.cache is not None and not errors:
+                    variant = repr(sorted((k, v) for k, v in columns.items()))
+                    self.cache.store(self.fIn, res, variant)
+            print("Tabellen geladen nach {:.2f} s".format(time.time() - start))
+
+            files = []
+            with stage("outputs"):
+                for task in self.tasks:
+                    if not task.started:
+                        print("{} nicht erzeugt, Tabellen fehlen: {}".format(
+                            task.name, ", ".join(sorted(
+                                task.tables - set(self.res)))))
+                        continue
+                    if task.future is None:
+                        continue
+                    try:
+                        files += task.future.result()
+                    except Exception as err:
+                        print("{} fehlgeschlagen: {}".format(task.name, err))
+        self.pool = None
+        print("{} Dateien erzeugt nach {:.2f} s".format(len(files),
+                                                        time.time() - start))
+        return self.res
@@ -0,0 +1,54 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""column projection registry - every consumer of the parsed tables declares
+the columns it needs, parse() only fetches the union of these columns
+"""
+
+# index column of all parsed tables
+INDEX = "BEZEICHNUNG"
+
+# {table: {consumer: [columns] or None for all columns}}
+KDBFcolumns = {}
+
+
+def requires(table, columns=None):
+    """decorator for declaring the columns a function needs from a table of
+    the parse() result
+
+    Params
+    ------
+    table (str): key of the table in KDBFselect
+    columns (list): unique column names, None for all columns of the table
+    """
+    def register(func):
+        consumers = KDBFcolumns.setdefault(table, {})
+        consumers[func.__name__] = None if columns is None else list(columns)
+        return func
+    return register
+
+
+def required_columns(consumers=None):
+    """union of the declared columns per table
+
+    Params
+    ------
+    consumers (list): opt. names of the consumers to include, defaults to all
+
+    Returns
+    -------
+    cols (dict): {table: [columns] or None for all columns}, tables which are
+        not needed by any consumer are not included
+    """
+    cols = {}
+    for table, decl in KDBFcolumns.items():
+        for consumer, columns in decl.items():
+            if consumers is not None and consumer not in consumers:
+                continue
+            if columns is None:
+                cols[table] = None
+            elif table not in cols:
+                cols[table] = [INDEX] + [c for c in columns if c != INDEX]
+            elif cols[table] is not None:
+                cols[table] += [c for c in columns if c not in cols[table]]
+    return cols
@@ -0,0 +1,244 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+"""plausibility rules - declarative limits checked against the parsed tables
+with vectorized comparisons
+
+Values taken from RP Merkblatt:
+
+Versieglungsgrad [-]                   0,28-0,5
+Einwohnerdichte [E/ha]                 35-110
+Wasserverbrauch [l/E*d]                85-150
+Fremdwasserspende [l/s*ha]             0,03-0,3
+Regenwasser an RÜB-Drosseln [l/s*ha]   0,2-2,0
+Auslastungswert Kläranlage [-]         3,0-9,0
+Spezifisiches Speichervolumen [l/s*ha] 10-30
+Entlastungsrate [%]                    10-40
+Entlastungshäufigkeit [d/a]            20-50
+Entlastungsdauer [h/a]                 20-500
+Mischverhältnis [-]                    > m min
+"""
+
+TYPECOL = "TYPMISCHWASSERBAUWERKASSTRING"
+
+# severity levels, higher levels win if several rules flag the same cell
+SEVERITY = {"orange": 1, "red": 2}
+
+
+class rule(object):
+    """
+    single plausibility rule on a column of a parsed table
+
+    kinds:
+        lt: value < value
+        mt: value > value
+        outside: value < low or value > high
+        between: low < value <= high
+        col_lt: value < value of column other
+
+    Params
+    ------
+    name (str): unique name of the rule
+    column (str): checked column
+    kind (str): one of lt, mt, outside, between, col_lt
+    value (float): limit for lt and mt
+    low, high (float): limits for outside and between
+    other (str): column compared against for col_lt
+    types (list): opt. Bauwerk types the rule applies to
+    severity (str): orange or red
+    description (str): parameter description with unit
+    """
+    def __init__(self, name, column, kind, value=None, low=None, high=None,
+                 other=None, types=None, severity="red", description=""):
+        self.name = name
+        self.column = column
+        self.kind = kind
+        self.value = value
+        self.low = low
+        self.high = high
+        self.other = other
+        self.types = types
+        self.severity = severity
+        self.description = description
+
+    def columns(self):
+        """columns needed to evaluate the rule
+        """
+        cols = [self.column]
+        if self.other is not None:
+            cols.append(self.other)
+        if self.types is not None:
+            cols.append(TYPECOL)
+        return cols
+
+    def applies(self, df):
+        return all(c in df.columns for c in self.columns())
+
+    def evaluate(self, df):
+        """boolean array, True where the rule is violated, NaN values are
+        never flagged
+        """
+        vals = df[self.column].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            if self.kind == "lt":
+                flags = vals < self.value
+            elif self.kind == "mt":
+                flags = vals > self.value
+            elif self.kind == "outside":
+                flags = (vals < self.low) | (vals > self.high)
+            elif self.kind == "between":
+                flags = (vals > self.low) & (vals <= self.high)
+            elif self.kind == "col_lt":
+                other = df[self.other].to_numpy(dtype=np.float64,
+                                                na_value=np.nan)
+                flags = vals < other
+            else:
+                raise ValueError("Unknown rule kind {}".format(self.kind))
+
+        if self.types is not None:
+            types = df[TYPECOL].to_numpy(dtype=object)
+            flags &= np.isin(types, self.types)
+        return flags
+
+
+def range_rules(column, low, high, description=""):
+    """rules for a value range: lower violations orange, upper ones red
+    """
+    return [rule("{}<{}".format(column, low), column, "lt", value=low,
+                 severity="orange", description=description),
+            rule("{}>{}".format(column, high), column, "mt", value=high,
+                 severity="red", description=description)]
+
+
+MWB_RULES = (range_rules("QF", 0.03, 0.3, "Fremdwasserspende [l/s*ha]") +
+             range_rules("QR", 0.2, 2.0,
+                         "Regenwasserspende an RUEB-Drosseln [l/s*ha]") +
+             range_rules("NA198", 3.0, 9.0, "Auslastungswert KA [-]") +
+             range_rules("VBECKENPROHEKTAR", 10.0, 30.0,
+                         "Spezifisches Speichervolumen [m^3/ha]") +
+             range_rules("SPEZVOL", 10.0, 30.0,
+                         "Spezifisches Speichervolumen [m^3/ha]") +
+             range_rules("E0", 10.0, 40.0, "Entlastungsrate [%]") +
+             range_rules("NUED", 20.0, 50.0, "Entlastungshaeufigkeit [d/a]") +
+             range_rules("TUE", 20.0, 500.0, "Entlastungsdauer [h/a]") +
+             [rule("MVORH<MMIN", "MVORH", "col_lt", other="MMIN",
+                   description="Mischverhaeltnis [-]")])
+
+
+EINZEL_RULES = [
+    rule("MVORH<MMIN", "MVORH", "col_lt", other="MMIN",
+         description="Mischverhaeltnis [-]"),
+    rule("VVORH<VMIN", "VVORH", "col_lt", other="VMIN",
+         description="Mindestvolumen [m^3]"),
+    # entleerungszeit Te
+    rule("10<TE<=15", "TE", "between", low=10.0, high=15.0,
+         severity="orange", description="Entleerungszeit [h]"),
+    rule("TE>15", "TE", "mt", value=15.0, description="Entleerungszeit [h]"),
+    # Klärbedingung Durchlaufbecken qa < 10 m/h
+    rule("QA>10 DB", "QA", "mt", value=10.0, types=["DBN", "DBH"],
+         description="Oberflaechenbeschickung [m/h]"),
+    # Geschwindigkeit im Durchlaufbecken
+    rule("GESCHW>0.05 DB", "GESCHW", "mt", value=0.05, types=["DBN", "DBH"],
+         description="Horizontale Fliessgeschwindigkeit [m/s]"),
+    # Klärbedingung SKUE
+    rule("GESCHW>0.3 SKUE", "GESCHW", "mt", value=0.3, types=["SKUE"],
+         description="Fliessgeschwindigkeit [m/s]"),
+]
+
+
+def check(df, rules):
+    """check the rules against a dataframe, rules with missing columns are
+    skipped
+
+    Params
+    ------
+    df (pandas.DataFrame): parsed table
+    rules (list): list of rule objects
+
+    Returns
+    -------
+    flags (pandas.DataFrame): boolean flag matrix, one column per rule
+    """
+    flags = dict((r.name, r.evaluate(df)) for r in rules if r.applies(df))
+    return pd.DataFrame(flags, index=df.index, columns=list(flags))
+
+
+def severity(df, rules, flags=None):
+    """cell severity of a dataframe: 0 no violation, 1 orange, 2 red
+
+    Returns
+    -------
+    sev (pandas.DataFrame): integer matrix with the index and columns of df
+    """
+    if flags is None:
+        flags = check(df, rules)
+    sev = pd.DataFrame(0, index=df.index, columns=df.columns, dtype=np.int8)
+    for r in rules:
+        if r.name not in flags.columns:
+            continue
+        col = sev[r.column].to_numpy()
+        level = SEVERITY[r.severity]
+        sev[r.column] = np.where(flags[r.name].to_numpy() & (col < level),
+                                 level, col)
+    return sev
+
+
+def column_flags(df, column, rules, flags=None):
+    """boolean array, True where any rule on column is violated
+    """
+    if flags is None:
+        flags = check(df, rules)
+    names = [r.name for r in rules if r.column == column and
+             r.name in flags.columns]
+    return flags[names].to_numpy().any(axis=1)
+
+
+def colors(df, column, rules, flags=None, ok="tab:blue", bad="tab:red"):
+    """bar colors for plots: bad where a rule on column is violated
+    """
+    return np.where(column_flags(df, column, rules, flags), bad, ok).tolist()
+
+
+def limits(column, rules):
+    """lower and upper limit of a column from its lt/mt/outside rules
+
+    Returns
+    -------
+    low, high (float): limits, None if the column has no such limit
+    """
+    low = high = None
+    for r in rules:
+        if r.column != column:
+            continue
+        if r.kind == "lt":
+            low = r.value
+        elif r.kind == "mt":
+            high = r.value
+        elif r.kind == "outside":
+            low, high = r.low, r.high
+    return low, high
+
+
+def report(df, rules, flags=None):
+    """console report of the flagged rows per rule
+
+    Returns
+    -------
+    text (str): report, empty if no rule is violated
+    """
+    if flags is None:
+        flags = check(df, rules)
+    lines = []
+    for r in rules:
+        if r.name not in flags.columns:
+            continue
+        hit = flags[r.name].to_numpy()
+        if not hit.any():
+            continue
+        lines.append("{} ({}, {}): {}".format(
+            r.name, r.description, r.severity,
+            ", ".join(str(i) for i in df.index[hit])))
+    return "\n".join(lines)
@@ -0,0 +1,195 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+"""schema layer - unique column names of the query results computed once per
+query shape and Kosim schema version instead of once per parsed table
+
+The mapping from the raw column names of the cursor description to the
+unique names (BEZEICHNUNG, BEZEICHNUNG_1, ...) is cached by a key of the raw
+names. The first schema seen of every query is kept as reference, later
+schemas are compared against it and the differences are reported.
+"""
+
+# file of the persisted schemas in the cache directory
+SCHEMAFILE = "schemas.json"
+
+
+def unique_names(names):
+    """number duplicate column names, e.g. BEZEICHNUNG, BEZEICHNUNG_1,
+    BEZEICHNUNG_2
+    """
+    counts = {}
+    unique = []
+    for name in names:
+        n = counts.get(name, 0)
+        counts[name] = n + 1
+        unique.append(name if n == 0 else "{}_{}".format(name, n))
+    return unique
+
+
+def schema_key(names):
+    """key of a schema from its raw column names
+    """
+    return hashlib.sha1("\x1f".join(names).encode("utf-8")).hexdigest()[:16]
+
+
+def schema_path():
+    from pykosimcli.cache import default_cache_dir
+    return os.path.join(default_cache_dir(), SCHEMAFILE)
+
+
+class schemaregistry(object):
+    """
+    cache of the column name mappings per query and schema
+
+    Params
+    ------
+    path (str): json file the schemas are persisted in, "" for the default
+        file in the cache directory, None keeps them in memory only
+    """
+    def __init__(self, path=""):
+        self.path = path
+        # {query: OrderedDict(key: {"raw": [...], "names": [...]})}
+        self.schemas = None
+        # {(query, key, required): missing columns}
+        self.checked = {}
+
+    def _file(self):
+        """path of the schema file, the default path is resolved on first use
+        """
+        if self.path == "":
+            self.path = schema_path()
+        return self.path
+
+    def _load(self):
+        self.schemas = {}
+        if self._file() is None:
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for query, schemas in data.items():
+            self.schemas[query] = OrderedDict(schemas)
+
+    def persist(self, path):
+        """persist the schemas in path from now on, schemas registered
+        before are merged into the file
+
+        Params
+        ------
+        path (str): json file, e.g. in the directory of the result cache
+        """
+        if path == self.path:
+            return
+        known = self.schemas or {}
+        self.path = path
+        self._load()
+        for query, schemas in known.items():
+            target = self.schemas.setdefault(query, OrderedDict())
+            for key, schema in schemas.items():
+                target.setdefault(key, schema)
+        if known:
+            self._save()
+
+    def _save(self):
+        if self._file() is None:
+            return
+        tmp = "{}.{}.tmp".format(self.path, os.getpid())
+        try:
+            if not os.path.exists(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with open(tmp, "w") as f:
+                json.dump(self.schemas, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            # the schemas are still cached in memory
+            pass
+
+    def register(self, query, raw):
+        """cached unique names of a raw schema, new schemas are compared to
+        the reference schema of the query
+
+        Returns
+        -------
+        key (str), names (list): schema key and unique column names
+        """
+        if self.schemas is None:
+            self._load()
+        key = schema_key(raw)
+        known = self.schemas.setdefault(query, OrderedDict())
+        schema = known.get(key)
+        if schema is None:
+            names = unique_names(raw)
+            if known:
+                self.report_drift(query, next(iter(known.values()))["names"],
+                                  names)
+            schema = known[key] = {"raw": list(raw), "names": names}
+            self._save()
+        return key, schema["names"]
+
+    def report_drift(self, query, refNames, names):
+        """print the columns added and removed compared to the reference
+        schema of a query
+        """
+        ref = set(refNames)
+        new = set(names)
+        added = [n for n in names if n not in ref]
+        removed = [n for n in refNames if n not in new]
+        if not added and not removed:
+            print("Schema von {} geaendert: Spaltenreihenfolge".format(query))
+            return
+        print("Schema von {} geaendert: neue Spalten {}, fehlende Spalten "
+              "{}".format(query, ", ".join(added) or "-",
+                          ", ".join(removed) or "-"))
+
+    def names(self, query, raw, required=None, strict=False):
+        """unique column names of a query result
+
+        Params
+        ------
+        query (str): key of the query in KDBFselect
+        raw (list): column names of the cursor description
+        required (list): opt. columns the consumers need
+        strict (bool): raise a KeyError if a required column is missing
+            instead of printing it, missing columns are printed once per
+            schema
+
+        Returns
+        -------
+        names (list): unique column names
+        """
+        key, names = self.register(query, raw)
+        if required:
+            check = (query, key, tuple(required))
+            first = check not in self.checked
+            if first:
+                have = set(names)
+                self.checked[check] = [c for c in required if c not in have]
+            missing = self.checked[check]
+            if missing and strict:
+                raise KeyError("Columns {} missing in query {}".format(
+                    ", ".join(missing), query))
+            if missing and first:
+                print("Columns {} missing in query {}".format(
+                    ", ".join(missing), query))
+        return names
+
+    def clear(self):
+        """forget all schemas, the reference schemas included
+        """
+        self.schemas = {}
+        self.checked = {}
+        if self._file() is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# process wide registry, kept in memory and persisted in the cache directory
+# once a result cache is used (see parsedb.parse)
+SCHEMAS = schemaregistry(None)
@@ -0,0 +1,320 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import sqlite3
+
+from pykosimcli.kdbf import kdbf
+from pykosimcli.kdbf import KDBFselect
+from pykosimcli.kdbf import fetch_frame
+from pykosimcli.kdbf import FETCH_BATCH
+
+"""local result store - the KDBFselect tables of one or many kdbf files in a
+single embedded sqlite database, readable without a firebird client
+
+Every table of the store holds the rows of all exported simulations with an
+additional column "sim". BEZEICHNUNG, sim and the TYP* columns are indexed.
+"""
+
+# file ending of result stores, parse() reads files with this ending from
+# the store instead of opening them with kdbf
+STORE_SUFFIX = ".kstore"
+
+# table of the exported simulations and their source files
+SIMTABLE = "_sims"
+
+INDEX = "BEZEICHNUNG"
+
+
+def is_store(filePath):
+    return str(filePath).lower().endswith(STORE_SUFFIX)
+
+
+def quote(name):
+    """quote a table or column name for sqlite
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def sql_type(dtype):
+    """sqlite column type of a pandas dtype
+    """
+    if dtype.kind in "iub":
+        return "INTEGER"
+    if dtype.kind == "f":
+        return "REAL"
+    return "TEXT"
+
+
+def index_columns(columns):
+    """columns of a store table getting an index: BEZEICHNUNG and the type
+    columns, e.g. TYPMISCHWASSERBAUWERKASSTRING
+    """
+    return [c for c in columns if c == INDEX or c.upper().startswith("TYP")]
+
+
+def to_records(df):
+    """rows of a dataframe as tuples of python values, NaN as None
+    """
+    df = df.astype(object)
+    df = df.where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+
+class kstore(object):
+    """
+    result store class - context manager like kdbf, but returns the store
+    object instead of the connection
+
+    usage::
+
+        with kstore("modelle.kstore") as st:
+            st.write("sim1", parse("sim1.kdbf", full=True))
+            res = st.read("sim1")
+    """
+    def __init__(self, storePath):
+        self.storePath = os.path.abspath(storePath)
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.storePath, check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS {} (sim TEXT PRIMARY KEY, path TEXT, "
+            "size INTEGER, mtime INTEGER, exported REAL)".format(SIMTABLE))
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+
+    def tables(self):
+        """result tables in the store in KDBFselect order
+        """
+        cur = self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")
+        names = set(r[0] for r in cur.fetchall())
+        return [query for query in KDBFselect if query in names]
+
+    def columns(self, table):
+        """column names of a store table
+        """
+        cur = self.conn.execute("PRAGMA table_info({})".format(quote(table)))
+        return [r[1] for r in cur.fetchall()]
+
+    def sims(self):
+        """names of the simulations in the store in export order
+        """
+        cur = self.conn.execute(
+            "SELECT sim FROM {} ORDER BY exported".format(SIMTABLE))
+        return [r[0] for r in cur.fetchall()]
+
+    def is_current(self, simName, filePath):
+        """True if simName was exported from filePath and the file did not
+        change since
+        """
+        stat = os.stat(filePath)
+        cur = self.conn.execute(
+            "SELECT path, size, mtime FROM {} WHERE sim = ?".format(SIMTABLE),
+            (simName,))
+        row = cur.fetchone()
+        return row == (os.path.abspath(filePath), stat.st_size,
+                       stat.st_mtime_ns)
+
+    def _prepare_table(self, table, df):
+        """create the table or add columns missing in the store, e.g. for
+        models of a newer Kosim version
+        """
+        existing = self.columns(table)
+        if not existing:
+            cols = ["sim TEXT"] + ["{} {}".format(quote(c), sql_type(df[c].dtype))
+                                   for c in df.columns]
+            self.conn.execute("CREATE TABLE {} ({})".format(
+                quote(table), ", ".join(cols)))
+        else:
+            known = set(c.lower() for c in existing)
+            for c in df.columns:
+                if c.lower() not in known:
+                    self.conn.execute("ALTER TABLE {} ADD COLUMN {} {}".format(
+                        quote(table), quote(c), sql_type(df[c].dtype)))
+
+        self.conn.execute("CREATE INDEX IF NOT EXISTS {} ON {} (sim, {})".format(
+            quote("ix_{}_sim".format(table)), quote(table), quote(INDEX)))
+        for col in index_columns(df.columns):
+            self.conn.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+                quote("ix_{}_{}".format(table, col)), quote(table), quote(col)))
+
+    def write(self, simName, res, filePath=None):
+        """write the results of one simulation, rows of a previous export of
+        the same simulation are replaced
+
+        Params
+        ------
+        simName (str): name of the simulation
+        res (dict): parse() result dict
+        filePath (str): opt. path of the source kdbf file
+        """
+        size = mtime = None
+        if filePath is not None:
+            filePath = os.path.abspath(filePath)
+            stat = os.stat(filePath)
+            size, mtime = stat.st_size, stat.st_mtime_ns
+
+        with self.conn:
+            self.delete(simName)
+            for table, df in res.items():
+                df = df.reset_index()
+                if "sim" in df.columns:
+                    df = df.drop(columns="sim")
+                self._prepare_table(table, df)
+                sql = "INSERT INTO {} ({}) VALUES ({})".format(
+                    quote(table), ", ".join(quote(c) for c in
+                                            ["sim"] + list(df.columns)),
+                    ", ".join("?" * (len(df.columns) + 1)))
+                self.conn.executemany(sql, ((simName,) + row
+                                            for row in to_records(df)))
+            self.conn.execute(
+                "INSERT INTO {} VALUES (?, ?, ?, ?, ?)".format(SIMTABLE),
+                (simName, filePath, size, mtime, time.time()))
+
+    def delete(self, simName):
+        """remove a simulation from the store
+        """
+        for table in self.tables():
+            self.conn.execute("DELETE FROM {} WHERE sim = ?".format(
+                quote(table)), (simName,))
+        self.conn.execute("DELETE FROM {} WHERE sim = ?".format(SIMTABLE),
+                          (simName,))
+
+    def read_table(self, table, sim=None, columns=None, batchSize=FETCH_BATCH):
+        """read a store table
+
+        Params
+        ------
+        table (str): key of the query in KDBFselect
+        sim (str): opt. simulation, None reads the rows of all simulations
+        columns (list): opt. columns to read, None reads all columns
+        batchSize (int): number of rows fetched per batch
+
+        Returns
+        -------
+        df (pandas.DataFrame): table indexed by BEZEICHNUNG like the result
+            of parse(), with categorical column "sim" if sim is None
+        """
+        available = [c for c in self.columns(table) if c != "sim"]
+        if columns is not None:
+            known = set(available)
+            missing = [c for c in columns if c not in known]
+            if missing:
+                print("Columns {} not found in table {}".format(
+                    ", ".join(missing), table))
+            wanted = set(columns) | set([INDEX])
+            available = [c for c in available if c in wanted]
+
+        select = [quote(c) for c in available]
+        if sim is None:
+            select.append("sim")
+            sql = "SELECT {} FROM {} ORDER BY rowid".format(", ".join(select),
+                                                            quote(table))
+            df = fetch_frame(self.conn, sql, batchSize)
+        else:
+            sql = "SELECT {} FROM {} WHERE sim = ? ORDER BY rowid".format(
+                ", ".join(select), quote(table))
+            df = fetch_frame(self.conn, sql, batchSize, (sim,))
+
+        if sim is None and len(df):
+            df["sim"] = df["sim"].astype("category")
+        df[INDEX] = df[INDEX].astype(object)
+        return df.set_index(INDEX)
+
+    def read(self, sim=None, columns=None, batchSize=FETCH_BATCH):
+        """read the results of one or all simulations
+
+        Params
+        ------
+        sim (str): opt. simulation, None reads all simulations
+        columns (dict): opt. {table: [columns] or None} to read, default all
+            tables and columns
+        batchSize (int): number of rows fetched per batch
+
+        Returns
+        -------
+        res (dict): dictionary of results in pandas.dataframes format
+        """
+        if sim is not None and sim not in self.sims():
+            raise KeyError("Simulation {} not found in {}".format(
+                sim, self.storePath))
+        res = {}
+        for table in self.tables():
+            if columns is not None and table not in columns:
+                continue
+            res[table] = self.read_table(
+                table, sim, None if columns is None else columns[table],
+                batchSize)
+        return res
+
+
+def read_store(storePath, sim=None, columns=None, batchSize=FETCH_BATCH):
+    """read parse() results from a store, used by parsedb.parse
+
+    A store holding only one simulation is read as this simulation.
+    """
+    if not os.path.exists(storePath):
+        raise IOError("Store {} not found".format(storePath))
+    with kstore(storePath) as st:
+        sims = st.sims()
+        if sim is None and len(sims) == 1:
+            sim = sims[0]
+        return st.read(sim, columns, batchSize)
+
+
+def export_store(dbs, storePath, workers=None, cache=None, force=False,
+                 engine=kdbf):
+    """export kdbf files into a store
+
+    The databases are parsed with all columns in a process pool, the results
+    are written by the main process as soon as they arrive. Databases that
+    did not change since their last export are skipped. The simulations are
+    named by parsedb.sim_names.
+
+    Params
+    ------
+    dbs (list): paths of the kdbf files
+    storePath (str): path of the store, created if it does not exist
+    workers (int): number of worker processes, defaults to the cpu count
+    cache (kdbfcache): opt. result cache
+    force (bool): export unchanged databases again
+    engine (class): database context manager class, defaults to kdbf
+
+    Returns
+    -------
+    sims (list): names of the exported simulations
+    """
+    from functools import partial
+    from concurrent.futures import ProcessPoolExecutor
+    from pykosimcli.parsedb import _parse_sim, sim_names
+
+    exported = []
+    with kstore(storePath) as st:
+        todo = [(db, name) for db, name in zip(dbs, sim_names(dbs))
+                if force or not st.is_current(name, db)]
+        if not todo:
+            print("Store {} ist aktuell".format(storePath))
+            return exported
+
+        dbs, names = zip(*todo)
+        workerCache = cache.worker() if cache is not None else None
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for db, (simName, simRes) in zip(dbs, pool.map(
+                    partial(_parse_sim, cache=workerCache, full=True,
+                            engine=engine), dbs, names)):
+                if simRes is None:
+                    continue
+                st.write(simName, simRes, db)
+                exported.append(simName)
+                print("{} exportiert nach {}".format(simName, storePath))
+    if cache is not None:
+        cache.evict(rescan=True)
+    return exported
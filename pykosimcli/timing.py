@@ -0,0 +1,230 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import json
+import threading
+from collections import OrderedDict
+
+"""per stage timing instrumentation - pipeline stages are wrapped in
+stage(name) blocks, which record wall time, cpu time, fetched rows and peak
+memory while a profiler is active and do nothing otherwise
+
+usage::
+
+    with stage("query") as st:
+        ...
+        st.add_rows(n)
+
+    with profiler() as prof:
+        parse(fIn)
+    print(prof.summary())
+"""
+
+# active profiler, None if profiling is off
+PROFILER = None
+
+
+class nullstage(object):
+    """
+    stage returned while profiling is off, a shared no-op context manager
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+    def add_rows(self, n):
+        pass
+
+
+NULLSTAGE = nullstage()
+
+
+def stage(name):
+    """context manager timing the stage name with the active profiler
+
+    Params
+    ------
+    name (str): stage name, records of stages with the same name are summed
+    """
+    if PROFILER is None:
+        return NULLSTAGE
+    return PROFILER.stage(name)
+
+
+class stagerecord(object):
+    """
+    accumulated measurements of one stage
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rows = 0
+        self.peak = None
+
+    def to_dict(self):
+        return {"stage": self.name, "calls": self.calls, "wall": self.wall,
+                "cpu": self.cpu, "rows": self.rows,
+                "peak_mb": None if self.peak is None else self.peak / 1024 ** 2}
+
+
+class timedstage(object):
+    """
+    a running stage of a profiler
+    """
+    def __init__(self, prof, name):
+        self.prof = prof
+        self.name = name
+        self.rows = 0
+        self.childPeak = 0
+
+    def add_rows(self, n):
+        self.rows += n
+
+    def reset_peak(self):
+        """reset the tracemalloc peak. Python < 3.9 has no reset_peak, the
+        tracing is started again instead: the peak so far is handed to the
+        parent stage and the current size is kept as offset of the traced
+        sizes.
+        """
+        import tracemalloc
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+            return
+        current, peak = self.prof.traced()
+        if self.parent is not None:
+            self.parent.childPeak = max(self.parent.childPeak, peak)
+        frames = tracemalloc.get_traceback_limit()
+        tracemalloc.stop()
+        tracemalloc.start(frames)
+        self.prof.memOffset = current
+
+    def __enter__(self):
+        stack = self.prof._stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        if self.prof.memory:
+            self.reset_peak()
+            self.memStart = self.prof.traced()[0]
+        self.cpuStart = time.thread_time()
+        self.wallStart = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        wall = time.perf_counter() - self.wallStart
+        cpu = time.thread_time() - self.cpuStart
+        peak = None
+        if self.prof.memory:
+            # the peak was reset by nested stages, they report theirs back
+            peak = max(self.prof.traced()[1], self.childPeak)
+            if self.parent is not None:
+                self.parent.childPeak = max(self.parent.childPeak, peak)
+            peak -= self.memStart
+        self.prof._stack().pop()
+        self.prof.record(self.name, wall, cpu, self.rows, peak)
+        return False
+
+
+class profiler(object):
+    """
+    collects the stage records while it is active
+
+    Params
+    ------
+    memory (bool): trace peak memory with tracemalloc, slows down the run
+    """
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = None
+        self.total = None
+        # traced size before the last restart of tracemalloc (python < 3.9)
+        self.memOffset = 0
+
+    def _stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def stage(self, name):
+        return timedstage(self, name)
+
+    def traced(self):
+        """current and peak traced memory in bytes since the start
+        """
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        return current + self.memOffset, peak + self.memOffset
+
+    def record(self, name, wall, cpu, rows=0, peak=None):
+        """add the measurements of one stage run
+        """
+        with self.lock:
+            rec = self.records.get(name)
+            if rec is None:
+                rec = self.records[name] = stagerecord(name)
+            rec.calls += 1
+            rec.wall += wall
+            rec.cpu += cpu
+            rec.rows += rows
+            if peak is not None:
+                rec.peak = max(rec.peak or 0, peak)
+
+    def start(self):
+        global PROFILER
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        self.started = time.perf_counter()
+        PROFILER = self
+        return self
+
+    def stop(self):
+        global PROFILER
+        PROFILER = None
+        self.total = time.perf_counter() - self.started
+        if self.memory:
+            import tracemalloc
+            tracemalloc.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.stop()
+        return False
+
+    def to_dict(self):
+        return {"total": self.total,
+                "stages": [rec.to_dict() for rec in self.records.values()]}
+
+    def save_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def summary(self):
+        """text table of the stages, nested stages are included in the times
+        of their enclosing stages
+
+        Returns
+        -------
+        text (str): summary table
+        """
+        lines = ["{:<28} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+            "Stage", "Calls", "Wall [s]", "CPU [s]", "Rows", "Peak [MB]")]
+        for rec in self.records.values():
+            lines.append("{:<28} {:>6d} {:>10.3f} {:>10.3f} {:>10d} {:>10}".format(
+                rec.name, rec.calls, rec.wall, rec.cpu, rec.rows,
+                "-" if rec.peak is None else "{:.1f}".format(
+                    rec.peak / 1024 ** 2)))
+        if self.total is not None:
+            lines.append("{:<28} {:>6} {:>10.3f}".format("Gesamt", "",
+                                                         self.total))
+        return "\n".join(lines)
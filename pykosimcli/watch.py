@@ -0,0 +1,171 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from collections import OrderedDict
+
+import pykosimcli.parsedb as pk
+from pykosimcli.kdbf import kdbf
+from pykosimcli.kdbf import KDBFselect
+from pykosimcli.kdbf import table_signature
+from pykosimcli.projection import required_columns
+
+"""watch mode - re-parse a kdbf file incrementally after it was rewritten by
+a Kosim run and regenerate only the outputs depending on changed tables
+"""
+
+
+def file_state(filePath):
+    """(size, mtime) of a file, None if it does not exist
+    """
+    try:
+        stat = os.stat(filePath)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def wait_for_change(filePath, state, interval=1.0, settle=1.0):
+    """poll a file until its state differs from state and has not changed
+    for settle seconds, i.e. Kosim finished writing
+
+    Returns
+    -------
+    state (tuple): new (size, mtime) of the file
+    """
+    while True:
+        time.sleep(interval)
+        new = file_state(filePath)
+        if new is None or new == state:
+            continue
+        # wait until the file is no longer written
+        while True:
+            time.sleep(settle)
+            stable = file_state(filePath)
+            if stable == new:
+                return new
+            new = stable
+
+
+class kdbfwatcher(object):
+    """
+    keeps the parsed results of a kdbf file and updates them incrementally
+
+    Only queries whose change signature (row count, column sums and text
+    lengths computed in the database) differs from the last run are fetched
+    again. If the file changed but none of the signatures did, all queries
+    are fetched again. Outputs are only regenerated if one of the tables
+    they depend on changed.
+
+    Params
+    ------
+    fIn (str): path to the kdbf file
+    xcel (str): opt. path of the plausibility workbook
+    render (str): opt. output directory of the rendered plots
+    fmt (str): image format of the rendered plots
+    check (bool): print the plausibility report
+    engine (class): database context manager class, defaults to kdbf
+    """
+    def __init__(self, fIn, xcel=None, render=None, fmt="png", check=False,
+                 engine=kdbf):
+        self.fIn = os.path.abspath(fIn)
+        self.engine = engine
+        self.xcel = xcel
+        self.render = render
+        self.fmt = fmt
+        self.check = check
+        self.columns = required_columns()
+        self.res = {}
+        self.signatures = {}
+        # file state of the last update
+        self.state = None
+        self.sheets = OrderedDict()
+
+    def update(self):
+        """re-run the queries whose tables changed
+
+        Returns
+        -------
+        changed (set): keys of the changed tables
+        """
+        changed = set()
+        state = file_state(self.fIn)
+        with self.engine(self.fIn) as conn:
+            sigs = {}
+            for query in KDBFselect:
+                if query not in self.columns:
+                    continue
+                try:
+                    sigs[query] = table_signature(conn, query,
+                                                  self.columns[query])
+                except Exception as err:
+                    print("Query {} failed: {}".format(query, err))
+            stale = [query for query in sigs
+                     if sigs[query] != self.signatures.get(query) or
+                     query not in self.res]
+            if not stale and state != self.state:
+                # the file was rewritten, but the changes cancel out in the
+                # signatures, e.g. swapped values
+                print("Aenderungen nicht an den Signaturen erkennbar, alle "
+                      "Tabellen werden neu gelesen")
+                stale = list(sigs)
+            for query in stale:
+                self.res[query] = pk.query_table(conn, query,
+                                                 self.columns[query])
+                self.signatures[query] = sigs[query]
+                changed.add(query)
+        self.state = state
+        return changed
+
+    def regenerate(self, changed):
+        """regenerate the outputs depending on the changed tables
+        """
+        if self.xcel is not None:
+            for name, tables in pk.PLAUS_SHEETS.items():
+                if name not in self.sheets or changed.intersection(tables):
+                    self.sheets[name] = pk.build_plaus_sheet(self.res, name)
+            pk.write_plaus_workbook(self.sheets, self.xcel)
+
+        if self.render is not None:
+            plots = [name for name, tables in pk.PLOT_TABLES.items()
+                     if changed.intersection(tables)]
+            if plots:
+                pk.render_plots(self.res, self.render, self.fmt,
+                                pk.get_filename(self.fIn), plots)
+
+        if self.check and "mischwasserbauwerke" in changed:
+            print(pk.plaus_report(self.res))
+
+    def refresh(self):
+        """update the results and outputs once
+
+        Returns
+        -------
+        changed (set): keys of the changed tables
+        """
+        start = time.time()
+        changed = self.update()
+        if changed:
+            self.regenerate(changed)
+        print("{} aktualisiert in {:.2f} s, geaenderte Tabellen: {}".format(
+            os.path.basename(self.fIn), time.time() - start,
+            ", ".join(sorted(changed)) or "keine"))
+        return changed
+
+    def run(self, interval=1.0, settle=1.0):
+        """refresh once and then after every rewrite of the file until
+        interrupted
+        """
+        state = file_state(self.fIn)
+        self.refresh()
+        print("Warte auf Aenderungen an {} (Strg+C beendet)".format(self.fIn))
+        try:
+            while True:
+                state = wait_for_change(self.fIn, state, interval, settle)
+                try:
+                    self.refresh()
+                except Exception as err:
+                    print("Aktualisierung fehlgeschlagen: {}".format(err))
+        except KeyboardInterrupt:
+            pass
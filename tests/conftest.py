@@ -0,0 +1,31 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from pykosimcli.bench import make_model, make_klzc
+
+"""shared fixtures - synthetic stand-in models (sqlite files with the kdbf
+schema, see bench.standin) and klzc files in temporary directories
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """keep caches, catalogs and schema files out of the home directory
+    """
+    path = tmp_path / "cache"
+    monkeypatch.setenv("PYKOSIMCLI_CACHE", str(path))
+    return path
+
+
+@pytest.fixture
+def model(tmp_path):
+    return str(make_model(str(tmp_path / "model.kdbf"), nBauwerke=30,
+                          seed=1))
+
+
+@pytest.fixture
+def klzc_file(tmp_path):
+    return str(make_klzc(str(tmp_path / "sim.klzc"), nBlocks=4, nRows=300,
+                         seed=2))
@@ -0,0 +1,70 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pandas as pd
+
+from pykosimcli.bench import standin
+from pykosimcli.cache import kdbfcache, META
+from pykosimcli.parsedb import parse
+
+"""result cache round trip on the stand-in model
+"""
+
+
+class offline(standin):
+    """engine failing on connect, parses only succeed from the cache
+    """
+    def __enter__(self):
+        raise AssertionError("database opened despite cache entry")
+
+
+def assert_res_equal(a, b):
+    assert list(a) == list(b)
+    for key in a:
+        pd.testing.assert_frame_equal(a[key], b[key])
+
+
+def test_cache_round_trip(model, tmp_path):
+    cache = kdbfcache(str(tmp_path / "c"))
+    for project in (False, True):
+        res = parse(model, cache=cache, engine=standin, project=project)
+        assert_res_equal(res, parse(model, cache=cache, engine=offline,
+                                    project=project))
+    # one entry per column variant
+    assert len(cache.entries()) == 2
+
+
+def test_cache_changed_file(model, tmp_path):
+    cache = kdbfcache(str(tmp_path / "c"))
+    res = parse(model, cache=cache, engine=standin)
+    stat = os.stat(model)
+    os.utime(model, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert_res_equal(res, parse(model, cache=cache, engine=standin))
+    assert len(cache.entries()) == 2
+
+
+def test_cache_unreadable_entry(model, tmp_path, capsys):
+    cache = kdbfcache(str(tmp_path / "c"))
+    res = parse(model, cache=cache, engine=standin)
+    (atime, size, entry), = cache.entries()
+    for name in os.listdir(entry):
+        if name != META:
+            with open(os.path.join(entry, name), "wb") as f:
+                f.write(b"kaputt")
+    # the entry is dropped and the model parsed and stored again
+    assert_res_equal(res, parse(model, cache=cache, engine=standin))
+    assert "unreadable" in capsys.readouterr().out
+    assert len(cache.entries()) == 1
+    assert_res_equal(res, parse(model, cache=cache, engine=offline))
+
+
+def test_cache_eviction(model, tmp_path):
+    cache = kdbfcache(str(tmp_path / "c"))
+    parse(model, cache=cache, engine=standin)
+    parse(model, cache=cache, engine=standin, project=True)
+    assert len(cache.entries()) == 2
+    cache.maxSize = 1
+    cache.evict()
+    assert cache.entries() == []
@@ -0,0 +1,68 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from pykosimcli.bench import standin
+from pykosimcli.catalog import modelcatalog, parse_condition
+from pykosimcli.parsedb import parse, build_plaus_sheet
+
+"""model catalog on the stand-in model
+"""
+
+
+@pytest.fixture
+def catalog(model, tmp_path):
+    with modelcatalog(str(tmp_path / "c.kcat")) as cat:
+        assert cat.update([model], workers=1, engine=standin) != []
+        yield cat
+
+
+def test_counts_match_workbook(model, catalog):
+    short, sev = build_plaus_sheet(parse(model, engine=standin, project=True),
+                                   "MW-Bauwerke")
+    worst = sev.to_numpy().max(axis=1)
+    summary = catalog.query(models=True).iloc[0]
+    assert summary["n_mwb"] == len(short)
+    assert summary["n_orange"] == (worst == 1).sum()
+    assert summary["n_red"] == (worst == 2).sum()
+    assert summary["n_orange"] + summary["n_red"] > 0
+
+
+def test_unchanged_models_skipped(model, catalog):
+    assert catalog.update([model], workers=1, engine=standin) == []
+
+
+def test_query(catalog):
+    df = catalog.query(["E0>30"], by="e0", ascending=True)
+    assert len(df) > 0
+    assert (df["E0"] > 30).all()
+    assert df["E0"].is_monotonic_increasing
+    assert len(catalog.query(top=3)) == 3
+
+
+def test_query_unknown_column(catalog):
+    with pytest.raises(ValueError):
+        catalog.query(by='E0" DESC; DROP TABLE models; --')
+    # the table is still there
+    assert len(catalog.query(models=True)) == 1
+
+
+def test_query_misspelled_condition(catalog):
+    with pytest.raises(ValueError):
+        catalog.query(["EO>40"])
+    # the Bauwerk indicators are not columns of the model summaries
+    with pytest.raises(ValueError):
+        catalog.query(["E0>40"], models=True)
+    assert len(catalog.query(["e0_max>0"], models=True)) == 1
+
+
+def test_parse_condition():
+    assert parse_condition("E0>40") == ('"E0" > ?', [40.0])
+    assert parse_condition("na198!3:9") == ('("NA198" < ? OR "NA198" > ?)',
+                                            [3.0, 9.0])
+    with pytest.raises(ValueError):
+        parse_condition("E0>40; DROP TABLE models")
+    assert parse_condition("e0>40", ["sim", "E0"]) == ('"E0" > ?', [40.0])
+    with pytest.raises(ValueError):
+        parse_condition("EO>40", ["sim", "E0"])
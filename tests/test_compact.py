@@ -0,0 +1,75 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pykosimcli.bench import standin
+from pykosimcli.compact import (compact, compact_frame, downcast_float,
+                                duplicate_columns)
+from pykosimcli.parsedb import parse
+from pykosimcli.projection import required_columns
+
+"""memory compaction: lossless downcasts and duplicated join columns
+"""
+
+
+def test_downcast_float():
+    exact = np.array([0.5, 1.25, np.nan, -3.0, 1e6])
+    assert downcast_float(exact).dtype == np.float32
+    inexact = np.array([0.1, 1.0])
+    assert downcast_float(inexact) is None
+    small = downcast_float(inexact, floatTol=1e-6)
+    np.testing.assert_allclose(small, inexact, rtol=1e-6)
+    # values out of the float32 range are never downcast
+    assert downcast_float(np.array([1e300]), floatTol=1e-6) is None
+
+
+@pytest.mark.parametrize("dtype", [object, "str"])
+def test_compact_frame(dtype):
+    df = pd.DataFrame({"TYP": pd.Series(["FBN", "DBH", "FBN", "FBN"],
+                                        dtype=dtype),
+                       "NAME": pd.Series(["a", "b", "c", "d"], dtype=dtype),
+                       "N": np.array([1, 2, 3, 4], dtype=np.int64),
+                       "Q": [0.5, 1.5, np.nan, 2.0],
+                       "E0": [0.1, 0.2, 0.3, 0.4]},
+                      index=pd.Index(["A", "B", "C", "D"], name="BEZEICHNUNG"))
+    out = compact_frame(df, drop=["NAME"])
+    assert list(out.columns) == ["TYP", "N", "Q", "E0"]
+    assert isinstance(out["TYP"].dtype, pd.CategoricalDtype)
+    assert out["N"].dtype == np.int8
+    assert out["Q"].dtype == np.float32
+    # not exactly representable as float32
+    assert out["E0"].dtype == np.float64
+    pd.testing.assert_frame_equal(out, df.drop(columns="NAME"),
+                                  check_dtype=False, check_categorical=False,
+                                  check_index_type=False)
+
+
+def test_duplicate_columns():
+    df = pd.DataFrame({"ID": [1, 2], "ID_1": [1, 2], "ID_2": [1, 3],
+                       "BEZEICHNUNG_1": ["A", "B"], "X_1": [1.0, np.nan],
+                       "X": [1.0, np.nan]},
+                      index=pd.Index(["A", "B"], name="BEZEICHNUNG"))
+    assert duplicate_columns(df) == ["ID_1", "BEZEICHNUNG_1", "X_1"]
+    assert duplicate_columns(df, keep=["BEZEICHNUNG_1"]) == ["ID_1", "X_1"]
+
+
+def test_compact_results(model):
+    res = parse(model, engine=standin)
+    out = compact(res, report=False)
+    declared = required_columns()
+    assert list(out) == list(res)
+    assert "BEZEICHNUNG_1" in out["mischwasserbauwerke"].columns
+    for key, df in res.items():
+        # the declared columns of the consumers are kept
+        dropped = set(df.columns) - set(out[key].columns)
+        if key in declared and declared[key] is None:
+            assert not dropped
+        else:
+            assert dropped == set(duplicate_columns(df)) - \
+                set(declared.get(key) or [])
+        pd.testing.assert_frame_equal(out[key], df[out[key].columns],
+                                      check_dtype=False,
+                                      check_categorical=False)
@@ -0,0 +1,86 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+import pandas as pd
+import pytest
+
+from pykosimcli.bench import standin
+from pykosimcli.cli import parse_cli
+from pykosimcli.daemon import kdbfdaemon, is_running, request, run_remote
+from pykosimcli.parsedb import parse, plaus_report
+
+"""analysis daemon: requests against stand-in models
+"""
+
+
+@pytest.fixture
+def socket_path():
+    # unix socket paths are limited to about 100 characters
+    tmp = tempfile.mkdtemp(prefix="pkd")
+    yield os.path.join(tmp, "d.sock")
+    shutil.rmtree(tmp)
+
+
+def test_handle(model):
+    daemon = kdbfdaemon("unused.sock", engine=standin)
+    assert daemon.handle({"cmd": "ping"}) == "pong"
+    res = daemon.handle({"cmd": "parse", "fIn": model})
+    ref = parse(model, engine=standin, project=True)
+    assert sorted(res) == sorted(ref)
+    for key in ref:
+        pd.testing.assert_frame_equal(res[key], ref[key])
+    # kept in memory until the file changes
+    assert daemon.handle({"cmd": "parse", "fIn": model}) is res
+    assert daemon.handle({"cmd": "report", "fIn": model}) == \
+        plaus_report(ref)
+
+    conn = sqlite3.connect(model)
+    conn.execute("UPDATE MISCHWASSERBAUWERKPROZESSMJW SET E0 = 99.0")
+    conn.commit()
+    conn.close()
+    again = daemon.handle({"cmd": "parse", "fIn": model})
+    assert (again["mischwasserbauwerke"]["E0"] == 99.0).all()
+    assert daemon.handle({"cmd": "stats"})["models"] == [model]
+    with pytest.raises(ValueError):
+        daemon.handle({"cmd": "unknown", "fIn": model})
+
+
+@pytest.fixture
+def running(socket_path):
+    daemon = kdbfdaemon(socket_path, engine=standin)
+    thread = threading.Thread(target=daemon.serve)
+    thread.start()
+    for i in range(100):
+        if is_running(socket_path):
+            break
+        thread.join(0.05)
+    yield socket_path
+    request("stop", socket_path)
+    thread.join(10)
+    assert not thread.is_alive()
+    assert not os.path.exists(socket_path)
+
+
+def test_socket_round_trip(model, running, tmp_path):
+    res = request("parse", running, fIn=model)
+    assert "mischwasserbauwerke" in res
+    xcel = str(tmp_path / "plaus.xlsx")
+    assert request("excel", running, fIn=model, excelPath=xcel) == xcel
+    assert os.path.exists(xcel)
+    with pytest.raises(RuntimeError):
+        request("parse", running, fIn=str(tmp_path / "missing.kdbf"))
+
+
+@pytest.mark.parametrize("option", [["--compact"], ["--cache"],
+                                    ["--query-workers", "2"],
+                                    ["--sequential"]])
+def test_parse_options_run_locally(model, running, option, capsys):
+    assert run_remote(parse_cli([model, "--check"]), running)
+    assert "Daemon Antwort" in capsys.readouterr().out
+    assert not run_remote(parse_cli([model, "--check"] + option), running)
@@ -0,0 +1,85 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+import pytest
+
+from pykosimcli.bench import standin
+from pykosimcli.diff import diff_models
+
+"""model diff on two versions of the stand-in model
+"""
+
+
+@pytest.fixture
+def revised(model, tmp_path):
+    path = str(tmp_path / "neu.kdbf")
+    shutil.copy(model, path)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE MISCHWASSERBAUWERKPROZESSMJW SET E0 = E0 * 1.5 "
+                 "WHERE ID = 2")
+    conn.execute("UPDATE MISCHWASSERBAUWERKPROZESSMJW SET E0 = E0 * 1.1 "
+                 "WHERE ID = 3")
+    conn.execute("UPDATE MISCHWASSERBAUWERKBESTAND SET "
+                 "TYPMISCHWASSERBAUWERKASSTRING = 'XX' WHERE ID = 4")
+    conn.execute("DELETE FROM GEBIETBESTAND WHERE ID = 0")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_identical_models(model):
+    assert len(diff_models([model, model], engine=standin)) == 0
+
+
+def test_changes(model, revised):
+    report = diff_models([model, revised], engine=standin)
+    assert (report["sim"] == "neu").all()
+
+    removed = report[report["change"] == "entfernt"]
+    assert removed[["table", "BEZEICHNUNG"]].values.tolist() == [
+        ["gebiete", "GEB_00000"]]
+
+    changed = report[(report["table"] == "mischwasserbauwerke") &
+                     (report["change"] == "geaendert")]
+    # duplicated join columns like BEZEICHNUNG_1 are not reported
+    assert changed[["BEZEICHNUNG", "column"]].values.tolist() == [
+        ["MIS_00002", "E0"], ["MIS_00003", "E0"],
+        ["MIS_00004", "TYPMISCHWASSERBAUWERKASSTRING"]]
+    np.testing.assert_allclose(changed["rel"].iloc[:2].astype(float),
+                               [0.5, 0.1])
+    assert changed["new"].iloc[2] == "XX"
+
+
+def test_tolerance(model, revised):
+    report = diff_models([model, revised], rtol=0.2, engine=standin)
+    assert report[report["column"] == "E0"]["BEZEICHNUNG"].tolist() == [
+        "MIS_00002"]
+
+
+def test_single_model(model):
+    with pytest.raises(ValueError):
+        diff_models([model], engine=standin)
+
+
+def test_equal_file_names(model, tmp_path):
+    for folder in ("v1", "v2"):
+        os.makedirs(str(tmp_path / folder))
+        shutil.copy(model, str(tmp_path / folder / "model.kdbf"))
+    report = diff_models([model, str(tmp_path / "v1" / "model.kdbf"),
+                          str(tmp_path / "v2" / "model.kdbf")],
+                         engine=standin)
+    assert len(report) == 0
+
+    conn = sqlite3.connect(str(tmp_path / "v2" / "model.kdbf"))
+    conn.execute("UPDATE MISCHWASSERBAUWERKPROZESSMJW SET E0 = 0")
+    conn.commit()
+    conn.close()
+    report = diff_models([model, str(tmp_path / "v1" / "model.kdbf"),
+                          str(tmp_path / "v2" / "model.kdbf")],
+                         engine=standin)
+    assert set(report["sim"]) == {"v2/model"}
@@ -0,0 +1,62 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pykosimcli.kdbf import fetch_frame
+
+"""dtype rules of the typed fetch engine on untyped sqlite columns
+"""
+
+ROWS = [(1, 1.5, "a", None, 1),
+        (2, None, None, None, 2.5),
+        (3, 3.5, "b", None, None),
+        (4, 4.0, "a", None, 4)]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (i, f, s, n, m)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?, ?, ?)", ROWS)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("batchSize", [1, 2, 100])
+def test_fetch_frame_dtypes(conn, batchSize):
+    df = fetch_frame(conn, "SELECT * FROM t", batchSize)
+    assert list(df.columns) == ["i", "f", "s", "n", "m"]
+    assert df["i"].dtype == np.int64
+    assert df["f"].dtype == np.float64
+    assert isinstance(df["s"].dtype, pd.CategoricalDtype)
+    assert df["s"].isna().tolist() == [False, True, False, False]
+    assert list(df["s"].cat.categories) == ["a", "b"]
+    # only NULL values
+    assert df["n"].dtype == np.float64
+    assert df["n"].isna().all()
+    # ints followed by floats and NULL are not truncated
+    assert df["m"].dtype == np.float64
+    np.testing.assert_array_equal(df["m"].to_numpy(), [1.0, 2.5, np.nan, 4.0])
+
+
+def test_fetch_frame_rename(conn):
+    df = fetch_frame(conn, "SELECT i, i FROM t",
+                     rename=lambda names: ["i", "i_1"])
+    assert list(df.columns) == ["i", "i_1"]
+    assert df["i_1"].tolist() == [1, 2, 3, 4]
+
+
+def test_fetch_frame_params(conn):
+    df = fetch_frame(conn, "SELECT i FROM t WHERE s = ?", params=("a",))
+    assert df["i"].tolist() == [1, 4]
+
+
+def test_fetch_frame_empty(conn):
+    df = fetch_frame(conn, "SELECT * FROM t WHERE 1 = 0")
+    assert list(df.columns) == ["i", "f", "s", "n", "m"]
+    assert len(df) == 0
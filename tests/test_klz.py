@@ -0,0 +1,60 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+from pykosimcli.klz import klzc
+
+"""klzc reader: block index sidecar file and block lookup
+"""
+
+
+def test_index_saved_and_loaded(klzc_file):
+    with klzc(klzc_file) as f:
+        blocks = f.build_index()
+    assert os.path.exists(klzc_file + ".idx")
+    with klzc(klzc_file) as f:
+        assert f.load_index() == blocks
+        assert f.index() == blocks
+        assert f.block_names() == [b[0] for b in blocks]
+
+
+def test_stale_index_rebuilt(klzc_file):
+    with klzc(klzc_file) as f:
+        names = f.block_names()
+    with open(klzc_file, "a") as fOut:
+        fOut.write("HEADER_MWB_99999,QZU,QUE,CUE\n0,1.0,2.0,3.0\n")
+
+    with klzc(klzc_file) as f:
+        assert f.load_index() is None
+        assert f.block_names() == names + ["HEADER_MWB_99999"]
+        assert f.load_block("HEADER_MWB_99999")["QUE"].tolist() == [2.0]
+    # the rebuilt index is saved again
+    with open(klzc_file + ".idx") as fIn:
+        idx = json.load(fIn)
+    assert idx["size"] == os.path.getsize(klzc_file)
+    assert idx["blocks"][-1][0] == "HEADER_MWB_99999"
+
+
+def test_block_lookup_matches_scan(klzc_file):
+    with klzc(klzc_file) as f:
+        frames = list(f)
+        assert len(frames) == len(f.block_names())
+        for name, df in zip(f.block_names(), frames):
+            assert df.columns[0] == name
+            assert f.load_block(name).equals(df)
+
+
+def test_parallel_keeps_block_order(klzc_file):
+    with klzc(klzc_file) as f:
+        names = f.block_names()
+        serial = f.load_parallel(workers=1)
+        frames = f.load_parallel(workers=2)
+        # a subset comes back in file order, not in the order asked for
+        subset = f.load_parallel(names=names[::-1][:2], workers=2,
+                                 asDict=True)
+    assert [df.columns[0] for df in frames] == names
+    for a, b in zip(frames, serial):
+        assert a.equals(b)
+    assert list(subset) == [n for n in names if n in names[-2:]]
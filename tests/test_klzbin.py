@@ -0,0 +1,89 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+
+from pykosimcli.klz import klzc
+from pykosimcli.klzbin import convert_klzc, klzbin, is_current, bin_path
+
+"""klzb store round trip against the klzc reader
+"""
+
+
+def test_round_trip(klzc_file):
+    binPath = convert_klzc(klzc_file)
+    assert binPath == bin_path(klzc_file)
+    with klzc(klzc_file) as src, klzbin(binPath) as f:
+        assert f.block_names() == src.block_names()
+        for name in src.block_names():
+            df = src.load_block(name)
+            cols = f.block(name)
+            assert list(cols) == list(df.columns)
+            for col in df.columns:
+                assert cols[col].dtype == df[col].dtype
+                np.testing.assert_array_equal(cols[col], df[col].to_numpy())
+
+
+def test_float32(klzc_file):
+    binPath = convert_klzc(klzc_file, floatType="float32")
+    assert is_current(klzc_file, binPath, "float32")
+    assert not is_current(klzc_file, binPath, "float64")
+    with klzc(klzc_file) as src, klzbin(binPath) as f:
+        name = src.block_names()[0]
+        qzu = f.column(name, "QZU")
+        assert qzu.dtype == np.float32
+        np.testing.assert_allclose(qzu, src.load_block(name)["QZU"],
+                                   rtol=1e-6)
+
+    # a store with another float type is converted again
+    mtime = os.stat(binPath).st_mtime_ns
+    convert_klzc(klzc_file)
+    assert is_current(klzc_file, binPath, "float64")
+    assert os.stat(binPath).st_mtime_ns != mtime
+
+
+def test_changed_source(klzc_file):
+    binPath = convert_klzc(klzc_file)
+    with open(klzc_file, "a") as f:
+        f.write("HEADER_MWB_99999,QZU,QUE,CUE\n0,1.0,0.0,0.0\n")
+    assert not is_current(klzc_file, binPath)
+    convert_klzc(klzc_file)
+    with klzbin(binPath) as f:
+        assert f.block_names()[-1] == "HEADER_MWB_99999"
+        assert f.rows("HEADER_MWB_99999") == 1
+
+
+def test_dates_and_text(tmp_path):
+    path = str(tmp_path / "d.klzc")
+    with open(path, "w", encoding="latin1") as f:
+        f.write("HEADER_A,QZU,QUE,NOTE\n"
+                "01.01.2000 00:00,1.5,0,\xe4\n"
+                "01.01.2000 00:05,50,10,\n"
+                "02.01.2000 00:10,60,20,x\n")
+    with klzbin(convert_klzc(path)) as f:
+        cols = f.block("HEADER_A")
+    assert cols["HEADER_A"].dtype.kind == "M"
+    assert str(cols["HEADER_A"][2].astype("datetime64[m]")) == \
+        "2000-01-02T00:10"
+    assert cols["NOTE"].tolist() == ["\xe4", None, "x"]
+
+
+def test_duplicate_block_names(tmp_path, capsys):
+    path = str(tmp_path / "dup.klzc")
+    with open(path, "w") as f:
+        f.write("HEADER_A,QZU\n0,1.0\n1,2.0\n"
+                "HEADER_B,QZU\n0,3.0\n"
+                "HEADER_A,QZU\n0,9.0\n")
+    with klzc(path) as src:
+        first = src.load_block("HEADER_A")["QZU"].tolist()
+    assert "HEADER_A" in capsys.readouterr().out
+    with klzbin(convert_klzc(path)) as f:
+        # both readers use the first block of a name
+        assert f.column("HEADER_A", "QZU").tolist() == first == [1.0, 2.0]
+        assert "HEADER_A" in capsys.readouterr().out
+        assert f.block_names() == ["HEADER_A", "HEADER_B", "HEADER_A"]
+        assert len(f) == 3
+        assert [cols["QZU"].tolist() for name, cols in f.iter_blocks()] == \
+            [[1.0, 2.0], [3.0], [9.0]]
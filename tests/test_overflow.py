@@ -0,0 +1,66 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pykosimcli.klzbin import convert_klzc
+from pykosimcli.overflow import overflow_stats, overflowstats, compare_mwb
+
+"""overflow statistics: chunk size invariance and a hand computed series
+"""
+
+
+@pytest.mark.parametrize("chunkSize", [1, 7, 64])
+def test_chunk_invariance(klzc_file, chunkSize):
+    ref = overflow_stats(klzc_file)
+    pd.testing.assert_frame_equal(overflow_stats(klzc_file, chunkSize), ref,
+                                  check_exact=False, rtol=1e-9)
+
+
+def test_klzc_with_dates(tmp_path):
+    path = str(tmp_path / "d.klzc")
+    rows = ["{:02d}.01.2000 00:{:02d},{},{},{}".format(
+        1 + i // 12, 5 * (i % 12), 10.0 + i, float(i % 3), 50.0 * (i % 3))
+        for i in range(40)]
+    with open(path, "w") as f:
+        for name in ("HEADER_MWB_00001", "HEADER_MWB_00002"):
+            f.write("{},QZU,QUE,CUE\n".format(name))
+            f.write("\n".join(rows) + "\n")
+    ref = overflow_stats(convert_klzc(path))
+    for chunkSize in (1, 7, 64):
+        pd.testing.assert_frame_equal(overflow_stats(path, chunkSize), ref,
+                                      check_exact=False, rtol=1e-9)
+    assert (ref["VQUE"] > 0).all()
+
+
+def test_klzb_equals_klzc(klzc_file):
+    binPath = convert_klzc(klzc_file)
+    pd.testing.assert_frame_equal(overflow_stats(binPath, 50),
+                                  overflow_stats(klzc_file),
+                                  check_exact=False, rtol=1e-9)
+
+
+def test_events():
+    # time in minutes, two events with 2 and 1 wet steps of 5 minutes
+    acc = overflowstats(timeUnit=60.0, flowUnit=0.001)
+    acc.update(np.array([0, 5, 10]), np.array([10.0, 20.0, 20.0]),
+               np.array([0.0, 2.0, 2.0]), np.array([0.0, 100.0, 100.0]))
+    acc.update(np.array([15, 20]), np.array([10.0, 30.0]),
+               np.array([0.0, 3.0]), np.array([0.0, 200.0]))
+    res = acc.result()
+    assert res["n_events"] == 2
+    assert res["VQUE"] == pytest.approx(7 * 300 * 0.001)
+    assert res["VQZU"] == pytest.approx(90 * 300 * 0.001)
+    assert res["E0"] == pytest.approx(100.0 * 7 / 90)
+    assert res["QUE_max"] == 3.0
+
+
+def test_compare_mwb(klzc_file):
+    stats = overflow_stats(klzc_file)
+    mwb = pd.DataFrame({"E0": stats["E0"] + 1.0},
+                       index=stats.index[:2])
+    df = compare_mwb(stats, mwb)
+    assert list(df.index) == list(stats.index[:2])
+    np.testing.assert_allclose(df["E0_diff"], -1.0)
@@ -0,0 +1,61 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from pykosimcli.bench import standin
+from pykosimcli.parsedb import (parse, resaccumulator, float_str_len,
+                                get_col_widths)
+
+"""result accumulation and table helpers of parsedb
+"""
+
+
+def test_accumulator_sim_column(model):
+    res = parse(model, engine=standin)
+    acc = resaccumulator()
+    acc.add("b", res)
+    acc.add("a", res)
+    # a table only one simulation has
+    extra = pd.DataFrame({"X": [1.0, 2.0]}, index=["E1", "E2"])
+    acc.add_table("c", "extra", extra)
+    merged = acc.result()
+
+    assert sorted(merged) == sorted(list(res) + ["extra"])
+    mwb = merged["mischwasserbauwerke"]
+    n = len(res["mischwasserbauwerke"])
+    assert len(mwb) == 2 * n
+    assert isinstance(mwb["sim"].dtype, pd.CategoricalDtype)
+    # categories in the order the simulations were added
+    assert list(mwb["sim"].cat.categories) == ["b", "a", "c"]
+    assert mwb["sim"].tolist() == ["b"] * n + ["a"] * n
+    pd.testing.assert_frame_equal(mwb.iloc[n:].drop(columns="sim"),
+                                  res["mischwasserbauwerke"],
+                                  check_index_type=False)
+    assert merged["extra"]["sim"].tolist() == ["c", "c"]
+    # the added tables are not changed
+    assert "sim" not in res["mischwasserbauwerke"].columns
+
+
+def test_float_str_len():
+    rng = np.random.RandomState(3)
+    vals = np.concatenate([
+        rng.normal(0, 1000, 500), np.round(rng.normal(0, 100, 500), 3),
+        rng.lognormal(0, 12, 200) * rng.choice([-1, 1], 200),
+        [0.0, -0.0, 1.0, 0.1, 1e-4, 9.9999e-5, 1e15, 1e16, 123456789012.5,
+         9999999999999998.0, 0.30000000000000004, 2.0 / 3]])
+    assert float_str_len(vals).tolist() == [len(str(v)) for v in vals.tolist()]
+
+
+def test_col_widths():
+    df = pd.DataFrame({"A": [1, -12345, 7],
+                       "LONG_NAME": [0.5, np.nan, 3.0],
+                       "T": ["x", "abcdef", "yz"],
+                       "B": [True, False, True],
+                       "N": [np.nan, np.nan, np.nan]},
+                      index=pd.Index(["MIS_1", "MIS_00002", "M"],
+                                     name="BEZEICHNUNG"))
+    # like len(str()) of every value, NaN is written as blank cell
+    assert get_col_widths(df) == [11, 6, 9, 6, 5, 1]
+    assert get_col_widths(df.iloc[:0]) == [11, 1, 9, 1, 1, 1]
@@ -0,0 +1,67 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pandas as pd
+
+from pykosimcli.bench import standin
+from pykosimcli.pipeline import outputtask, pipeline
+
+"""pipelined run: outputs start once all their tables arrived
+"""
+
+
+def test_outputs_wait_for_tables(model):
+    started = []
+    run = pipeline(model, engine=standin)
+    run.tasks = [
+        outputtask("a", ("gebiete",), lambda res: started.append("a")),
+        outputtask("ab", ("gebiete", "mischwasserbauwerke"),
+                   lambda res: started.append("ab")),
+        outputtask("c", ("zentralbecken",), lambda res: started.append("c"))]
+    df = pd.DataFrame({"X": [1.0]})
+
+    run.add_table("gebiete", df)
+    assert started == ["a"]
+    # a table arriving again does not start an output twice
+    run.add_table("gebiete", df)
+    assert started == ["a"]
+    run.add_table("mischwasserbauwerke", df)
+    assert started == ["a", "ab"]
+    assert [t.started for t in run.tasks] == [True, True, False]
+
+
+def test_failing_output_reported(model, capsys):
+    def fail(res):
+        raise ValueError("kaputt")
+
+    run = pipeline(model, engine=standin)
+    run.tasks = [outputtask("Blatt", ("gebiete",), fail)]
+    run.add_table("gebiete", pd.DataFrame({"X": [1.0]}))
+    assert "Blatt fehlgeschlagen: kaputt" in capsys.readouterr().out
+    assert run.tasks[0].started
+
+
+def test_run(model, tmp_path, capsys):
+    xcel = str(tmp_path / "plaus.xlsx")
+    res = pipeline(model, xcel=xcel, check=True, queryWorkers=2,
+                   outputWorkers=1, engine=standin).run()
+    out = capsys.readouterr().out
+    assert os.path.exists(xcel)
+    assert "mischwasserbauwerke" in res
+    assert "1 Dateien erzeugt" in out
+    assert "nicht erzeugt" not in out
+
+
+def test_missing_table_reported(model, tmp_path, capsys):
+    xcel = str(tmp_path / "plaus.xlsx")
+    columns = {"mischwasserbauwerke": None}
+    res = pipeline(model, xcel=xcel, check=True, outputWorkers=1,
+                   engine=standin).run(columns)
+    out = capsys.readouterr().out
+    assert list(res) == ["mischwasserbauwerke"]
+    assert "Excel nicht erzeugt, Tabellen fehlen: gebiete" in out
+    assert not os.path.exists(xcel)
+    # the report only needs the Bauwerke
+    assert "Plausibilitaet nicht erzeugt" not in out
@@ -0,0 +1,66 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pykosimcli import rules
+from pykosimcli.rules import MWB_RULES, EINZEL_RULES
+
+"""plausibility rules against the thresholds of the former conditional
+formats of the plausibility workbook
+"""
+
+# column: (lower limit orange, upper limit red) of the MW-Bauwerke sheet
+MWB_LIMITS = {"QF": (0.03, 0.3), "QR": (0.2, 2.0), "NA198": (3.0, 9.0),
+              "VBECKENPROHEKTAR": (10.0, 30.0), "E0": (10.0, 40.0),
+              "NUED": (20.0, 50.0), "TUE": (20.0, 500.0)}
+
+
+@pytest.mark.parametrize("column", sorted(MWB_LIMITS))
+def test_mwb_severity(column):
+    low, high = MWB_LIMITS[column]
+    # below, on the limits, inside, above and missing
+    df = pd.DataFrame({column: [low * 0.5, low, (low + high) / 2, high,
+                                high * 2, np.nan]})
+    sev = rules.severity(df, MWB_RULES)
+    assert sev[column].tolist() == [1, 0, 0, 0, 2, 0]
+    assert rules.limits(column, MWB_RULES) == (low, high)
+
+
+def test_mixing_ratio():
+    df = pd.DataFrame({"MMIN": [5.0, 5.0, np.nan], "MVORH": [4.0, 6.0, 1.0]})
+    flags = rules.check(df, MWB_RULES)
+    assert list(flags.columns) == ["MVORH<MMIN"]
+    assert flags["MVORH<MMIN"].tolist() == [True, False, False]
+    assert rules.severity(df, MWB_RULES)["MVORH"].tolist() == [2, 0, 0]
+
+
+def test_emptying_time():
+    # orange for 10 < TE <= 15, red above, like AND($K2>10, $K2<=15)
+    df = pd.DataFrame({"TE": [5.0, 10.0, 12.0, 15.0, 16.0]})
+    flags = rules.check(df, EINZEL_RULES)
+    assert flags["10<TE<=15"].tolist() == [False, False, True, True, False]
+    assert flags["TE>15"].tolist() == [False, False, False, False, True]
+    assert rules.severity(df, EINZEL_RULES)["TE"].tolist() == [0, 0, 1, 1, 2]
+
+
+def test_type_rules():
+    df = pd.DataFrame({rules.TYPECOL: ["DBN", "DBH", "FBN", "SKUE", "SKUE"],
+                       "QA": [11.0, 9.0, 11.0, 11.0, 11.0],
+                       "GESCHW": [0.06, 0.06, 0.06, 0.2, 0.4]})
+    sev = rules.severity(df, EINZEL_RULES)
+    assert sev["QA"].tolist() == [2, 0, 0, 0, 0]
+    assert sev["GESCHW"].tolist() == [2, 2, 0, 0, 2]
+    assert (sev[rules.TYPECOL] == 0).all()
+
+
+def test_missing_columns_skipped():
+    df = pd.DataFrame({"E0": [50.0], "X": [1.0]}, index=["MIS_00001"])
+    flags = rules.check(df, MWB_RULES)
+    assert list(flags.columns) == ["E0<10.0", "E0>40.0"]
+    assert rules.report(df, MWB_RULES) == \
+        "E0>40.0 (Entlastungsrate [%], red): MIS_00001"
+    assert rules.colors(df, "E0", MWB_RULES) == ["tab:red"]
+    assert rules.report(df.assign(E0=20.0), MWB_RULES) == ""
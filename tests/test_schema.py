@@ -0,0 +1,76 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+
+import pytest
+
+from pykosimcli.bench import standin
+from pykosimcli.parsedb import parse
+from pykosimcli.schema import schemaregistry, unique_names
+
+"""schema registry: unique names, drift reports and missing columns
+"""
+
+RAW = ["ID", "BEZEICHNUNG", "E0", "ID", "BEZEICHNUNG"]
+
+
+def test_unique_names():
+    assert unique_names(RAW + ["ID"]) == ["ID", "BEZEICHNUNG", "E0", "ID_1",
+                                          "BEZEICHNUNG_1", "ID_2"]
+
+
+def test_drift_reported(capsys):
+    reg = schemaregistry(None)
+    names = reg.names("mwb", RAW)
+    assert names == unique_names(RAW)
+    assert reg.names("mwb", list(RAW)) == names
+    # another query has its own reference
+    reg.names("geb", ["ID", "X"])
+    assert capsys.readouterr().out == ""
+
+    reg.names("mwb", ["ID", "BEZEICHNUNG", "NUED", "ID", "BEZEICHNUNG"])
+    assert capsys.readouterr().out == (
+        "Schema von mwb geaendert: neue Spalten NUED, fehlende Spalten E0\n")
+    reg.names("mwb", ["BEZEICHNUNG", "ID", "E0", "ID", "BEZEICHNUNG"])
+    assert "Spaltenreihenfolge" in capsys.readouterr().out
+
+
+def test_missing_columns(capsys):
+    reg = schemaregistry(None)
+    reg.names("mwb", RAW, required=["E0", "TUE"])
+    reg.names("mwb", RAW, required=["E0", "TUE"])
+    # printed once per schema and required columns
+    assert capsys.readouterr().out == "Columns TUE missing in query mwb\n"
+    with pytest.raises(KeyError):
+        reg.names("mwb", RAW, required=["E0", "TUE"], strict=True)
+    reg.names("mwb", RAW, required=["E0"], strict=True)
+
+
+def test_persisted_reference(tmp_path, capsys):
+    path = str(tmp_path / "schemas.json")
+    reg = schemaregistry(None)
+    reg.names("mwb", RAW)
+    reg.persist(path)
+
+    other = schemaregistry(path)
+    assert other.names("mwb", RAW) == unique_names(RAW)
+    assert capsys.readouterr().out == ""
+    other.names("mwb", RAW[:2])
+    assert "fehlende Spalten E0, ID_1, BEZEICHNUNG_1" in \
+        capsys.readouterr().out
+    other.clear()
+    assert schemaregistry(path).register("mwb", RAW[:2])[1] == RAW[:2]
+
+
+def test_strict_parse(model):
+    conn = sqlite3.connect(model)
+    conn.execute("ALTER TABLE MISCHWASSERBAUWERKPROZESSMJW RENAME COLUMN TUE "
+                 "TO TUE_ALT")
+    conn.commit()
+    conn.close()
+    with pytest.raises(KeyError):
+        parse(model, engine=standin, project=True, strict=True)
+    # without strict the missing column is only reported
+    res = parse(model, engine=standin, project=True)
+    assert "TUE" not in res["mischwasserbauwerke"].columns
@@ -0,0 +1,85 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from pykosimcli.bench import make_model, standin
+from pykosimcli.parsedb import parse, sim_names
+from pykosimcli.store import export_store, kstore, read_store
+
+"""result store export and load on stand-in models
+"""
+
+
+def assert_table_equal(a, b):
+    pd.testing.assert_frame_equal(a, b, check_dtype=False,
+                                  check_categorical=False)
+
+
+def test_export_and_read(model, tmp_path):
+    storePath = str(tmp_path / "s.kstore")
+    assert export_store([model], storePath, workers=1,
+                        engine=standin) == ["model"]
+    res = parse(model, engine=standin)
+    stored = read_store(storePath)
+    assert list(stored) == list(res)
+    for key in res:
+        assert_table_equal(stored[key], res[key])
+    # unchanged models are skipped
+    assert export_store([model], storePath, workers=1, engine=standin) == []
+
+
+def test_read_all_sims(tmp_path):
+    dbs = [make_model(str(tmp_path / "{}.kdbf".format(n)), 10, seed=i)
+           for i, n in enumerate(["a", "b"])]
+    storePath = str(tmp_path / "s.kstore")
+    export_store(dbs, storePath, workers=1, engine=standin)
+    with kstore(storePath) as st:
+        assert st.sims() == ["a", "b"]
+        mwb = st.read_table("mischwasserbauwerke")
+        with pytest.raises(KeyError):
+            st.read("c")
+    assert mwb["sim"].value_counts().to_dict() == {"a": 10, "b": 10}
+    # the parsed store reads only one simulation
+    b = parse(storePath, sim="b")["mischwasserbauwerke"]
+    assert_table_equal(b, parse(dbs[1], engine=standin)["mischwasserbauwerke"])
+
+
+def test_equal_file_names(tmp_path):
+    for folder in ("v1", "v2"):
+        os.makedirs(str(tmp_path / folder))
+    dbs = [make_model(str(tmp_path / "v1" / "netz.kdbf"), 10, seed=1),
+           make_model(str(tmp_path / "v2" / "netz.kdbf"), 10, seed=2),
+           make_model(str(tmp_path / "other.kdbf"), 10, seed=3)]
+    assert sim_names(dbs) == ["v1/netz", "v2/netz", "other"]
+
+    storePath = str(tmp_path / "s.kstore")
+    assert export_store(dbs, storePath, workers=1,
+                        engine=standin) == ["v1/netz", "v2/netz", "other"]
+    assert export_store(dbs, storePath, workers=1, engine=standin) == []
+    with kstore(storePath) as st:
+        assert sorted(st.sims()) == ["other", "v1/netz", "v2/netz"]
+
+
+def test_equal_sim_names_fail():
+    with pytest.raises(ValueError):
+        sim_names(["a/x.kdbf", "a/x.KDBF"])
+
+
+def test_missing_columns_exported_as_nan(model, tmp_path):
+    conn = sqlite3.connect(model)
+    conn.execute("ALTER TABLE MISCHWASSERBAUWERKPROZESSMJW RENAME COLUMN TUE "
+                 "TO TUE_ALT")
+    conn.commit()
+    conn.close()
+
+    storePath = str(tmp_path / "s.kstore")
+    assert export_store([model], storePath, workers=1,
+                        engine=standin) == ["model"]
+    mwb = read_store(storePath)["mischwasserbauwerke"]
+    assert "TUE" in mwb.columns
+    assert mwb["TUE"].isna().all()
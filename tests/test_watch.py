@@ -0,0 +1,55 @@
+#!usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+
+from pykosimcli.bench import standin
+from pykosimcli.watch import kdbfwatcher
+
+"""watch mode: change detection with the table signatures
+"""
+
+
+def execute(db, sql):
+    conn = sqlite3.connect(db)
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def test_changed_tables(model):
+    watcher = kdbfwatcher(model, engine=standin)
+    first = watcher.update()
+    assert "mischwasserbauwerke" in first
+    assert first == set(watcher.res)
+    assert watcher.update() == set()
+
+    execute(model, "UPDATE MISCHWASSERBAUWERKPROZESSMJW SET E0 = E0 + 1.5")
+    e0 = watcher.res["mischwasserbauwerke"]["E0"].copy()
+    assert watcher.update() == {"mischwasserbauwerke"}
+    assert (watcher.res["mischwasserbauwerke"]["E0"] - e0).round(6).eq(
+        1.5).all()
+
+
+def test_changes_cancelling_out(model, capsys):
+    watcher = kdbfwatcher(model, engine=standin)
+    tables = watcher.update()
+    # swapped values keep count, sums and text lengths
+    conn = sqlite3.connect(model)
+    rows = conn.execute("SELECT rowid, E0 FROM MISCHWASSERBAUWERKPROZESSMJW "
+                        "WHERE E0 IS NOT NULL ORDER BY E0").fetchall()
+    (lowId, low), (highId, high) = rows[0], rows[-1]
+    conn.execute("UPDATE MISCHWASSERBAUWERKPROZESSMJW SET E0 = ? "
+                 "WHERE rowid = ?", (high, lowId))
+    conn.execute("UPDATE MISCHWASSERBAUWERKPROZESSMJW SET E0 = ? "
+                 "WHERE rowid = ?", (low, highId))
+    conn.commit()
+    conn.close()
+
+    before = watcher.res["mischwasserbauwerke"]["E0"].copy()
+    capsys.readouterr()
+    assert watcher.update() == tables
+    assert "nicht an den Signaturen erkennbar" in capsys.readouterr().out
+    after = watcher.res["mischwasserbauwerke"]["E0"]
+    assert not after.equals(before)
+    assert sorted(after.dropna()) == sorted(before.dropna())